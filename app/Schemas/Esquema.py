@@ -50,6 +50,9 @@ class UserInDB(BaseModel):
             ObjectId: str
         }
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
 class UserResponse(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     username: str
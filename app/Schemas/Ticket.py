@@ -1,7 +1,7 @@
 import datetime
 from bson import ObjectId
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 from app.Schemas import Category
 from app.Schemas.Esquema import PyObjectId
@@ -22,6 +22,14 @@ class TicketUpdate(BaseModel):
     category_id: Optional[int]
     assigned_department_id: Optional[int]
     status: Optional[str]
+class OperacionAsignacion(BaseModel):
+    ticket_id: str
+    agregar: List[str] = []
+    quitar: List[str] = []
+
+class AsignacionMasiva(BaseModel):
+    operaciones: List[OperacionAsignacion]
+
 class TicketBase(BaseModel):
     title: str
     description: str
@@ -0,0 +1,96 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+from app.Schemas.Esquema import UserInDB
+from config import USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS
+
+
+class CacheUsuarios:
+    """
+    Caché LRU con TTL de usuarios ya resueltos, indexada por (sub, exp) del token.
+
+    Cada entrada vive como máximo ttl_segundos y nunca más allá del vencimiento del token.
+    Es local al proceso: con varios workers cada uno tiene su propia caché y el TTL acota
+    el tiempo que un cambio hecho en otro worker puede tardar en verse.
+    """
+
+    def __init__(self, max_entradas: int, ttl_segundos: int):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self._entradas = OrderedDict()   # (sub, exp) -> (vence_en, usuario)
+        self._por_usuario = {}           # id de usuario -> claves (sub, exp)
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def obtener(self, sub: str, exp: Optional[int]) -> Optional[UserInDB]:
+        clave = (sub, exp)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            vence_en, usuario = entrada
+            if vence_en <= time.monotonic():
+                self._quitar(clave)
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.hits += 1
+            return usuario
+
+    def guardar(self, sub: str, exp: Optional[int], usuario: UserInDB) -> None:
+        # Los usuarios inactivos no se guardan: se releen siempre para que la reactivación sea inmediata
+        if not usuario.status:
+            return
+        vida = self.ttl_segundos
+        if exp is not None:
+            vida = min(vida, exp - time.time())
+        if vida <= 0:
+            return
+        clave = (sub, exp)
+        with self._lock:
+            self._quitar(clave)
+            self._entradas[clave] = (time.monotonic() + vida, usuario)
+            self._por_usuario.setdefault(str(usuario.id), set()).add(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._quitar(next(iter(self._entradas)))
+
+    def invalidar_usuario(self, user_id: str) -> None:
+        """
+        Elimina todas las entradas de un usuario (todas sus sesiones/tokens).
+        """
+        with self._lock:
+            for clave in list(self._por_usuario.pop(str(user_id), ())):
+                self._entradas.pop(clave, None)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self._por_usuario.clear()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl_segundos,
+            }
+
+    def _quitar(self, clave) -> None:
+        entrada = self._entradas.pop(clave, None)
+        if entrada is None:
+            return
+        user_id = str(entrada[1].id)
+        claves = self._por_usuario.get(user_id)
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del self._por_usuario[user_id]
+
+
+cache_usuarios = CacheUsuarios(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS)
@@ -5,12 +5,18 @@ from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional
 from bson import ObjectId # Importar ObjectId
+import logging
 
 from app.db.dbp import get_db
 from motor.motor_asyncio import AsyncIOMotorDatabase # Importa el tipo correcto para la DB
 from app.Schemas.Esquema import UserInDB # Asegúrate de que UserInDB esté definido en Esquema.py
+from app.auth.cache import cache_usuarios
+from app.auth.revocacion import revocaciones
+from app.auth.tokens import CLAIM_FAMILIA, CLAIM_TIPO, CLAIM_USUARIO, CLAIM_VERSION, TIPO_REFRESH, UsuarioToken, versiones_token
 from config import SECRET_KEY, ALGORITHM # Importa tus variables de configuración
 
+logger = logging.getLogger(__name__)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # Función auxiliar para obtener el usuario por username (CORREGIDA para convertir ObjectId)
@@ -37,15 +43,16 @@ async def get_user_by_username(username: str, db: AsyncIOMotorDatabase):
         if '__v' in user_data_copy:
             del user_data_copy['__v']
 
-        # DEBUG: Imprimir para verificar la conversión
-        print(f"DEBUG - user_data_copy antes de UserInDB: {user_data_copy}")
-        print(f"DEBUG - department type: {type(user_data_copy.get('department'))}")
-        print(f"DEBUG - department value: {user_data_copy.get('department')}")
+        # DEBUG: verificar la conversión (sin volcar el documento, que incluye el hash de la contraseña)
+        logger.debug(f"Usuario {username}: department={user_data_copy.get('department')!r}")
 
         return UserInDB(**user_data_copy)
     return None
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncIOMotorDatabase = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncIOMotorDatabase = Depends(get_db)) -> UsuarioToken:
+    """
+    Usuario autenticado a partir de los claims del token, sin leer el documento del usuario.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudieron validar las credenciales",
@@ -54,19 +61,57 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncIOMotor
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        if username is None or payload.get(CLAIM_TIPO) == TIPO_REFRESH:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    user = await get_user_by_username(username, db)
 
+    expira = payload.get("exp")
+    if CLAIM_USUARIO in payload:
+        # Camino rápido: solo se valida que el token no haya sido revocado
+        version = await versiones_token.version(db, payload[CLAIM_USUARIO])
+        if version is None or version != payload.get(CLAIM_VERSION, 0):
+            raise credentials_exception
+        # Familia de refresh tokens revocada por reuso (filtro de Bloom; casi nunca lee Mongo)
+        if payload.get(CLAIM_FAMILIA) and await revocaciones.familia_revocada(db, payload[CLAIM_FAMILIA]):
+            raise credentials_exception
+        return UsuarioToken.desde_claims(payload)
+
+    # Tokens emitidos antes de los claims (solo `sub`): se resuelven como antes hasta que venzan
+    user = await _cargar_usuario(username, expira, db)
     if user is None:
         raise credentials_exception
+    return UsuarioToken.desde_usuario(user, expira)
+
+async def _cargar_usuario(username: str, expira: Optional[int], db: AsyncIOMotorDatabase) -> Optional[UserInDB]:
+    # Primero la caché en memoria; solo se consulta Mongo si no hay entrada vigente
+    user = cache_usuarios.obtener(username, expira)
+    if user is not None:
+        return user
+    user = await get_user_by_username(username, db)
+    if user is not None:
+        cache_usuarios.guardar(username, expira, user)
     return user
 
+async def get_current_user_completo(
+    current_user: UsuarioToken = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+) -> UserInDB:
+    """
+    Documento completo del usuario autenticado, para los handlers que lo necesitan.
+    """
+    if current_user.completo is None:
+        current_user.completo = await _cargar_usuario(current_user.username, current_user.expira, db)
+        if current_user.completo is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="No se pudieron validar las credenciales",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+    return current_user.completo
+
 # Puedes añadir una función para obtener el usuario activo si la necesitas
-async def get_current_active_user(current_user: UserInDB = Depends(get_current_user)):
-    if not current_user.status: # Asumiendo que 'status' es un booleano en UserInDB
+async def get_current_active_user(current_user: UsuarioToken = Depends(get_current_user)) -> UsuarioToken:
+    if not current_user.status: # status viene en los claims del token
         raise HTTPException(status_code=400, detail="Usuario inactivo")
     return current_user
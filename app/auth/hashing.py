@@ -0,0 +1,91 @@
+"""
+Hash y verificación de contraseñas en un pool de hilos dedicado
+
+bcrypt tarda a propósito (cientos de ms con el costo por defecto) y libera el GIL mientras
+calcula, así que se ejecuta en hilos propios para no bloquear el event loop. Un semáforo
+deja entrar al pool a lo más `hilos` operaciones; el resto espera en el event loop, donde
+se mide la espera, y cuando ya hay `max_cola` esperando se responde 503 en vez de
+acumular peticiones que vencerían igual.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.auth.security import pwd_context
+from app.utils.metricas import bcrypt_duracion, bcrypt_espera, bcrypt_rechazos
+from config import PASSWORD_HASH_MAX_QUEUE, PASSWORD_HASH_WORKERS
+
+HASH = "hash"
+VERIFICAR = "verify"
+
+
+class PoolContrasenas:
+    def __init__(self, hilos: int, max_cola: int):
+        self.hilos = max(1, hilos)
+        self.max_cola = max_cola
+        self._executor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="bcrypt")
+        self._semaforo = asyncio.Semaphore(self.hilos)
+        self._en_cola = 0
+        self._en_curso = 0
+        self.rechazadas = 0
+
+    async def _ejecutar(self, operacion: str, funcion, *args):
+        if self._en_cola >= self.max_cola:
+            self.rechazadas += 1
+            bcrypt_rechazos.inc(operation=operacion)
+            raise HTTPException(
+                status_code=503,
+                detail="Servicio de autenticación saturado, intenta de nuevo",
+                headers={"Retry-After": "1"},
+            )
+
+        encolada_en = time.perf_counter()
+        self._en_cola += 1
+        try:
+            await self._semaforo.acquire()
+        finally:
+            self._en_cola -= 1
+        try:
+            bcrypt_espera.observar(time.perf_counter() - encolada_en, operation=operacion)
+            self._en_curso += 1
+            with bcrypt_duracion.medir(operation=operacion):
+                return await asyncio.get_running_loop().run_in_executor(self._executor, funcion, *args)
+        finally:
+            self._en_curso -= 1
+            self._semaforo.release()
+
+    async def hashear(self, password: str) -> str:
+        return await self._ejecutar(HASH, pwd_context.hash, password)
+
+    async def verificar(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verifica la contraseña y, si el hash quedó desactualizado (costo o esquema distinto
+        al configurado, ver CryptContext.needs_update), devuelve también el hash nuevo.
+        """
+        return await self._ejecutar(VERIFICAR, pwd_context.verify_and_update, password, hashed_password)
+
+    def detener(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def estadisticas(self) -> dict:
+        return {
+            "hilos": self.hilos,
+            "en_curso": self._en_curso,
+            "en_cola": self._en_cola,
+            "max_cola": self.max_cola,
+            "rechazadas": self.rechazadas,
+        }
+
+
+pool_contrasenas = PoolContrasenas(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+
+
+async def hash_password_async(password: str) -> str:
+    return await pool_contrasenas.hashear(password)
+
+
+async def verify_password_async(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await pool_contrasenas.verificar(password, hashed_password)
@@ -0,0 +1,117 @@
+"""
+Revocación de refresh tokens: colección `revoked_tokens` con las familias revocadas
+reflejadas en un filtro de Bloom
+
+Cada documento es {"_id": <clave>, "expiraEn": <vencimiento del token>} y un índice TTL lo
+borra cuando el token ya no serviría de todos modos, así que la colección solo guarda lo
+que todavía importa. Claves:
+    <jti>          refresh token ya usado (rotado) o revocado
+    fam:<familia>  toda la familia revocada (se detectó reuso de un token rotado)
+
+/token/refresh siempre consulta Mongo (una lectura por _id): la revocación de una familia
+vale al momento en todos los workers. Marcar un token como usado es un insert con _id
+único: dos rotaciones del mismo token, aunque ocurran en workers distintos, no pueden tener
+éxito ambas.
+
+El filtro de Bloom es para los access tokens, que llevan la familia de su refresh token y
+se validan en cada petición: si dice que la familia no está, no se lee Mongo. Solo guarda
+familias (los jti rotados son muchos y no hacen falta ahí), se reconstruye cada
+REVOKED_TOKENS_REFRESH_SECONDS y las revocaciones de este proceso se agregan al momento; en
+los demás workers un access token de una familia revocada deja de valer a lo más tras una
+recarga.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+
+from app.utils.bloom import FiltroBloom
+from config import REVOKED_TOKENS_BLOOM_CAPACITY, REVOKED_TOKENS_BLOOM_ERROR, REVOKED_TOKENS_REFRESH_SECONDS
+
+COLECCION = "revoked_tokens"
+PREFIJO_FAMILIA = "fam:"
+
+
+def clave_familia(familia: str) -> str:
+    return f"{PREFIJO_FAMILIA}{familia}"
+
+
+class AlmacenRevocaciones:
+    def __init__(self, capacidad: int, error: float, recarga_segundos: float):
+        self.capacidad = capacidad
+        self.error = error
+        self.recarga_segundos = recarga_segundos
+        self._filtro = FiltroBloom(capacidad, error)
+        self._cargado_en: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self.consultas = 0
+        self.descartes_bloom = 0
+
+    async def _recargar(self, db: AsyncIOMotorDatabase):
+        # Rango sobre el índice de _id: no recorre los jti rotados
+        consulta = {"_id": {"$regex": f"^{PREFIJO_FAMILIA}"}, "expiraEn": {"$gt": datetime.utcnow()}}
+        claves = [documento["_id"] async for documento in db[COLECCION].find(consulta, {"_id": 1})]
+        # Con más familias que la capacidad configurada la tasa de error se dispararía
+        filtro = FiltroBloom(max(self.capacidad, 2 * len(claves)), self.error)
+        filtro.agregar_todos(claves)
+        self._filtro = filtro
+        self._cargado_en = time.monotonic()
+
+    async def _vigente(self, db: AsyncIOMotorDatabase):
+        if self._cargado_en is None or time.monotonic() - self._cargado_en >= self.recarga_segundos:
+            async with self._lock:
+                if self._cargado_en is None or time.monotonic() - self._cargado_en >= self.recarga_segundos:
+                    await self._recargar(db)
+
+    async def revocado(self, db: AsyncIOMotorDatabase, jti: str, familia: str) -> Optional[str]:
+        """
+        Devuelve la clave revocada (el jti o la de su familia), o None. Siempre lee Mongo.
+        """
+        self.consultas += 1
+        documento = await db[COLECCION].find_one({"_id": {"$in": [jti, clave_familia(familia)]}}, {"_id": 1})
+        return documento["_id"] if documento else None
+
+    async def familia_revocada(self, db: AsyncIOMotorDatabase, familia: str) -> bool:
+        """
+        Consulta de los access tokens: pasa primero por el filtro de Bloom.
+        """
+        await self._vigente(db)
+        clave = clave_familia(familia)
+        if clave not in self._filtro:
+            self.descartes_bloom += 1
+            return False
+        self.consultas += 1
+        return await db[COLECCION].find_one({"_id": clave}, {"_id": 1}) is not None
+
+    async def consumir(self, db: AsyncIOMotorDatabase, jti: str, expira_en: datetime) -> bool:
+        """
+        Marca el refresh token como usado. Devuelve False si ya lo estaba (reuso).
+        """
+        try:
+            await db[COLECCION].insert_one({"_id": jti, "expiraEn": expira_en, "motivo": "rotado"})
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def revocar_familia(self, db: AsyncIOMotorDatabase, familia: str, expira_en: datetime):
+        clave = clave_familia(familia)
+        # $max: la familia queda revocada hasta el vencimiento más lejano conocido
+        await db[COLECCION].update_one(
+            {"_id": clave},
+            {"$max": {"expiraEn": expira_en}, "$setOnInsert": {"motivo": "reuso"}},
+            upsert=True,
+        )
+        self._filtro.agregar(clave)
+
+    def estadisticas(self) -> dict:
+        return {
+            "elementos_filtro": self._filtro.elementos,
+            "consultas": self.consultas,
+            "descartes_bloom": self.descartes_bloom,
+        }
+
+
+revocaciones = AlmacenRevocaciones(REVOKED_TOKENS_BLOOM_CAPACITY, REVOKED_TOKENS_BLOOM_ERROR, REVOKED_TOKENS_REFRESH_SECONDS)
@@ -5,11 +5,21 @@ from datetime import datetime, timedelta
 from jose import jwt
 # --- FIN CORRECCIÓN ---
 import os
+import uuid
 
 # Asumiendo que SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES están en config.py
-from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, BCRYPT_ROUNDS, REFRESH_TOKEN_EXPIRE_DAYS
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min_rounds hace que needs_update marque los hashes con un costo menor al configurado
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+# Versiones síncronas: bloquean el hilo que las llama. Dentro de los handlers async se usan
+# las de app.auth.hashing, que corren en el pool dedicado.
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -27,3 +37,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     # La función jwt.encode() se llama igual, pero ahora viene de jose.jwt
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+def create_refresh_token(data: dict, familia: Optional[str] = None):
+    """
+    Refresh token con jti propio; al rotar se conserva la familia del token anterior.
+    """
+    to_encode = data.copy()
+    to_encode.update({
+        "typ": "refresh",
+        "jti": uuid.uuid4().hex,
+        "fam": familia or uuid.uuid4().hex,
+        "exp": datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    })
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
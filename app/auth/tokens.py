@@ -0,0 +1,146 @@
+"""
+Claims firmados en el JWT y tabla de versiones de token
+
+El token lleva, además de `sub` (username), los datos con los que se autoriza casi todo:
+    uid   id del usuario
+    dept  id del departamento
+    role  rol
+    st    status (activo o no)
+    tv    versión de token del usuario (campo `token_version`, 0 si no existe)
+
+Los refresh tokens llevan los mismos claims más typ="refresh", jti y fam (familia de
+rotación); get_current_user no los acepta como access token. Los access tokens emitidos
+junto con un refresh token llevan también fam, para invalidarlos si se revoca la familia.
+
+Con eso get_current_user no lee Mongo. Para poder revocar, cada petición compara `tv` con
+la tabla de versiones en memoria (id -> token_version), que se recarga completa con una
+sola consulta proyectada cada TOKEN_VERSION_REFRESH_SECONDS. Al cambiar datos que van en
+el token se incrementa token_version: en este proceso el efecto es inmediato y en los
+demás workers a lo más tras una recarga.
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
+from bson import ObjectId, errors
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.Schemas.Esquema import UserInDB
+from config import TOKEN_VERSION_REFRESH_SECONDS
+
+CLAIM_USUARIO = "uid"
+CLAIM_DEPARTAMENTO = "dept"
+CLAIM_ROL = "role"
+CLAIM_STATUS = "st"
+CLAIM_VERSION = "tv"
+CLAIM_TIPO = "typ"
+CLAIM_FAMILIA = "fam"
+TIPO_REFRESH = "refresh"
+
+
+def claims_de_usuario(user: dict) -> dict:
+    """
+    Claims del token a partir del documento de usuario.
+    """
+    department = user.get("department")
+    return {
+        "sub": user["username"],
+        CLAIM_USUARIO: str(user["_id"]),
+        CLAIM_DEPARTAMENTO: str(department) if department is not None else None,
+        CLAIM_ROL: user.get("role", 0),
+        CLAIM_STATUS: bool(user.get("status")),
+        CLAIM_VERSION: user.get("token_version", 0),
+    }
+
+
+class UsuarioToken:
+    """
+    Usuario autenticado armado desde los claims. Tiene los atributos que usan los handlers
+    para autorizar (id, username, department, role, status); el documento completo
+    (`completo`) se carga solo si un handler lo pide con get_current_user_completo.
+    """
+
+    def __init__(self, id: str, username: str, department: Optional[str], role: int, status: bool,
+                 token_version: int = 0, expira: Optional[int] = None, completo: Optional[UserInDB] = None):
+        self.id = id
+        self.username = username
+        self.department = department
+        self.role = role
+        self.status = status
+        self.token_version = token_version
+        self.expira = expira
+        self.completo = completo
+
+    @classmethod
+    def desde_claims(cls, payload: dict) -> "UsuarioToken":
+        return cls(
+            id=payload[CLAIM_USUARIO],
+            username=payload.get("sub"),
+            department=payload.get(CLAIM_DEPARTAMENTO),
+            role=payload.get(CLAIM_ROL, 0),
+            status=bool(payload.get(CLAIM_STATUS)),
+            token_version=payload.get(CLAIM_VERSION, 0),
+            expira=payload.get("exp"),
+        )
+
+    @classmethod
+    def desde_usuario(cls, user: UserInDB, expira: Optional[int] = None) -> "UsuarioToken":
+        return cls(str(user.id), user.username, user.department, user.role, user.status, expira=expira, completo=user)
+
+
+class TablaVersionesToken:
+    def __init__(self, recarga_segundos: float):
+        self.recarga_segundos = recarga_segundos
+        self._versiones: Dict[str, int] = {}
+        self._cargada_en: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self.recargas = 0
+        self.lecturas_puntuales = 0
+
+    async def _recargar(self, db: AsyncIOMotorDatabase):
+        versiones = {}
+        async for user in db["users"].find({}, {"token_version": 1}):
+            versiones[str(user["_id"])] = user.get("token_version", 0)
+        self._versiones = versiones
+        self._cargada_en = time.monotonic()
+        self.recargas += 1
+
+    def _vencida(self) -> bool:
+        return self._cargada_en is None or time.monotonic() - self._cargada_en >= self.recarga_segundos
+
+    async def version(self, db: AsyncIOMotorDatabase, user_id: str) -> Optional[int]:
+        """
+        Versión de token vigente del usuario, o None si el usuario no existe.
+        """
+        if self._vencida():
+            async with self._lock:
+                if self._vencida():
+                    await self._recargar(db)
+
+        version = self._versiones.get(user_id)
+        if version is None:
+            # Usuario creado después de la última recarga (o eliminado): lectura puntual
+            try:
+                object_id = ObjectId(user_id)
+            except errors.InvalidId:
+                return None
+            self.lecturas_puntuales += 1
+            user = await db["users"].find_one({"_id": object_id}, {"token_version": 1})
+            if user is None:
+                return None
+            version = self._versiones[user_id] = user.get("token_version", 0)
+        return version
+
+    def invalidar(self, user_id: str):
+        self._versiones.pop(str(user_id), None)
+
+    def estadisticas(self) -> dict:
+        return {
+            "usuarios": len(self._versiones),
+            "recargas": self.recargas,
+            "lecturas_puntuales": self.lecturas_puntuales,
+        }
+
+
+versiones_token = TablaVersionesToken(TOKEN_VERSION_REFRESH_SECONDS)
+
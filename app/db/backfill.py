@@ -0,0 +1,201 @@
+"""
+Backfills de una sola vez sobre documentos existentes
+
+Uso como comando de administración:
+    python -m app.db.backfill name_key
+    python -m app.db.backfill inbox_keys
+    python -m app.db.backfill created_user_department
+    python -m app.db.backfill ticket_counters
+    python -m app.db.backfill mensajes_texto
+"""
+import asyncio
+import logging
+import sys
+from functools import partial
+from typing import List, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from app.models.bandejas import calcular_inbox_keys, marcar_departamentos_creador_completos
+from app.models.contadores import reconciliar_contadores
+from app.utils.nombres import normalizar_nombre
+from config import BACKFILL_BATCH_SIZE, SEARCH_MAX_MESSAGES_PER_TICKET
+
+logger = logging.getLogger(__name__)
+
+
+async def backfill_name_key(db: AsyncIOMotorDatabase) -> dict:
+    """
+    Calcula name_key en categorías y departamentos.
+
+    Si varios documentos normalizan al mismo nombre, conserva la clave en uno solo (el que
+    ya la tenía o el más antiguo) y reporta los demás para corregirlos a mano.
+    """
+    resultado = {}
+    for coleccion in ("categories", "departments"):
+        grupos = {}
+        async for documento in db[coleccion].find({}, {"name": 1, "name_key": 1}).sort("_id", 1):
+            clave = normalizar_nombre(documento.get("name"))
+            if clave:
+                grupos.setdefault(clave, []).append(documento)
+
+        asignar = []
+        quitar = []
+        duplicados = []
+        for clave, documentos in grupos.items():
+            conservado = next((d for d in documentos if d.get("name_key") == clave), documentos[0])
+            if conservado.get("name_key") != clave:
+                asignar.append(UpdateOne({"_id": conservado["_id"]}, {"$set": {"name_key": clave}}))
+            for documento in documentos:
+                if documento is conservado:
+                    continue
+                duplicados.append({"_id": str(documento["_id"]), "name": documento.get("name"), "conserva": str(conservado["_id"])})
+                if "name_key" in documento:
+                    quitar.append(UpdateOne({"_id": documento["_id"]}, {"$unset": {"name_key": ""}}))
+
+        # Primero los $unset para no chocar con el índice único al asignar la clave al conservado
+        operaciones = quitar + asignar
+        if operaciones:
+            await db[coleccion].bulk_write(operaciones, ordered=True)
+        for duplicado in duplicados:
+            logger.warning(f"{coleccion}: '{duplicado['name']}' ({duplicado['_id']}) duplica a {duplicado['conserva']}")
+        resultado[coleccion] = {"actualizados": len(operaciones), "duplicados": duplicados}
+    return resultado
+
+
+async def _actualizar_tickets(db: AsyncIOMotorDatabase, proyeccion: dict, calcular, filtro: Optional[dict] = None) -> int:
+    # Recorre los tickets del filtro y escribe en lotes de BACKFILL_BATCH_SIZE solo los que cambian
+    actualizados = 0
+    lote = []
+    async for ticket in db["tickets"].find(filtro or {}, proyeccion):
+        cambios = calcular(ticket)
+        if cambios:
+            lote.append(UpdateOne({"_id": ticket["_id"]}, {"$set": cambios}))
+        if len(lote) >= BACKFILL_BATCH_SIZE:
+            await db["tickets"].bulk_write(lote, ordered=False)
+            actualizados += len(lote)
+            lote = []
+    if lote:
+        await db["tickets"].bulk_write(lote, ordered=False)
+        actualizados += len(lote)
+    return actualizados
+
+
+async def backfill_inbox_keys(db: AsyncIOMotorDatabase, solo_faltantes: bool = False) -> dict:
+    """
+    Calcula inbox_keys de todos los tickets (o solo de los que no lo tienen).
+    """
+    def calcular(ticket):
+        claves = calcular_inbox_keys(ticket)
+        return {"inbox_keys": claves} if claves != ticket.get("inbox_keys") else None
+
+    proyeccion = {"assigned_users": 1, "assigned_department": 1, "inbox_keys": 1}
+    filtro = {"inbox_keys": {"$exists": False}} if solo_faltantes else None
+    return {"tickets": await _actualizar_tickets(db, proyeccion, calcular, filtro)}
+
+
+async def backfill_created_user_department(db: AsyncIOMotorDatabase, solo_faltantes: bool = False) -> dict:
+    """
+    Copia en cada ticket el departamento actual de su creador (un solo mapa de usuarios en memoria).
+
+    Si el creador no existe o no tiene departamento, el campo queda en None para que el
+    ticket no siga contando como pendiente de backfill.
+    """
+    departamento_de = {
+        str(u["_id"]): u.get("department")
+        async for u in db["users"].find({}, {"department": 1})
+    }
+
+    def calcular(ticket):
+        creador = str(ticket.get("created_user_id") or ticket.get("created_user") or "")
+        departamento = departamento_de.get(creador)
+        if "created_user_department" in ticket and (departamento is None or ticket["created_user_department"] == departamento):
+            return None
+        return {"created_user_department": departamento}
+
+    proyeccion = {"created_user_id": 1, "created_user": 1, "created_user_department": 1}
+    filtro = {"created_user_department": {"$exists": False}} if solo_faltantes else None
+    actualizados = await _actualizar_tickets(db, proyeccion, calcular, filtro)
+    # Ya no quedan tickets sin el campo: las bandejas dejan de usar el predicado anterior
+    marcar_departamentos_creador_completos()
+    return {"tickets": actualizados}
+
+
+async def backfill_ticket_counters(db: AsyncIOMotorDatabase) -> dict:
+    """
+    Reconstruye ticket_counters desde tickets (lo mismo que hace la reconciliación periódica).
+    """
+    return {"ticket_counters": await reconciliar_contadores(db)}
+
+
+async def backfill_mensajes_texto(db: AsyncIOMotorDatabase) -> dict:
+    """
+    Copia en cada ticket el texto de sus últimos SEARCH_MAX_MESSAGES_PER_TICKET mensajes.
+    """
+    pipeline = [
+        {"$sort": {"ticket_id": 1, "createdAt": 1}},
+        {"$group": {"_id": "$ticket_id", "textos": {"$push": "$message"}}},
+    ]
+    actualizados = 0
+    lote = []
+    async for grupo in db["messages"].aggregate(pipeline, allowDiskUse=True):
+        if not ObjectId.is_valid(str(grupo["_id"])):
+            continue
+        textos = [t for t in grupo["textos"] if isinstance(t, str)][-SEARCH_MAX_MESSAGES_PER_TICKET:]
+        lote.append(UpdateOne({"_id": ObjectId(str(grupo["_id"]))}, {"$set": {"mensajes_texto": textos}}))
+        if len(lote) >= BACKFILL_BATCH_SIZE:
+            await db["tickets"].bulk_write(lote, ordered=False)
+            actualizados += len(lote)
+            lote = []
+    if lote:
+        await db["tickets"].bulk_write(lote, ordered=False)
+        actualizados += len(lote)
+    return {"tickets": actualizados}
+
+
+async def backfills_de_arranque(db: AsyncIOMotorDatabase):
+    """
+    Completa al arrancar los documentos a los que les falta un campo derivado. Los de tickets
+    solo leen esos tickets y name_key recorre catálogos pequeños, así que en un arranque
+    normal no se escribe nada.
+    """
+    backfills = (
+        ("name_key", backfill_name_key),
+        ("inbox_keys", partial(backfill_inbox_keys, solo_faltantes=True)),
+        ("created_user_department", partial(backfill_created_user_department, solo_faltantes=True)),
+    )
+    for nombre, backfill in backfills:
+        try:
+            resultado = await backfill(db)
+        except PyMongoError as e:
+            logger.error(f"Backfill de arranque {nombre} falló: {e}")
+            continue
+        logger.info(f"Backfill de arranque {nombre}: {resultado}")
+
+
+BACKFILLS = {
+    "name_key": backfill_name_key,
+    "inbox_keys": backfill_inbox_keys,
+    "created_user_department": backfill_created_user_department,
+    "ticket_counters": backfill_ticket_counters,
+    "mensajes_texto": backfill_mensajes_texto,
+}
+
+
+async def _main(argumentos: List[str]):
+    from app.db.dbp import db
+
+    nombres = argumentos or list(BACKFILLS)
+    for nombre in nombres:
+        if nombre not in BACKFILLS:
+            print(f"Backfill desconocido: {nombre}. Disponibles: {', '.join(BACKFILLS)}")
+            continue
+        print(f"{nombre}: {await BACKFILLS[nombre](db)}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1:]))
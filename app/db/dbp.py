@@ -1,8 +1,9 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from config import MONGODB_HOST, MONGODB_PORT, MONGODB_DATABASE
+from app.db.monitoreo import monitor_comandos
 
    # Crear la conexión a MongoDB
-client = AsyncIOMotorClient(f'mongodb://{MONGODB_HOST}:{MONGODB_PORT}')
+client = AsyncIOMotorClient(f'mongodb://{MONGODB_HOST}:{MONGODB_PORT}', event_listeners=[monitor_comandos])
 db = client[MONGODB_DATABASE]
 
 async def get_db():
@@ -0,0 +1,167 @@
+"""
+Índices declarados por colección y asesor de índices (explain de las consultas más usadas)
+
+Uso como comando de administración:
+    python -m app.db.indexes            # crea/verifica los índices
+    python -m app.db.indexes --explain  # además revisa el plan de cada consulta registrada
+"""
+import asyncio
+import logging
+import sys
+from typing import List
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.models.busqueda import CAMPO_MENSAJES, PESOS
+from app.utils.pagination import ORDEN_KEYSET
+
+logger = logging.getLogger(__name__)
+
+# Índices que la aplicación necesita, por colección. create_indexes es idempotente:
+# si el índice ya existe con la misma definición no hace nada.
+INDICES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unico", unique=True),
+        IndexModel([("email", ASCENDING)], name="email"),
+        IndexModel([("phone_ext", ASCENDING)], name="phone_ext"),
+        IndexModel([("department", ASCENDING), ("status", ASCENDING)], name="department_status"),
+    ],
+    "tickets": [
+        IndexModel(ORDEN_KEYSET, name="createdAt_id"),
+        IndexModel([("assigned_department", ASCENDING)] + ORDEN_KEYSET, name="assigned_department_createdAt"),
+        IndexModel([("created_user_id", ASCENDING)] + ORDEN_KEYSET, name="created_user_id_createdAt"),
+        IndexModel([("assigned_users", ASCENDING)] + ORDEN_KEYSET, name="assigned_users_createdAt"),
+        IndexModel([("status", ASCENDING)] + ORDEN_KEYSET, name="status_createdAt"),
+        IndexModel([("category", ASCENDING)] + ORDEN_KEYSET, name="category_createdAt"),
+        IndexModel([("inbox_keys", ASCENDING)] + ORDEN_KEYSET, name="inbox_keys_createdAt"),
+        IndexModel([("created_user_department", ASCENDING)] + ORDEN_KEYSET, name="created_user_department_createdAt"),
+        # Único índice de texto permitido por colección; language_override evita que un campo
+        # "language" del documento cambie el analizador
+        IndexModel(
+            [("title", TEXT), ("description", TEXT), (CAMPO_MENSAJES, TEXT)],
+            name="busqueda_texto",
+            weights=PESOS,
+            default_language="spanish",
+            language_override="idioma_busqueda",
+        ),
+    ],
+    "messages": [
+        IndexModel([("ticket_id", ASCENDING), ("createdAt", ASCENDING)], name="ticket_id_createdAt"),
+    ],
+    "attachments": [
+        IndexModel([("ticket_id", ASCENDING)], name="ticket_id"),
+    ],
+    # name_key solo se exige donde existe: los documentos anteriores al backfill no bloquean el índice
+    "categories": [
+        IndexModel([("name_key", ASCENDING)], name="name_key_unico", unique=True,
+                   partialFilterExpression={"name_key": {"$exists": True}}),
+    ],
+    "departments": [
+        IndexModel([("name_key", ASCENDING)], name="name_key_unico", unique=True,
+                   partialFilterExpression={"name_key": {"$exists": True}}),
+    ],
+    "ticket_rollups": [
+        IndexModel([("granularidad", ASCENDING), ("department", ASCENDING), ("inicio", ASCENDING)], name="granularidad_department_inicio"),
+        IndexModel([("granularidad", ASCENDING), ("inicio", ASCENDING)], name="granularidad_inicio"),
+    ],
+    "ticket_events": [
+        IndexModel([("ticket_id", ASCENDING), ("en", ASCENDING)], name="ticket_id_en"),
+    ],
+    # TTL: cada revocación se borra sola cuando el token revocado ya habría vencido
+    "revoked_tokens": [
+        IndexModel([("expiraEn", ASCENDING)], name="expiraEn_ttl", expireAfterSeconds=0),
+    ],
+    "ticket_assigned_users": [
+        IndexModel([("ticket_id", ASCENDING), ("user_id", ASCENDING)], name="ticket_user_unico", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+    ],
+}
+
+# Consultas calientes que el asesor revisa con explain(): (nombre, colección, filtro, orden)
+CONSULTAS_CALIENTES = [
+    ("login / get_current_user", "users", {"username": "usuario"}, None),
+    ("usuarios por departamento", "users", {"department": "000000000000000000000000", "status": True}, None),
+    ("colaboradores del departamento", "users", {"department": {"$in": ["000000000000000000000000"]}}, None),
+    ("listado paginado de tickets", "tickets", {}, ORDEN_KEYSET),
+    ("tickets por estado", "tickets", {"status": "1"}, ORDEN_KEYSET),
+    ("tickets del departamento", "tickets", {"assigned_department": "000000000000000000000000"}, None),
+    ("bandeja: asignados a mí", "tickets", {"inbox_keys": "u:000000000000000000000000"}, ORDEN_KEYSET),
+    ("bandeja: departamento", "tickets", {"inbox_keys": "d:000000000000000000000000"}, ORDEN_KEYSET),
+    ("creados por el departamento", "tickets", {"created_user_department": "000000000000000000000000"}, ORDEN_KEYSET),
+    ("mensajes de un ticket", "messages", {"ticket_id": "000000000000000000000000"}, None),
+    ("adjuntos de un ticket", "attachments", {"ticket_id": "000000000000000000000000"}, None),
+]
+
+
+async def asegurar_indices(db: AsyncIOMotorDatabase) -> dict:
+    """
+    Crea los índices declarados en INDICES. Un conflicto en un índice (por ejemplo datos
+    duplicados para uno único) se registra y no impide crear los demás.
+    """
+    resultado = {}
+    for coleccion, indices in INDICES.items():
+        creados = []
+        for indice in indices:
+            try:
+                creados += await db[coleccion].create_indexes([indice])
+            except OperationFailure as e:
+                logger.error(f"No se pudo crear el índice {indice.document['name']} en {coleccion}: {e}")
+        resultado[coleccion] = creados
+    return resultado
+
+
+def _etapas(plan: dict) -> List[str]:
+    # Recorre el árbol del plan (inputStage / inputStages / queryPlan) y devuelve las etapas
+    etapas = []
+    pendientes = [plan]
+    while pendientes:
+        nodo = pendientes.pop()
+        if not isinstance(nodo, dict):
+            continue
+        if "stage" in nodo:
+            etapas.append(nodo["stage"])
+        for clave in ("inputStage", "queryPlan", "outerStage", "innerStage"):
+            if clave in nodo:
+                pendientes.append(nodo[clave])
+        pendientes.extend(nodo.get("inputStages", []))
+    return etapas
+
+
+async def explicar_consultas(db: AsyncIOMotorDatabase) -> List[dict]:
+    """
+    Ejecuta explain() sobre cada consulta de CONSULTAS_CALIENTES y marca las que hacen COLLSCAN.
+    """
+    reporte = []
+    for nombre, coleccion, filtro, orden in CONSULTAS_CALIENTES:
+        comando = {"find": coleccion, "filter": filtro, "limit": 50}
+        if orden:
+            comando["sort"] = dict(orden)
+        explicacion = await db.command("explain", comando, verbosity="queryPlanner")
+        etapas = _etapas(explicacion.get("queryPlanner", {}).get("winningPlan", {}))
+        reporte.append({
+            "consulta": nombre,
+            "coleccion": coleccion,
+            "etapas": etapas,
+            "collscan": "COLLSCAN" in etapas,
+        })
+    return reporte
+
+
+async def _main(argumentos: List[str]):
+    from app.db.dbp import db
+
+    creados = await asegurar_indices(db)
+    for coleccion, nombres in creados.items():
+        print(f"{coleccion}: {', '.join(nombres) or '-'}")
+
+    if "--explain" in argumentos:
+        print()
+        for fila in await explicar_consultas(db):
+            marca = "COLLSCAN" if fila["collscan"] else "ok"
+            print(f"[{marca:8}] {fila['consulta']} ({fila['coleccion']}): {' <- '.join(fila['etapas'])}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1:]))
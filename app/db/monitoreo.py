@@ -0,0 +1,65 @@
+"""
+Listener de comandos de pymongo: tiempos por colección y operación, y perfil por petición
+"""
+from threading import Lock
+
+from pymongo import monitoring
+
+from app.utils.metricas import db_duracion, db_fallos
+from app.utils.perfilador import forma_del_comando, perfil_actual
+
+# Comandos de mantenimiento de la conexión que no interesan para medir consultas
+COMANDOS_IGNORADOS = {"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions", "buildInfo"}
+
+
+def coleccion_del_comando(nombre: str, comando: dict) -> str:
+    # find/insert/update/aggregate/... llevan la colección como valor del comando; getMore en "collection"
+    if nombre == "getMore":
+        return str(comando.get("collection", "-"))
+    valor = comando.get(nombre)
+    return valor if isinstance(valor, str) else "-"
+
+
+class MonitorComandos(monitoring.CommandListener):
+    """
+    Registra la duración de cada comando en mongodb_command_duration_seconds.
+
+    Los eventos llegan desde los hilos de Motor; la colección se recuerda entre el
+    started y el succeeded/failed del mismo request_id. Si la petición se está perfilando,
+    el comando también se anota en su perfil con la forma de la consulta.
+    """
+
+    def __init__(self):
+        self._pendientes = {}
+        self._lock = Lock()
+
+    def started(self, event):
+        if event.command_name in COMANDOS_IGNORADOS:
+            return
+        coleccion = coleccion_del_comando(event.command_name, event.command)
+        perfil = perfil_actual.get()
+        forma = forma_del_comando(event.command_name, coleccion, event.command) if perfil else None
+        with self._lock:
+            self._pendientes[(event.request_id, event.connection_id)] = (coleccion, perfil, forma)
+
+    def succeeded(self, event):
+        self._terminar(event, fallido=False)
+
+    def failed(self, event):
+        self._terminar(event, fallido=True)
+
+    def _terminar(self, event, fallido: bool):
+        with self._lock:
+            pendiente = self._pendientes.pop((event.request_id, event.connection_id), None)
+        if pendiente is None:
+            return
+        coleccion, perfil, forma = pendiente
+        segundos = event.duration_micros / 1_000_000
+        db_duracion.observar(segundos, collection=coleccion, command=event.command_name)
+        if fallido:
+            db_fallos.inc(collection=coleccion, command=event.command_name)
+        if perfil is not None:
+            perfil.registrar(forma, segundos, fallido)
+
+
+monitor_comandos = MonitorComandos()
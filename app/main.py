@@ -1,6 +1,5 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 # Importamos routers de las diferentes rutas de la aplicación
 from app.routes.user_routes import router as user_router
 from app.routes.tickets_routes import router as tickets_router
@@ -9,11 +8,34 @@ from app.routes.attachments_routes import router as attachments_router
 from app.routes.departments_routes import router as departments_router
 from app.routes.messages_routes import router as message_router
 from app.routes.auth import router as auth_router
+from app.routes.analytics_routes import router as analytics_router
+from app.routes.eventos_routes import router as eventos_router
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from app.utils.email_queue import cola_correos
+from app.utils.catalogos import catalogos
+from app.models.contadores import reconciliador_contadores
+from app.utils.metricas import MiddlewareMetricas, registro
+from app.utils.perfilador import MiddlewarePerfilador, perfiles
+from config import PROFILER_ENABLED
+from fastapi import HTTPException
+from app.auth.cache import cache_usuarios
+from app.auth.hashing import pool_contrasenas
+from app.auth.tokens import versiones_token
+from app.auth.revocacion import revocaciones
+from app.utils.eventos import hub_eventos
+from fastapi.responses import PlainTextResponse
+from app.db.dbp import db
+from app.db.indexes import asegurar_indices
+from app.db.backfill import backfills_de_arranque
+from pymongo.errors import PyMongoError
+import asyncio
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 # Configuramos la plantilla de Jinja2 para servir HTML desde la carpeta 'templates'
 templates = Jinja2Templates(directory="templates")
 
@@ -28,13 +50,14 @@ app.include_router(categories_router, prefix="/categories", tags=["Categories"])
 app.include_router(attachments_router, prefix="/attachments", tags=["Attachments"])
 app.include_router(departments_router, prefix="/departments", tags=["Departments"])
 app.include_router(message_router, prefix="/messages", tags=["messages"])
+app.include_router(analytics_router, prefix="/analytics", tags=["Analytics"])
+app.include_router(eventos_router, prefix="/eventos", tags=["Eventos"])
 # app.include_router(message_router, prefix="/messages", tags=["messages"]) # Esta línea está duplicada, la dejo comentada
 
 # Asegúrate de que la carpeta existe
 os.makedirs("uploads", exist_ok=True)
-# Montamos una ruta estática para servir archivos estáticos desde la carpeta 'app/uploads'
+# Los adjuntos no se sirven como estáticos: solo por /attachments/{id}/content, que valida permisos
 os.makedirs("app/uploads", exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="app/uploads"), name="uploads")
 
 # Configuración CORS para permitir peticiones desde los orígenes listados
 origins = [
@@ -54,7 +77,75 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"], # Permitir todos los métodos HTTP (GET, POST, etc.)
     allow_headers=["*"], # Permitir todos los headers
+    expose_headers=["X-Profile-Id", "X-Profile-Summary"], # Resumen del perfilador legible desde el frontend
 )
+# Perfilador de consultas (solo con PROFILER_ENABLED y el encabezado X-Profile en la petición)
+app.add_middleware(MiddlewarePerfilador)
+# Métricas de latencia por ruta; se agrega al final para que envuelva a todos los demás middlewares
+app.add_middleware(MiddlewareMetricas)
+
+# Estado de componentes con contadores propios, copiado en medidores al exponer /metrics
+cache_usuarios_estado = registro.medidor("user_cache", "Caché de usuarios autenticados", ("dato",))
+cola_correos_estado = registro.medidor("email_queue", "Cola de correos", ("dato",))
+catalogos_documentos = registro.medidor("catalog_cache_documents", "Documentos en la caché de catálogos", ("catalogo",))
+pool_contrasenas_estado = registro.medidor("password_hash_pool", "Pool de hash de contraseñas", ("dato",))
+versiones_token_estado = registro.medidor("token_version_table", "Tabla de versiones de token", ("dato",))
+revocaciones_estado = registro.medidor("revoked_tokens_filter", "Filtro de tokens revocados", ("dato",))
+hub_eventos_estado = registro.medidor("events_hub", "Conexiones y eventos pendientes del hub en tiempo real", ("dato",))
+
+@registro.recolector
+def _recolectar_componentes():
+    for dato, valor in cache_usuarios.estadisticas().items():
+        cache_usuarios_estado.set(valor, dato=dato)
+    for dato, valor in cola_correos.estadisticas().items():
+        cola_correos_estado.set(valor, dato=dato)
+    for catalogo, cantidad in catalogos.estadisticas()["documentos"].items():
+        catalogos_documentos.set(cantidad, catalogo=catalogo)
+    for dato, valor in pool_contrasenas.estadisticas().items():
+        pool_contrasenas_estado.set(valor, dato=dato)
+    for dato, valor in versiones_token.estadisticas().items():
+        versiones_token_estado.set(valor, dato=dato)
+    for dato, valor in revocaciones.estadisticas().items():
+        revocaciones_estado.set(valor, dato=dato)
+    for dato, valor in hub_eventos.estadisticas().items():
+        hub_eventos_estado.set(valor, dato=dato)
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registro.exponer(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile/{perfil_id}", include_in_schema=False)
+def debug_profile(perfil_id: str):
+    perfil = perfiles.obtener(perfil_id) if PROFILER_ENABLED else None
+    if perfil is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return perfil.resumen()
+
+# Tareas en segundo plano que viven lo mismo que la aplicación
+@app.on_event("startup")
+async def iniciar_servicios():
+    # Índices idempotentes: en un arranque normal no crean nada nuevo
+    try:
+        await asegurar_indices(db)
+    except PyMongoError as e:
+        logger.error(f"No se pudieron verificar los índices de MongoDB: {e}")
+    try:
+        await catalogos.iniciar(db)
+    except PyMongoError as e:
+        logger.error(f"No se pudieron cargar los catálogos; se cargarán en la primera lectura: {e}")
+    await cola_correos.iniciar()
+    reconciliador_contadores.iniciar(db)
+    # En segundo plano: mientras corre, las bandejas y los listados de creados usan el
+    # predicado anterior para esos tickets
+    app.state.backfill_arranque = asyncio.create_task(backfills_de_arranque(db))
+
+@app.on_event("shutdown")
+async def detener_servicios():
+    app.state.backfill_arranque.cancel()
+    await reconciliador_contadores.detener()
+    await catalogos.detener()
+    pool_contrasenas.detener()
+    await cola_correos.detener()
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,200 @@
+"""
+Analítica de tickets: eventos de cambio de estado y rollups por hora y por día
+
+Cada cambio de estado se guarda en `ticket_events` y se suma, con una sola escritura por
+granularidad, a los documentos de `ticket_rollups`:
+    {"_id": "<granularidad>|<inicio ISO>|<department>", "granularidad", "inicio", "department",
+     "creados", "cerrados", "transiciones": {"1>2": n},
+     "tiempo_en_estado": {"<estado>": sketch}, "tiempo_abierto": sketch}
+
+Las consultas leen solo rollups: días completos de los documentos diarios y los bordes del
+rango de los horarios, así un rango arbitrario (redondeado a la hora) no recorre tickets.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from app.models.tickets import ESTADOS
+from app.utils import sketch
+
+logger = logging.getLogger(__name__)
+
+EVENTOS = "ticket_events"
+ROLLUPS = "ticket_rollups"
+HORA = "hora"
+DIA = "dia"
+GRANULARIDADES = (HORA, DIA)
+ESTADOS_CIERRE = {"0", "5"}
+CUANTILES = [0.5, 0.9, 0.99]
+SIN_DEPARTAMENTO = "-"
+
+
+def inicio_bucket(momento: datetime, granularidad: str) -> datetime:
+    if granularidad == DIA:
+        return momento.replace(hour=0, minute=0, second=0, microsecond=0)
+    return momento.replace(minute=0, second=0, microsecond=0)
+
+
+def _segundos(desde: Optional[datetime], hasta: datetime) -> Optional[float]:
+    return (hasta - desde).total_seconds() if isinstance(desde, datetime) else None
+
+
+def _unir(*actualizaciones: dict) -> dict:
+    # Combina varios documentos de actualización ({"$inc": ..., "$max": ...}) en uno
+    resultado = {}
+    for actualizacion in actualizaciones:
+        for operador, campos in actualizacion.items():
+            resultado.setdefault(operador, {}).update(campos)
+    return resultado
+
+
+def _operaciones_rollup(department: str, momento: datetime, actualizacion: dict) -> List[UpdateOne]:
+    operaciones = []
+    for granularidad in GRANULARIDADES:
+        inicio = inicio_bucket(momento, granularidad)
+        operaciones.append(UpdateOne(
+            {"_id": f"{granularidad}|{inicio.isoformat()}|{department}"},
+            _unir(actualizacion, {"$setOnInsert": {"granularidad": granularidad, "inicio": inicio, "department": department}}),
+            upsert=True,
+        ))
+    return operaciones
+
+
+async def registrar_creacion(db: AsyncIOMotorDatabase, ticket: dict):
+    """
+    Suma el ticket a `creados` en sus buckets. Un fallo se registra y no interrumpe la petición.
+    """
+    department = ticket.get("assigned_department") or SIN_DEPARTAMENTO
+    try:
+        await db[ROLLUPS].bulk_write(_operaciones_rollup(department, ticket["createdAt"], {"$inc": {"creados": 1}}), ordered=False)
+    except PyMongoError as e:
+        logger.error(f"No se pudo registrar la creación del ticket {ticket.get('_id')} en analítica: {e}")
+
+
+async def registrar_transicion(db: AsyncIOMotorDatabase, ticket: dict, estado_anterior: str, estado_nuevo: str, momento: datetime):
+    """
+    Guarda el evento y lo suma a los rollups. `ticket` es el documento previo al cambio
+    (con statusChangedAt y createdAt). Un fallo se registra y no interrumpe la petición.
+    """
+    department = ticket.get("assigned_department") or SIN_DEPARTAMENTO
+    en_estado = _segundos(ticket.get("statusChangedAt") or ticket.get("createdAt"), momento)
+    abierto = _segundos(ticket.get("createdAt"), momento) if estado_nuevo in ESTADOS_CIERRE else None
+
+    actualizaciones = [{"$inc": {f"transiciones.{estado_anterior}>{estado_nuevo}": 1}}]
+    if en_estado is not None:
+        actualizaciones.append(sketch.actualizacion_mongo(f"tiempo_en_estado.{estado_anterior}", en_estado))
+    if estado_nuevo in ESTADOS_CIERRE:
+        actualizaciones.append({"$inc": {"cerrados": 1}})
+        if abierto is not None:
+            actualizaciones.append(sketch.actualizacion_mongo("tiempo_abierto", abierto))
+
+    try:
+        await db[EVENTOS].insert_one({
+            "ticket_id": str(ticket["_id"]),
+            "department": department,
+            "category": ticket.get("category"),
+            "de": estado_anterior,
+            "a": estado_nuevo,
+            "en": momento,
+            "segundos_en_estado": en_estado,
+        })
+        await db[ROLLUPS].bulk_write(_operaciones_rollup(department, momento, _unir(*actualizaciones)), ordered=False)
+    except PyMongoError as e:
+        logger.error(f"No se pudo registrar el cambio de estado del ticket {ticket.get('_id')} en analítica: {e}")
+
+
+def _tramos(desde: datetime, hasta: datetime) -> List[Tuple[str, datetime, datetime]]:
+    """
+    Divide [desde, hasta) en tramos por granularidad: horas sueltas en los bordes y días completos al medio.
+    """
+    desde = inicio_bucket(desde, HORA)
+    if hasta != inicio_bucket(hasta, HORA):
+        hasta = inicio_bucket(hasta, HORA) + timedelta(hours=1)
+    if desde >= hasta:
+        return []
+    primer_dia = inicio_bucket(desde, DIA)
+    if primer_dia < desde:
+        primer_dia += timedelta(days=1)
+    ultimo_dia = inicio_bucket(hasta, DIA)
+    if primer_dia >= ultimo_dia:
+        return [(HORA, desde, hasta)]
+    tramos = []
+    if desde < primer_dia:
+        tramos.append((HORA, desde, primer_dia))
+    tramos.append((DIA, primer_dia, ultimo_dia))
+    if ultimo_dia < hasta:
+        tramos.append((HORA, ultimo_dia, hasta))
+    return tramos
+
+
+async def leer_rollups(
+    db: AsyncIOMotorDatabase,
+    desde: datetime,
+    hasta: datetime,
+    department: Optional[str] = None,
+    granularidad: Optional[str] = None,
+) -> List[dict]:
+    """
+    Lee los rollups que cubren [desde, hasta). Con granularidad fija se usa solo esa.
+    """
+    if granularidad:
+        tramos = [(granularidad, inicio_bucket(desde, granularidad), hasta)]
+    else:
+        tramos = _tramos(desde, hasta)
+    condiciones = [{"granularidad": g, "inicio": {"$gte": inicio, "$lt": fin}} for g, inicio, fin in tramos]
+    if not condiciones:
+        return []
+    filtro = {"$or": condiciones}
+    if department:
+        filtro = {"department": department, **filtro}
+    return await db[ROLLUPS].find(filtro).sort("inicio", 1).to_list(None)
+
+
+def _estadistica(sketch_combinado: dict) -> dict:
+    n = sketch_combinado["n"]
+    return {
+        "n": n,
+        "promedio": sketch_combinado["suma"] / n if n else None,
+        "min": sketch_combinado["min"],
+        "max": sketch_combinado["max"],
+        **sketch.cuantiles(sketch_combinado, CUANTILES),
+    }
+
+
+def resumir(rollups: List[dict]) -> dict:
+    """
+    Combina rollups en un resumen: totales, transiciones y percentiles de tiempos (en segundos).
+    """
+    transiciones = {}
+    for rollup in rollups:
+        for clave, conteo in (rollup.get("transiciones") or {}).items():
+            transiciones[clave] = transiciones.get(clave, 0) + conteo
+    return {
+        "creados": sum(r.get("creados", 0) for r in rollups),
+        "cerrados": sum(r.get("cerrados", 0) for r in rollups),
+        "transiciones": transiciones,
+        "tiempo_abierto": _estadistica(sketch.combinar(r.get("tiempo_abierto") for r in rollups)),
+        "tiempo_en_estado": {
+            nombre: _estadistica(sketch.combinar((r.get("tiempo_en_estado") or {}).get(str(codigo)) for r in rollups))
+            for codigo, nombre in ESTADOS.items()
+        },
+    }
+
+
+def serie(rollups: List[dict]) -> List[dict]:
+    """
+    Creados y cerrados por bucket (y departamento), en orden cronológico.
+    """
+    return [
+        {
+            "inicio": r["inicio"],
+            "department": r.get("department"),
+            "creados": r.get("creados", 0),
+            "cerrados": r.get("cerrados", 0),
+        }
+        for r in rollups
+    ]
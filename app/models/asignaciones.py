@@ -0,0 +1,193 @@
+"""
+Asignación masiva de usuarios a tickets
+
+El ticket guarda los ids asignados en `assigned_users` (lo que consultan los listados) y
+`ticket_assigned_users` guarda una fila por (ticket, usuario) con quién y cuándo asignó.
+Las dos colecciones se actualizan con un bulk_write cada una, dentro de una transacción.
+"""
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from bson import ObjectId, errors
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import DeleteMany, UpdateOne
+from pymongo.errors import OperationFailure
+
+from app.models.bandejas import claves_usuarios
+from app.models.eventos_tickets import ASIGNACION, publicar_evento_ticket
+
+logger = logging.getLogger(__name__)
+
+# Estados en los que ya no se puede cambiar la asignación (cancelado, completado)
+ESTADOS_CERRADOS = {"0", "5"}
+
+# Código de Mongo cuando el servidor no admite transacciones (standalone sin replica set)
+CODIGO_SIN_TRANSACCIONES = 20
+
+_transacciones_disponibles = True
+
+
+def ids_asignados(ticket: dict) -> set:
+    # Tickets antiguos guardan {"user_id": ...}; los nuevos, el id como string
+    return {str(u["user_id"]) if isinstance(u, dict) else str(u) for u in ticket.get("assigned_users") or []}
+
+
+def _resultado(ticket_id: str, codigo: int = 200, error: Optional[str] = None, agregados=(), quitados=()) -> dict:
+    return {
+        "ticket_id": ticket_id,
+        "ok": error is None,
+        "codigo": codigo,
+        "error": error,
+        "agregados": list(agregados),
+        "quitados": list(quitados),
+    }
+
+
+async def _escribir(db: AsyncIOMotorDatabase, ops_tickets: list, ops_asignaciones: list, session=None):
+    if ops_tickets:
+        await db["tickets"].bulk_write(ops_tickets, ordered=True, session=session)
+    if ops_asignaciones:
+        await db["ticket_assigned_users"].bulk_write(ops_asignaciones, ordered=True, session=session)
+
+
+async def aplicar_asignaciones(db: AsyncIOMotorDatabase, operaciones: List[dict], usuario) -> List[dict]:
+    """
+    Agrega y quita usuarios en uno o varios tickets.
+
+    Cada operación es {"ticket_id", "agregar": [...], "quitar": [...]}. Las que no pasan la
+    validación se informan en su resultado y no se escriben; las válidas se aplican todas juntas.
+    """
+    global _transacciones_disponibles
+
+    # Una sola lectura de tickets y una de usuarios para validar todas las operaciones
+    object_ids = {}
+    for op in operaciones:
+        try:
+            object_ids[op["ticket_id"]] = ObjectId(op["ticket_id"])
+        except (errors.InvalidId, TypeError):
+            pass
+    tickets = {
+        str(t["_id"]): t
+        async for t in db["tickets"].find(
+            {"_id": {"$in": list(object_ids.values())}},
+            {"status": 1, "assigned_department": 1, "assigned_users": 1, "created_user_id": 1, "created_user_department": 1},
+        )
+    }
+
+    por_agregar = set()
+    for op in operaciones:
+        por_agregar.update(op.get("agregar") or [])
+    usuarios_validos = set()
+    ids_usuarios = [ObjectId(u) for u in por_agregar if ObjectId.is_valid(u)]
+    if ids_usuarios:
+        # Usuarios antiguos guardan el departamento como ObjectId
+        departamentos = [usuario.department] + ([ObjectId(usuario.department)] if ObjectId.is_valid(usuario.department) else [])
+        filtro = {"_id": {"$in": ids_usuarios}, "department": {"$in": departamentos}}
+        async for u in db["users"].find(filtro, {"_id": 1}):
+            usuarios_validos.add(str(u["_id"]))
+
+    ahora = datetime.utcnow()
+    resultados = []
+    ops_tickets = []
+    ops_asignaciones = []
+    for op in operaciones:
+        ticket_id = op["ticket_id"]
+        agregar = list(dict.fromkeys(op.get("agregar") or []))
+        quitar = list(dict.fromkeys(op.get("quitar") or []))
+
+        if ticket_id not in object_ids:
+            resultados.append(_resultado(ticket_id, 400, "ID de ticket inválido"))
+            continue
+        ticket = tickets.get(ticket_id)
+        if ticket is None:
+            resultados.append(_resultado(ticket_id, 404, "Ticket no encontrado"))
+            continue
+        if ticket.get("status") in ESTADOS_CERRADOS:
+            resultados.append(_resultado(ticket_id, 400, "No se pueden asignar usuarios a un ticket cancelado o completado"))
+            continue
+        if ticket.get("assigned_department") != usuario.department:
+            resultados.append(_resultado(ticket_id, 403, "Solo el departamento asignado al ticket puede asignar usuarios"))
+            continue
+        if set(agregar) & set(quitar):
+            resultados.append(_resultado(ticket_id, 400, "Un usuario no puede agregarse y quitarse a la vez"))
+            continue
+        invalidos = [u for u in agregar if u not in usuarios_validos]
+        if invalidos:
+            resultados.append(_resultado(ticket_id, 400, f"Los siguientes usuarios no pertenecen a tu departamento: {invalidos}"))
+            continue
+
+        actuales = ids_asignados(ticket)
+        agregados = [u for u in agregar if u not in actuales]
+        quitados = [u for u in quitar if u in actuales]
+        oid = object_ids[ticket_id]
+        # $addToSet y $pull sobre el mismo campo no pueden ir en un mismo update.
+        # Solo se agregan los que no estaban, tampoco en la forma antigua {"user_id": ...}
+        if agregados:
+            ops_tickets.append(UpdateOne(
+                {"_id": oid},
+                {
+                    "$addToSet": {"assigned_users": {"$each": agregados}, "inbox_keys": {"$each": claves_usuarios(agregados)}},
+                    "$set": {"updatedAt": ahora},
+                },
+            ))
+        for user_id in agregar:
+            ops_asignaciones.append(UpdateOne(
+                {"ticket_id": ticket_id, "user_id": user_id},
+                {"$setOnInsert": {"ticket_id": ticket_id, "user_id": user_id, "assigned_by": str(usuario.id), "createdAt": ahora}},
+                upsert=True,
+            ))
+        if quitar:
+            ops_tickets.append(UpdateOne(
+                {"_id": oid},
+                {
+                    "$pull": {"assigned_users": {"$in": quitar}, "inbox_keys": {"$in": claves_usuarios(quitar)}},
+                    "$set": {"updatedAt": ahora},
+                },
+            ))
+            legados_presentes = {str(u.get("user_id")) for u in ticket.get("assigned_users") or [] if isinstance(u, dict)}
+            if legados_presentes & set(quitar):
+                # Un $pull no puede comparar a la vez strings y subdocumentos: la forma antigua va aparte
+                legados = quitar + [ObjectId(u) for u in quitar if ObjectId.is_valid(u)]
+                ops_tickets.append(UpdateOne({"_id": oid}, {"$pull": {"assigned_users": {"user_id": {"$in": legados}}}}))
+            ops_asignaciones.append(DeleteMany({"ticket_id": ticket_id, "user_id": {"$in": quitar}}))
+        resultados.append(_resultado(ticket_id, agregados=agregados, quitados=quitados))
+
+    if not ops_tickets:
+        return resultados
+
+    escrito = False
+    if _transacciones_disponibles:
+        try:
+            async with await db.client.start_session() as session:
+                async with session.start_transaction():
+                    await _escribir(db, ops_tickets, ops_asignaciones, session)
+            escrito = True
+        except OperationFailure as e:
+            if e.code != CODIGO_SIN_TRANSACCIONES:
+                raise
+            _transacciones_disponibles = False
+            logger.warning("El servidor de MongoDB no admite transacciones; las asignaciones se escriben sin ellas")
+
+    if not escrito:
+        # Sin transacción: las operaciones son idempotentes, reintentar la petición deja ambas colecciones iguales
+        await _escribir(db, ops_tickets, ops_asignaciones)
+    _publicar_eventos(resultados, tickets, ahora)
+    return resultados
+
+
+def _publicar_eventos(resultados: List[dict], tickets: dict, ahora: datetime):
+    for resultado in resultados:
+        if not resultado["ok"] or not (resultado["agregados"] or resultado["quitados"]):
+            continue
+        ticket = tickets[resultado["ticket_id"]]
+        quitados = set(resultado["quitados"])
+        asignados = [u for u in ids_asignados(ticket) if u not in quitados] + resultado["agregados"]
+        # Los quitados también reciben el evento: el ticket sale de su bandeja
+        publicar_evento_ticket(
+            ASIGNACION,
+            {**ticket, "assigned_users": asignados, "updatedAt": ahora},
+            usuarios_extra=resultado["quitados"],
+            agregados=resultado["agregados"],
+            quitados=resultado["quitados"],
+        )
@@ -3,6 +3,15 @@ from sqlalchemy.orm import relationship, selectinload
 from app.db.base import Base
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select 
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import ObjectId
+from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import os
+from app.utils.uploads import ResultadoUpload, descartar_upload, mover_a_destino, subcarpeta_por_hash
+from config import UPLOAD_DIR
 
 class Attachment(Base):
     __tablename__ = 'attachments'
@@ -32,3 +41,172 @@ async def obtener_attachments(db: AsyncSession):
         return [attachments_to_dict(att) for att in attachments]
     except Exception as e:
         raise e
+
+async def crear_attachment(db: AsyncIOMotorDatabase, attachment_data: dict) -> dict:
+    """
+    Registra un archivo adjunto en la colección de Mongo y devuelve el documento con su _id.
+    """
+    attachment_data["createdAt"] = datetime.utcnow()
+    result = await db["attachments"].insert_one(attachment_data)
+    attachment_data["_id"] = result.inserted_id
+    return attachment_data
+
+def attachment_documento_a_dict(attachment: dict) -> dict:
+    return {
+        "id": str(attachment["_id"]),
+        "file_name": attachment.get("file_name"),
+        "file_path": attachment.get("file_path"),
+        "file_extension": attachment.get("file_extension"),
+        "ticket_id": attachment.get("ticket_id"),
+        "size": attachment.get("size"),
+        "sha256": attachment.get("sha256"),
+    }
+
+async def generar_nombre_incremental(db: AsyncIOMotorDatabase, nombre_base: str, extension: str) -> str:
+    """
+    Devuelve el siguiente nombre "<base>_NNNN.<ext>" usando un contador atómico por nombre base.
+
+    El $inc con upsert es atómico en Mongo, así que dos subidas simultáneas del mismo archivo
+    nunca obtienen el mismo número y no hace falta listar la carpeta de uploads.
+    """
+    contador = await db["counters"].find_one_and_update(
+        {"_id": f"attachments:{nombre_base}.{extension}"},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return f"{nombre_base}_{contador['seq']:04d}.{extension}"
+
+# Almacén direccionado por contenido: un archivo físico por SHA-256, compartido entre adjuntos
+BLOBS_DIR = os.path.join(UPLOAD_DIR, "blobs")
+
+# Estado de un blob cuyo archivo se está borrando (lápida): se trata como si no existiera
+BLOB_BORRANDO = "borrando"
+
+def ruta_blob(sha256: str, extension: str, sufijo: str = "") -> tuple:
+    """
+    Devuelve (file_path lógico bajo /uploads, ruta en disco) del blob con ese hash.
+    /uploads ya no se sirve como estático: el contenido se descarga por /attachments/{id}/content.
+    """
+    nombre = f"{sha256}{sufijo}.{extension}" if extension else f"{sha256}{sufijo}"
+    relativa = f"blobs/{subcarpeta_por_hash(sha256)}/{nombre}"
+    return f"/uploads/{relativa}", os.path.join(UPLOAD_DIR, relativa)
+
+async def almacenar_blob(db: AsyncIOMotorDatabase, subido: ResultadoUpload, extension: str) -> dict:
+    """
+    Agrega una referencia al blob del archivo subido, creándolo si es la primera vez.
+
+    Si el contenido ya existía solo se incrementa `refs` y se descarta el temporal, así que
+    volver a subir los mismos bytes no ocupa disco adicional. Un blob en BLOB_BORRANDO no
+    cuenta: se revive con una ruta nueva, para que el borrado en curso no toque el archivo.
+    """
+    blobs = db["attachment_blobs"]
+    while True:
+        file_path, ruta_disco = ruta_blob(subido.sha256, extension)
+        creacion = ObjectId()
+        try:
+            blob = await blobs.find_one_and_update(
+                {"_id": subido.sha256, "estado": {"$ne": BLOB_BORRANDO}},
+                {
+                    "$inc": {"refs": 1},
+                    "$setOnInsert": {
+                        "file_path": file_path,
+                        "disk_path": ruta_disco,
+                        "size": subido.tamano,
+                        "createdAt": datetime.utcnow(),
+                        "creacion": creacion,
+                    },
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            propio = blob.get("creacion") == creacion
+            break
+        except DuplicateKeyError:
+            # Existe una lápida: se reemplaza por un blob nuevo con una ruta distinta
+            file_path, ruta_disco = ruta_blob(subido.sha256, extension, f"-{creacion}")
+            blob = await blobs.find_one_and_update(
+                {"_id": subido.sha256, "estado": BLOB_BORRANDO},
+                {
+                    "$set": {"refs": 1, "file_path": file_path, "disk_path": ruta_disco,
+                             "size": subido.tamano, "createdAt": datetime.utcnow(), "creacion": creacion},
+                    "$unset": {"estado": ""},
+                },
+                return_document=ReturnDocument.AFTER,
+            )
+            if blob is not None:
+                propio = True
+                break
+            # El borrado terminó entre medio: se reintenta la inserción normal
+
+    # El blob existente conserva su ruta (y extensión) original; si el archivo falta se repone
+    if not propio and await asyncio.to_thread(os.path.exists, blob["disk_path"]):
+        await descartar_upload(subido)
+    else:
+        await mover_a_destino(subido, blob["disk_path"])
+    return blob
+
+async def liberar_blob(db: AsyncIOMotorDatabase, sha256: str) -> bool:
+    """
+    Quita una referencia al blob y borra el archivo cuando ya nadie lo usa.
+
+    Al llegar a cero el documento se marca BLOB_BORRANDO (solo si sigue en cero), luego se
+    borra el archivo y al final el documento, solo si nadie lo revivió entre medio.
+    """
+    blobs = db["attachment_blobs"]
+    blob = await blobs.find_one_and_update(
+        {"_id": sha256},
+        {"$inc": {"refs": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not blob or blob["refs"] > 0:
+        return False
+    blob = await blobs.find_one_and_update(
+        {"_id": sha256, "refs": {"$lte": 0}, "estado": {"$ne": BLOB_BORRANDO}},
+        {"$set": {"estado": BLOB_BORRANDO}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if blob is None:
+        return False
+    try:
+        await asyncio.to_thread(os.remove, blob["disk_path"])
+    except FileNotFoundError:
+        pass
+    await blobs.delete_one({"_id": sha256, "estado": BLOB_BORRANDO, "creacion": blob.get("creacion")})
+    return True
+
+async def eliminar_attachment(db: AsyncIOMotorDatabase, attachment_id: str) -> bool:
+    """
+    Elimina un adjunto y libera su referencia al blob si tenía uno.
+    """
+    try:
+        object_id = ObjectId(attachment_id)
+    except Exception:
+        return False # ID inválido
+    attachment = await db["attachments"].find_one_and_delete({"_id": object_id})
+    if not attachment:
+        return False
+    if attachment.get("blob_id"):
+        await liberar_blob(db, attachment["blob_id"])
+    return True
+
+async def obtener_attachment_por_id(db: AsyncIOMotorDatabase, attachment_id: str) -> dict:
+    """
+    Obtiene un adjunto por su ID, o None si no existe o el ID es inválido.
+    """
+    try:
+        object_id = ObjectId(attachment_id)
+    except Exception:
+        return None # ID inválido
+    return await db["attachments"].find_one({"_id": object_id})
+
+def ruta_en_disco(attachment: dict) -> str:
+    """
+    Traduce el file_path lógico (/uploads/...) a la ruta real dentro de UPLOAD_DIR.
+    """
+    relativa = attachment.get("file_path", "").removeprefix("/uploads/").lstrip("/")
+    base = os.path.realpath(UPLOAD_DIR)
+    ruta = os.path.realpath(os.path.join(base, relativa))
+    if os.path.commonpath([base, ruta]) != base:
+        return None # Ruta fuera de la carpeta de uploads
+    return ruta
@@ -0,0 +1,84 @@
+"""
+Bandejas de tickets materializadas en el propio ticket (`inbox_keys`)
+
+Cada ticket guarda las claves de las bandejas donde aparece:
+    u:<user_id>          asignado a ese usuario
+    d:<department_id>    asignado a ese departamento
+
+Los tickets creados por un departamento no usan clave: se consultan por el campo
+created_user_department con su propio índice. Si hay tickets sin ese campo se averigua una
+sola vez por proceso; el backfill lo marca como completo al terminar.
+
+Con el índice (inbox_keys, createdAt, _id) cada bandeja es una lectura de rango sobre el
+índice, sin importar cuántos usuarios tenga el departamento. Los tickets que todavía no
+tienen inbox_keys (escritos antes del campo, hasta que corre el backfill) se buscan con el
+predicado anterior.
+"""
+from typing import Iterable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+PREFIJO_USUARIO = "u:"
+PREFIJO_DEPARTAMENTO = "d:"
+
+# None hasta la primera consulta. Una vez en False no vuelve a cambiar: los tickets nuevos
+# siempre se crean con created_user_department (None si el creador no tiene departamento)
+_faltan_departamentos_creador: Optional[bool] = None
+
+
+def clave_usuario(user_id) -> str:
+    return f"{PREFIJO_USUARIO}{user_id}"
+
+
+def clave_departamento(department_id) -> str:
+    return f"{PREFIJO_DEPARTAMENTO}{department_id}"
+
+
+def claves_usuarios(user_ids: Iterable) -> List[str]:
+    return [clave_usuario(u) for u in user_ids]
+
+
+def filtro_bandeja_usuario(user_id) -> dict:
+    return {"$or": [
+        {"inbox_keys": clave_usuario(user_id)},
+        {"inbox_keys": {"$exists": False}, "assigned_users": str(user_id)},
+    ]}
+
+
+def filtro_bandeja_departamento(department_id) -> dict:
+    return {"$or": [
+        {"inbox_keys": clave_departamento(department_id)},
+        {"inbox_keys": {"$exists": False}, "assigned_department": department_id},
+    ]}
+
+
+def calcular_inbox_keys(ticket: dict) -> List[str]:
+    """
+    Calcula las claves a partir de los campos del ticket.
+    """
+    claves = []
+    for asignado in ticket.get("assigned_users") or []:
+        user_id = asignado.get("user_id") if isinstance(asignado, dict) else asignado
+        if user_id:
+            claves.append(clave_usuario(user_id))
+    if ticket.get("assigned_department"):
+        claves.append(clave_departamento(ticket["assigned_department"]))
+    return list(dict.fromkeys(claves))
+
+
+async def faltan_departamentos_creador(db: AsyncIOMotorDatabase) -> bool:
+    """
+    Si quedan tickets sin created_user_department (anteriores al campo, hasta el backfill).
+    """
+    global _faltan_departamentos_creador
+    if _faltan_departamentos_creador is None:
+        pendiente = await db["tickets"].find_one({"created_user_department": {"$exists": False}}, {"_id": 1})
+        # Si el backfill terminó mientras tanto, su marca prevalece
+        if _faltan_departamentos_creador is None:
+            _faltan_departamentos_creador = pendiente is not None
+    return _faltan_departamentos_creador
+
+
+def marcar_departamentos_creador_completos():
+    global _faltan_departamentos_creador
+    _faltan_departamentos_creador = False
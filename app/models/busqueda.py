@@ -0,0 +1,95 @@
+"""
+Búsqueda de texto en tickets sobre el índice de texto de MongoDB
+
+El índice `busqueda_texto` cubre title, description y `mensajes_texto`, una copia en el
+ticket de los últimos SEARCH_MAX_MESSAGES_PER_TICKET mensajes (Mongo no indexa texto entre
+colecciones). Se usa el analizador "spanish": stemming en español y sin distinguir acentos
+ni mayúsculas. El orden es por textScore, ponderado por campo.
+"""
+import base64
+import json
+from typing import Optional
+
+from bson import ObjectId, errors
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.models.tickets import CAMPO_MENSAJES, PROFUNDIDAD_NOMBRES, construir_pipeline_enriquecimiento
+from config import SEARCH_MAX_MESSAGES_PER_TICKET
+
+PESOS = {"title": 10, "description": 4, CAMPO_MENSAJES: 1}
+
+
+def _codificar_cursor(puntaje: float, ticket_id: ObjectId) -> str:
+    crudo = json.dumps({"s": puntaje, "i": str(ticket_id)}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip("=")
+
+
+def _decodificar_cursor(cursor: str) -> tuple:
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return float(payload["s"]), ObjectId(payload["i"])
+    except (ValueError, KeyError, TypeError, errors.InvalidId):
+        raise HTTPException(status_code=400, detail="Cursor de búsqueda inválido")
+
+
+async def indexar_mensaje(db: AsyncIOMotorDatabase, ticket_id: ObjectId, texto: str):
+    """
+    Agrega el texto de un mensaje nuevo a la copia buscable del ticket (conserva los últimos N).
+    """
+    await db["tickets"].update_one(
+        {"_id": ticket_id},
+        {"$push": {CAMPO_MENSAJES: {"$each": [texto], "$slice": -SEARCH_MAX_MESSAGES_PER_TICKET}}},
+    )
+
+
+async def buscar_tickets(
+    db: AsyncIOMotorDatabase,
+    texto: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    assigned_department: Optional[str] = None,
+    status: Optional[str] = None,
+    profundidad: str = PROFUNDIDAD_NOMBRES,
+    transformar=None,
+) -> dict:
+    """
+    Devuelve una página de tickets ordenados por relevancia, con el mismo sobre que los listados.
+
+    La página siguiente se pide con el cursor (puntaje, _id) del último resultado.
+    """
+    filtro = {"$text": {"$search": texto, "$language": "spanish"}}
+    if assigned_department:
+        filtro["assigned_department"] = assigned_department
+    if status is not None:
+        filtro["status"] = status
+
+    pipeline = [
+        {"$match": filtro},
+        {"$addFields": {"_puntaje": {"$meta": "textScore"}}},
+    ]
+    if cursor:
+        puntaje, ultimo_id = _decodificar_cursor(cursor)
+        pipeline.append({"$match": {"$or": [
+            {"_puntaje": {"$lt": puntaje}},
+            {"_puntaje": puntaje, "_id": {"$lt": ultimo_id}},
+        ]}})
+    pipeline += [
+        {"$sort": {"_puntaje": -1, "_id": -1}},
+        {"$limit": limit + 1},
+    ] + construir_pipeline_enriquecimiento(profundidad)
+
+    documentos = await db["tickets"].aggregate(pipeline).to_list(length=limit + 1)
+    hay_mas = len(documentos) > limit
+    pagina = documentos[:limit]
+    items = []
+    for documento in pagina:
+        item = transformar(documento) if transformar else documento
+        item["score"] = round(documento["_puntaje"], 4)
+        items.append(item)
+    return {
+        "items": items,
+        "next_cursor": _codificar_cursor(pagina[-1]["_puntaje"], pagina[-1]["_id"]) if hay_mas and pagina else None,
+        "limit": limit,
+    }
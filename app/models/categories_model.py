@@ -2,6 +2,7 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from typing import List, Optional
 from datetime import datetime
+from app.utils.nombres import normalizar_nombre
 
 # No necesitamos un modelo de base de datos aquí, solo funciones para interactuar con la colección
 
@@ -28,8 +29,11 @@ async def obtener_category_por_id(db: AsyncIOMotorDatabase, category_id: str) ->
 async def crear_category(db: AsyncIOMotorDatabase, category_data: dict) -> dict:
     """
     Crea una nueva categoría en la base de datos.
+
+    El índice único sobre name_key hace que un nombre repetido falle con DuplicateKeyError.
     """
     categories_collection = db["categories"]
+    category_data["name_key"] = normalizar_nombre(category_data["name"])
     category_data["createdAt"] = datetime.utcnow()
     category_data["updatedAt"] = datetime.utcnow()
     result = await categories_collection.insert_one(category_data)
@@ -46,6 +50,8 @@ async def actualizar_category(db: AsyncIOMotorDatabase, category_id: str, update
     except Exception:
         return None # ID inválido
     
+    if "name" in update_data:
+        update_data["name_key"] = normalizar_nombre(update_data["name"])
     update_data["updated_at"] = datetime.utcnow()
     result = await categories_collection.update_one(
         {"_id": object_id},
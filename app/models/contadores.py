@@ -0,0 +1,151 @@
+"""
+Contadores precalculados de tickets por departamento, categoría y estado
+
+Un documento por (departamento asignado, categoría) en `ticket_counters`:
+    {"_id": "<department>|<category>", "department", "category", "total", "por_estado": {"1": 12, ...}}
+
+Se actualizan con $inc al crear un ticket y al cambiar su estado; un job periódico los
+recalcula desde `tickets` para corregir cualquier desvío.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import DeleteMany, ReplaceOne
+from pymongo.errors import PyMongoError
+
+from app.models.tickets import ESTADOS
+from config import TICKET_COUNTERS_RECONCILE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+COLECCION = "ticket_counters"
+SIN_VALOR = "-"
+
+
+def _id_contador(department, category) -> str:
+    return f"{department or SIN_VALOR}|{category or SIN_VALOR}"
+
+
+def _filtro_contador(ticket: dict) -> dict:
+    return {"_id": _id_contador(ticket.get("assigned_department"), ticket.get("category"))}
+
+
+def _campos_contador(ticket: dict) -> dict:
+    return {"department": ticket.get("assigned_department") or None, "category": ticket.get("category") or None}
+
+
+async def contar_ticket_creado(db: AsyncIOMotorDatabase, ticket: dict):
+    await db[COLECCION].update_one(
+        _filtro_contador(ticket),
+        {
+            "$inc": {"total": 1, f"por_estado.{ticket.get('status')}": 1},
+            "$setOnInsert": _campos_contador(ticket),
+        },
+        upsert=True,
+    )
+
+
+async def contar_cambio_estado(db: AsyncIOMotorDatabase, ticket: dict, estado_anterior: str, estado_nuevo: str):
+    if estado_anterior == estado_nuevo:
+        return
+    await db[COLECCION].update_one(
+        _filtro_contador(ticket),
+        {
+            "$inc": {f"por_estado.{estado_anterior}": -1, f"por_estado.{estado_nuevo}": 1},
+            "$setOnInsert": {**_campos_contador(ticket), "total": 0},
+        },
+        upsert=True,
+    )
+
+
+async def obtener_estadisticas(db: AsyncIOMotorDatabase, department: Optional[str] = None, category: Optional[str] = None) -> dict:
+    """
+    Suma los contadores que coinciden con los filtros: lee solo documentos de ticket_counters.
+    """
+    filtro = {}
+    if department:
+        filtro["department"] = department
+    if category:
+        filtro["category"] = category
+
+    total = 0
+    por_estado = {}
+    async for contador in db[COLECCION].find(filtro):
+        total += contador.get("total", 0)
+        for estado, cantidad in (contador.get("por_estado") or {}).items():
+            por_estado[estado] = por_estado.get(estado, 0) + cantidad
+
+    return {
+        "total": total,
+        "por_estado": [
+            {"codigo": str(codigo), "nombre": nombre, "total": por_estado.get(str(codigo), 0)}
+            for codigo, nombre in ESTADOS.items()
+        ],
+    }
+
+
+async def reconciliar_contadores(db: AsyncIOMotorDatabase) -> int:
+    """
+    Recalcula todos los contadores con una agregación sobre tickets y reemplaza los documentos.
+
+    Un $inc concurrente con la reconciliación puede perderse; el siguiente ciclo lo corrige.
+    """
+    pipeline = [
+        {"$group": {
+            "_id": {"department": "$assigned_department", "category": "$category", "status": "$status"},
+            "total": {"$sum": 1},
+        }},
+    ]
+    contadores = {}
+    async for fila in db["tickets"].aggregate(pipeline):
+        grupo = fila["_id"]
+        clave = _id_contador(grupo.get("department"), grupo.get("category"))
+        contador = contadores.setdefault(clave, {
+            "_id": clave,
+            "department": grupo.get("department") or None,
+            "category": grupo.get("category") or None,
+            "total": 0,
+            "por_estado": {},
+        })
+        contador["total"] += fila["total"]
+        estado = str(grupo.get("status"))
+        contador["por_estado"][estado] = contador["por_estado"].get(estado, 0) + fila["total"]
+
+    ahora = datetime.utcnow()
+    operaciones = [ReplaceOne({"_id": c["_id"]}, {**c, "reconciliadoEn": ahora}, upsert=True) for c in contadores.values()]
+    operaciones.append(DeleteMany({"_id": {"$nin": list(contadores)}}))
+    await db[COLECCION].bulk_write(operaciones, ordered=True)
+    return len(contadores)
+
+
+class ReconciliadorContadores:
+    # Tarea en segundo plano que llama a reconciliar_contadores cada `intervalo` segundos
+    def __init__(self, intervalo: float):
+        self.intervalo = intervalo
+        self._tarea: Optional[asyncio.Task] = None
+
+    def iniciar(self, db: AsyncIOMotorDatabase):
+        if self._tarea or self.intervalo <= 0:
+            return
+        self._tarea = asyncio.create_task(self._ciclo(db))
+
+    async def detener(self):
+        if self._tarea:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+
+    async def _ciclo(self, db: AsyncIOMotorDatabase):
+        while True:
+            try:
+                cantidad = await reconciliar_contadores(db)
+                logger.info(f"Contadores de tickets reconciliados: {cantidad} documento(s)")
+            except PyMongoError as e:
+                logger.error(f"No se pudieron reconciliar los contadores de tickets: {e}")
+            await asyncio.sleep(self.intervalo)
+
+
+reconciliador_contadores = ReconciliadorContadores(TICKET_COUNTERS_RECONCILE_SECONDS)
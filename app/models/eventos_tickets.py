@@ -0,0 +1,54 @@
+"""
+Eventos de tickets para el hub en tiempo real (app.utils.eventos)
+
+Cada evento es un delta compacto, no el ticket completo:
+    {"tipo": "ticket_creado" | "estado" | "mensaje" | "asignacion", "ticket_id", "status",
+     "assigned_department", "updatedAt", ...datos propios del tipo}
+
+Lo reciben las conexiones que ven el ticket: el creador y su departamento, los usuarios
+asignados y el departamento asignado.
+"""
+from typing import Iterable, List
+
+from app.models.bandejas import calcular_inbox_keys, clave_departamento, clave_usuario, claves_usuarios
+from app.utils.eventos import hub_eventos
+
+TICKET_CREADO = "ticket_creado"
+ESTADO = "estado"
+MENSAJE = "mensaje"
+ASIGNACION = "asignacion"
+
+
+def claves_suscripcion(usuario) -> List[str]:
+    """
+    Claves con las que se suscribe una conexión del usuario autenticado.
+    """
+    claves = [clave_usuario(usuario.id)]
+    if usuario.department:
+        claves.append(clave_departamento(usuario.department))
+    return claves
+
+
+def claves_visibilidad(ticket: dict) -> List[str]:
+    claves = calcular_inbox_keys(ticket)
+    if ticket.get("created_user_id"):
+        claves.append(clave_usuario(ticket["created_user_id"]))
+    if ticket.get("created_user_department"):
+        claves.append(clave_departamento(ticket["created_user_department"]))
+    return list(dict.fromkeys(claves))
+
+
+def publicar_evento_ticket(tipo: str, ticket: dict, usuarios_extra: Iterable[str] = (), **datos) -> int:
+    """
+    Publica el delta del ticket. `usuarios_extra` suma destinatarios que ya no ven el ticket
+    (p. ej. usuarios recién quitados de la asignación).
+    """
+    evento = {
+        "tipo": tipo,
+        "ticket_id": str(ticket["_id"]),
+        "status": ticket.get("status"),
+        "assigned_department": ticket.get("assigned_department"),
+        "updatedAt": ticket.get("updatedAt"),
+        **datos,
+    }
+    return hub_eventos.publicar(claves_visibilidad(ticket) + claves_usuarios(usuarios_extra), evento)
@@ -39,6 +39,15 @@ async def obtener_mensajes(db: AsyncSession):
     result = await db.execute(select(Message))
     mensajes = result.scalars().all()
     return [messages_helper(m) for m in mensajes]
+def mensaje_documento_a_dict(mensaje: dict) -> dict:
+    return {
+        "id": str(mensaje["_id"]),
+        "message": mensaje.get("message"),
+        "created_by_id": mensaje.get("created_by_id"),
+        "ticket_id": mensaje.get("ticket_id"),
+        "createdAt": mensaje.get("createdAt"),
+    }
+
 async def obtener_mensajes(db: AsyncIOMotorDatabase) -> List[dict]:
     """
     Obtiene todos los mensajes de la base de datos.
@@ -1,99 +1,134 @@
-from app.db.db import tickets_collection, categories_collection, departments_collection, user_collection, messages_collection
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 
-async def obtener_tickets():
-    try:
-        # Usamos un agregador para optimizar la carga de datos
-        pipeline = [
-            {
-                "$lookup": {
-                    "from": "categories", 
-                    "localField": "category", 
-                    "foreignField": "_id", 
-                    "as": "category_info"
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "departments", 
-                    "localField": "assigned_department", 
-                    "foreignField": "_id", 
-                    "as": "department_info"
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "users", 
-                    "localField": "assigned_users", 
-                    "foreignField": "_id", 
-                    "as": "assigned_users_info"
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "messages", 
-                    "localField": "messages", 
-                    "foreignField": "_id", 
-                    "as": "messages_info"
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "users", 
-                    "localField": "created_user", 
-                    "foreignField": "_id", 
-                    "as": "created_user_info"
-                }
-            },
-            {
-                "$project": {
-                    "_id": 1,
-                    "title": 1,
-                    "description": 1,
-                    "status": 1,
-                    "createdAt": 1,
-                    "updatedAt": 1,
-                    "category_info.name": 1,
-                    "department_info.name": 1,
-                    "assigned_users_info.name": 1,
-                    "assigned_users_info.email": 1,
-                    "messages_info.message": 1,
-                    "created_user_info.name": 1,
-                    "created_user_info.email": 1,
-                }
+# Profundidades de proyección soportadas por el motor de enriquecimiento
+PROFUNDIDAD_IDS = "ids"              # Solo los ids guardados en el ticket, sin $lookup
+PROFUNDIDAD_NOMBRES = "nombres"      # Categoría, departamento y usuarios con sus nombres
+PROFUNDIDAD_COMPLETO = "completo"    # Además mensajes y archivos adjuntos del ticket
+PROFUNDIDADES = (PROFUNDIDAD_IDS, PROFUNDIDAD_NOMBRES, PROFUNDIDAD_COMPLETO)
+PATRON_PROFUNDIDAD = f"^({'|'.join(PROFUNDIDADES)})$"
+
+# Estados de un ticket (se guardan en `status` como string: "0".."5")
+ESTADOS = {
+    0: "Cancelado",
+    1: "Abierto",
+    2: "Proceso",
+    3: "Espera",
+    4: "Revisión",
+    5: "Completado"
+}
+
+# Campos de usuario que se exponen en created_user / assigned_users
+CAMPOS_USUARIO = {"fullname": 1, "email": 1, "phone_ext": 1}
+
+# Copia del texto de los mensajes para el índice de búsqueda (app.models.busqueda); no se
+# devuelve en ninguna respuesta
+CAMPO_MENSAJES = "mensajes_texto"
+
+
+def _a_object_id(expresion) -> dict:
+    # Los tickets guardan los ids como string o como ObjectId; los inválidos quedan en null
+    return {"$convert": {"input": expresion, "to": "objectId", "onError": None, "onNull": None}}
+
+
+def _lookup(coleccion: str, campo_local: str, campo_foraneo: str, proyeccion: dict, destino: str) -> dict:
+    # localField/foreignField usa el índice de la colección destino; el pipeline recorta los campos (MongoDB 5.0+)
+    return {
+        "$lookup": {
+            "from": coleccion,
+            "localField": campo_local,
+            "foreignField": campo_foraneo,
+            "pipeline": [{"$project": proyeccion}],
+            "as": destino,
+        }
+    }
+
+
+def construir_pipeline_enriquecimiento(profundidad: str = PROFUNDIDAD_NOMBRES) -> list:
+    """
+    Construye las etapas $lookup/$project que resuelven las referencias de un ticket.
+
+    Se agrega después de $match/$sort/$limit para que los lookups solo corran sobre la página pedida.
+    """
+    # Primero se descarta la copia de los mensajes: puede pesar más que el resto del ticket
+    sin_mensajes = {"$project": {CAMPO_MENSAJES: 0}}
+    if profundidad == PROFUNDIDAD_IDS:
+        return [sin_mensajes]
+
+    referencias = {
+        "_ref_category": _a_object_id("$category"),
+        "_ref_department": _a_object_id("$assigned_department"),
+        "_ref_creator": _a_object_id({"$ifNull": ["$created_user_id", "$created_user"]}),
+        "_ref_assigned": {
+            "$map": {
+                "input": {"$ifNull": ["$assigned_users", []]},
+                "as": "u",
+                "in": _a_object_id({"$ifNull": ["$$u.user_id", "$$u"]}),
             }
+        },
+    }
+    etapas = [
+        sin_mensajes,
+        {"$addFields": referencias},
+        _lookup("categories", "_ref_category", "_id", {"name": 1}, "category_info"),
+        _lookup("departments", "_ref_department", "_id", {"name": 1}, "department_info"),
+        _lookup("users", "_ref_creator", "_id", CAMPOS_USUARIO, "created_user_info"),
+        _lookup("users", "_ref_assigned", "_id", CAMPOS_USUARIO, "assigned_users_info"),
+    ]
+
+    if profundidad == PROFUNDIDAD_COMPLETO:
+        etapas += [
+            {"$addFields": {"_ref_ticket": {"$toString": "$_id"}}},
+            _lookup("messages", "_ref_ticket", "ticket_id", {"message": 1, "created_by_id": 1, "createdAt": 1}, "messages_info"),
+            _lookup("attachments", "_ref_ticket", "ticket_id", {"file_name": 1, "file_path": 1, "file_extension": 1}, "attachments_info"),
         ]
-        
-        # Ejecutamos el pipeline de agregación para obtener los datos optimizados
-        tickets_list = []
-        async for ticket in tickets_collection.aggregate(pipeline):
-            # Procesamos los resultados del pipeline
-            ticket_info = {
-                "id": str(ticket["_id"]),
-                "title": ticket.get("title"),
-                "description": ticket.get("description"),
-                "category": {"name": ticket["category_info"][0]["name"]} if ticket["category_info"] else None,
-                "assigned_department": {"name": ticket["department_info"][0]["name"]} if ticket["department_info"] else None,
-                "assigned_users": [
-                    {"id": str(user["_id"]), "name": user.get("name"), "email": user.get("email")}
-                    for user in ticket["assigned_users_info"]
-                ],
-                "created_user": {
-                    "id": str(ticket["created_user_info"][0]["_id"]),
-                    "name": ticket["created_user_info"][0].get("name"),
-                    "email": ticket["created_user_info"][0].get("email")
-                } if ticket["created_user_info"] else None,
-                "mensajes": [
-                    {"id": str(mensaje["_id"]), "message": mensaje.get("message")}
-                    for mensaje in ticket["messages_info"]
-                ],
-                "status": ticket.get("status"),
-                "createdAt": ticket.get("createdAt"),
-                "updatedAt": ticket.get("updatedAt"),
-            }
-            tickets_list.append(ticket_info)
-        
-        return tickets_list
-    except Exception as e:
-        return {"error": str(e)}
 
+    # Los campos _ref_* solo existen durante la agregación
+    auxiliares = list(referencias) + (["_ref_ticket"] if profundidad == PROFUNDIDAD_COMPLETO else [])
+    etapas.append({"$project": {campo: 0 for campo in auxiliares}})
+    return etapas
+
+
+def construir_pipeline_tickets(
+    filtro: dict,
+    profundidad: str = PROFUNDIDAD_NOMBRES,
+    orden: Optional[list] = None,
+    limite: Optional[int] = None,
+) -> list:
+    """
+    Pipeline completo: filtro, orden y límite primero, enriquecimiento después.
+    """
+    pipeline = [{"$match": filtro}]
+    if orden:
+        pipeline.append({"$sort": dict(orden)})
+    if limite:
+        pipeline.append({"$limit": limite})
+    return pipeline + construir_pipeline_enriquecimiento(profundidad)
+
+
+def obtener_tickets_enriquecidos(
+    db: AsyncIOMotorDatabase,
+    filtro: dict,
+    profundidad: str = PROFUNDIDAD_NOMBRES,
+    orden: Optional[list] = None,
+    limite: Optional[int] = None,
+    tamano_lote: Optional[int] = None,
+):
+    """
+    Devuelve el cursor de una única agregación con los tickets ya enriquecidos.
+    """
+    opciones = {"batchSize": tamano_lote} if tamano_lote else {}
+    return db["tickets"].aggregate(construir_pipeline_tickets(filtro, profundidad, orden, limite), **opciones)
+
+
+async def obtener_ticket_enriquecido(
+    db: AsyncIOMotorDatabase,
+    ticket_id: ObjectId,
+    profundidad: str = PROFUNDIDAD_COMPLETO,
+) -> Optional[dict]:
+    """
+    Obtiene un solo ticket enriquecido, o None si no existe.
+    """
+    tickets = await obtener_tickets_enriquecidos(db, {"_id": ticket_id}, profundidad, limite=1).to_list(length=1)
+    return tickets[0] if tickets else None
@@ -3,60 +3,131 @@ from bson import ObjectId
 from typing import List, Optional
 from bson import ObjectId, errors
 from datetime import datetime
+import logging
 from bson import ObjectId, errors
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List
 from app.db import db
 from bson import ObjectId
+from app.models.tickets import PROFUNDIDAD_NOMBRES, obtener_tickets_enriquecidos
+from app.utils.pagination import ORDEN_KEYSET, combinar_filtros, filtro_despues_de, paginar
+
+logger = logging.getLogger(__name__)
+
+def _primero(lista):
+    return lista[0] if lista else None
+
+
+def _usuario_info(usuario) -> dict:
+    return {
+        "id": str(usuario["_id"]),
+        "fullname": usuario.get("fullname"),
+        "email": usuario.get("email"),
+        "phone_ext": usuario.get("phone_ext"),
+    }
+
 
 def ticket_helper(ticket) -> dict:
+    """
+    Convierte un ticket de Mongo en la respuesta de la API.
+
+    Si el ticket viene del motor de enriquecimiento (app.models.tickets) se usan los campos
+    *_info resueltos por $lookup; si no, los nombres quedan en None y solo se exponen los ids.
+    """
+    categoria = _primero(ticket.get("category_info"))
+    departamento = _primero(ticket.get("department_info"))
+    creador = _primero(ticket.get("created_user_info"))
+    creador_id = ticket.get("created_user_id") or ticket.get("created_user")
+
+    if "assigned_users_info" in ticket:
+        asignados = [_usuario_info(u) for u in ticket["assigned_users_info"]]
+    else:
+        asignados = [
+            {
+                "id": str(u) if isinstance(u, ObjectId) else u,  # Convertir ObjectId a string
+                "fullname": None,
+                "email": None,
+                "phone_ext": None,
+            } for u in ticket.get("assigned_users", [])
+        ]
+
+    if "messages_info" in ticket:
+        mensajes = [
+            {"id": str(m["_id"]), "content": m.get("message"), "createdAt": m.get("createdAt")}
+            for m in ticket["messages_info"]
+        ]
+    else:
+        mensajes = [
+            {
+                "id": str(m) if isinstance(m, ObjectId) else m,  # Convertir ObjectId a string
+                "content": None,
+                "createdAt": None,
+            } for m in ticket.get("messages", [])
+        ]
+
+    if "attachments_info" in ticket:
+        adjuntos = [
+            {
+                "id": str(a["_id"]),
+                "file_name": a.get("file_name"),
+                "file_path": a.get("file_path"),
+                "file_extension": a.get("file_extension"),
+            } for a in ticket["attachments_info"]
+        ]
+    else:
+        adjuntos = [
+            {
+                "id": str(a) if isinstance(a, ObjectId) else a,  # Convertir ObjectId a string
+                "file_name": None,
+                "file_path": None,
+                "file_extension": None,
+            } for a in ticket.get("attachments", [])
+        ]
+
     return {
         "id": str(ticket["_id"]),  # Convertir ObjectId a string
         "title": ticket.get("title"),
         "description": ticket.get("description"),
         "category": {
             "id": str(ticket.get("category")) if ticket.get("category") else None,
-            "name": None  # Aquí puedes agregar lógica para obtener el nombre de la categoría si es necesario
+            "name": categoria.get("name") if categoria else None,
         },
         "assigned_department": {
             "id": str(ticket.get("assigned_department")) if ticket.get("assigned_department") else None,
-            "name": None  # Aquí puedes agregar lógica para obtener el nombre del departamento si es necesario
+            "name": departamento.get("name") if departamento else None,
         },
-        "created_user": {
-            "id": str(ticket.get("created_user")) if ticket.get("created_user") else None,
-            "fullname": None,  # Aquí puedes agregar lógica para obtener el nombre completo del usuario si es necesario
-            "email": None,  # Aquí puedes agregar lógica para obtener el email del usuario si es necesario
-            "phone_ext": None,  # Aquí puedes agregar lógica para obtener la extensión telefónica del usuario si es necesario
+        "created_user": _usuario_info(creador) if creador else {
+            "id": str(creador_id) if creador_id else None,
+            "fullname": None,
+            "email": None,
+            "phone_ext": None,
         },
         "status": ticket.get("status"),
         "createdAt": ticket.get("createdAt"),
         "updatedAt": ticket.get("updatedAt"),
-        "assigned_users": [
-            {
-                "id": str(u) if isinstance(u, ObjectId) else u,  # Convertir ObjectId a string
-                "fullname": None,  # Aquí puedes agregar lógica para obtener el nombre completo del usuario asignado
-                "email": None,  # Aquí puedes agregar lógica para obtener el email del usuario asignado
-                "phone_ext": None,  # Aquí puedes agregar lógica para obtener la extensión telefónica del usuario asignado
-            } for u in ticket.get("assigned_users", [])
-        ],
-        "messages": [
-            {
-                "id": str(m) if isinstance(m, ObjectId) else m,  # Convertir ObjectId a string
-                "content": None,  # Aquí puedes agregar lógica para obtener el contenido del mensaje
-                "createdAt": None,  # Aquí puedes agregar lógica para obtener la fecha de creación del mensaje
-            } for m in ticket.get("messages", [])
-        ],
-        "attachments": [
-            {
-                "id": str(a) if isinstance(a, ObjectId) else a,  # Convertir ObjectId a string
-                "file_name": None,  # Aquí puedes agregar lógica para obtener el nombre del archivo
-                "file_path": None,  # Aquí puedes agregar lógica para obtener la ruta del archivo
-                "file_extension": None,  # Aquí puedes agregar lógica para obtener la extensión del archivo
-            } for a in ticket.get("attachments", [])
-        ],
+        "assigned_users": asignados,
+        "messages": mensajes,
+        "attachments": adjuntos,
     }
 
 
+def usuario_puede_ver_ticket(ticket: dict, user) -> bool:
+    """
+    Un usuario ve un ticket si lo creó, si es de su departamento o si está asignado a él.
+    """
+    user_id = str(user.id)
+    if str(ticket.get("created_user_id") or ticket.get("created_user") or "") == user_id:
+        return True
+    if user.department and str(ticket.get("assigned_department") or "") == str(user.department):
+        return True
+    for asignado in ticket.get("assigned_users", []):
+        if isinstance(asignado, dict):
+            asignado = asignado.get("user_id")
+        if str(asignado) == user_id:
+            return True
+    return False
+
+
 class Ticket:
        def __init__(self, **kwargs):
            self.id = str(kwargs.get("_id"))  # Convertir ObjectId a string
@@ -84,11 +155,53 @@ async def obtener_tickets(db: AsyncIOMotorDatabase) -> List[dict]:
     return tickets_data
 
 
+def construir_filtro_tickets(
+    status: Optional[str] = None,
+    assigned_department: Optional[str] = None,
+    category: Optional[str] = None,
+    fecha_desde: Optional[datetime] = None,
+    fecha_hasta: Optional[datetime] = None,
+) -> dict:
+    """
+    Construye el filtro de Mongo para los listados de tickets a partir de los parámetros opcionales.
+    """
+    filtro = {}
+    if status is not None:
+        filtro["status"] = status
+    if assigned_department:
+        filtro["assigned_department"] = assigned_department
+    if category:
+        filtro["category"] = category
+    if fecha_desde or fecha_hasta:
+        rango = {}
+        if fecha_desde:
+            rango["$gte"] = fecha_desde
+        if fecha_hasta:
+            rango["$lt"] = fecha_hasta
+        filtro["createdAt"] = rango
+    return filtro
+
+
+async def obtener_tickets_paginados(
+    db: AsyncIOMotorDatabase,
+    filtro: dict,
+    limit: int,
+    cursor: Optional[str] = None,
+    profundidad: str = PROFUNDIDAD_NOMBRES,
+) -> dict:
+    """
+    Obtiene una página de tickets enriquecidos ordenada por (createdAt, _id) descendente.
+    """
+    consulta = combinar_filtros(filtro, filtro_despues_de(cursor))
+    cursor_mongo = obtener_tickets_enriquecidos(db, consulta, profundidad, ORDEN_KEYSET, limit + 1)
+    return await paginar(cursor_mongo, limit, ticket_helper)
+
+
 async def obtener_tickets_asignados_a_usuario(db: AsyncIOMotorDatabase, user_id: str) -> List[dict]:
     """
     Obtiene todos los tickets asignados a un usuario específico.
     """
-    print("Tipo de db:", type(db))
+    logger.debug(f"Tipo de db: {type(db)}")
     try:
         user_object_id = ObjectId(user_id)
     except errors.InvalidId:
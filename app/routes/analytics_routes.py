@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from bson import ObjectId, errors
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.auth.dependencies import get_current_user
+from app.db.dbp import get_db
+from app.models import analitica
+from app.models.tickets_model import usuario_puede_ver_ticket
+from app.auth.tokens import UsuarioToken
+
+router = APIRouter()
+
+PATRON_GRANULARIDAD = f"^({'|'.join(analitica.GRANULARIDADES)})$"
+RANGO_POR_DEFECTO = timedelta(days=30)
+
+
+def _utc(fecha: Optional[datetime]) -> Optional[datetime]:
+    # Los rollups guardan UTC sin zona: una fecha con zona (?desde=...Z o +02:00) se convierte
+    if fecha is not None and fecha.tzinfo is not None:
+        return fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+def _rango(desde: Optional[datetime], hasta: Optional[datetime]) -> tuple:
+    desde, hasta = _utc(desde), _utc(hasta)
+    hasta = hasta or datetime.utcnow()
+    desde = desde or hasta - RANGO_POR_DEFECTO
+    if desde >= hasta:
+        raise HTTPException(status_code=400, detail="El rango de fechas es inválido: desde debe ser anterior a hasta")
+    return desde, hasta
+
+# 1. Resumen SLA: creados, cerrados, transiciones y percentiles de tiempo abierto y por estado
+@router.get("/resumen")
+async def get_resumen(
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    department: Optional[str] = None,
+    db=Depends(get_db),
+    current_user: UsuarioToken = Depends(get_current_user),
+):
+    """
+    Resume el rango [desde, hasta) (redondeado a la hora) a partir de los rollups.
+    """
+    desde, hasta = _rango(desde, hasta)
+    rollups = await analitica.leer_rollups(db, desde, hasta, department)
+    return {"desde": desde, "hasta": hasta, "department": department, **analitica.resumir(rollups)}
+
+# 2. Throughput: tickets creados y cerrados por hora o por día
+@router.get("/throughput")
+async def get_throughput(
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    department: Optional[str] = None,
+    granularidad: str = Query(analitica.DIA, pattern=PATRON_GRANULARIDAD),
+    db=Depends(get_db),
+    current_user: UsuarioToken = Depends(get_current_user),
+):
+    desde, hasta = _rango(desde, hasta)
+    rollups = await analitica.leer_rollups(db, desde, hasta, department, granularidad)
+    return {"granularidad": granularidad, "serie": analitica.serie(rollups)}
+
+# 3. Historial de cambios de estado de un ticket
+@router.get("/tickets/{ticket_id}/eventos")
+async def get_eventos_ticket(
+    ticket_id: str,
+    db=Depends(get_db),
+    current_user: UsuarioToken = Depends(get_current_user),
+):
+    try:
+        ticket_oid = ObjectId(ticket_id)
+    except errors.InvalidId:
+        raise HTTPException(status_code=400, detail="ID de ticket inválido")
+    ticket = await db["tickets"].find_one(
+        {"_id": ticket_oid},
+        {"created_user_id": 1, "created_user": 1, "assigned_department": 1, "assigned_users": 1},
+    )
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Ticket no encontrado")
+    if not usuario_puede_ver_ticket(ticket, current_user):
+        raise HTTPException(status_code=403, detail="No tienes permiso para ver este ticket")
+
+    eventos = await db[analitica.EVENTOS].find({"ticket_id": ticket_id}, {"_id": 0}).sort("en", 1).to_list(None)
+    return eventos
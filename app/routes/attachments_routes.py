@@ -1,69 +1,135 @@
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile,Form
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile,Form
+from fastapi.responses import FileResponse, Response
+from bson import ObjectId
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.auth.dependencies import get_current_user
-from app.models.user_model import User
+from app.auth.tokens import UsuarioToken
 from app.Schemas.Attachment import AttachmentCreate, AttachmentUpdate
-from app.models.attachments_model import Attachment, attachments_to_dict, obtener_attachments
+from app.models.attachments_model import (
+    Attachment, attachments_to_dict, obtener_attachments, crear_attachment, attachment_documento_a_dict,
+    BLOBS_DIR, almacenar_blob, eliminar_attachment, obtener_attachment_por_id, ruta_en_disco,
+)
+from app.models.tickets_model import usuario_puede_ver_ticket
 from app.db.dbp import get_db
+from app.utils.uploads import recibir_upload
+from config import ATTACHMENTS_X_ACCEL_PREFIX, UPLOAD_DIR
 import os
-import shutil
-from uuid import uuid4
+
+# El contenido de un blob nunca cambia (su nombre es su hash), así que se puede cachear por un año
+CACHE_INMUTABLE = "private, max-age=31536000, immutable"
+CACHE_LEGADO = "private, max-age=3600"
 
 router = APIRouter()
 
 # Ruta para obtener los attachments
 @router.get("/")
-async def read_attachments(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def read_attachments(db: AsyncSession = Depends(get_db), current_user: UsuarioToken = Depends(get_current_user)):
     attachments = await obtener_attachments(db)
     return attachments
 
 # Ruta para obtener un attachment
 @router.get("/{attachment_id}")
-async def get_attachment_by_id(attachment_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_attachment_by_id(attachment_id: int, db: AsyncSession = Depends(get_db), current_user: UsuarioToken = Depends(get_current_user)):
     result = await db.execute(select(Attachment).filter(Attachment.id == attachment_id))
     attachment = result.scalar_one_or_none()
     if not attachment:
         raise HTTPException(status_code=404, detail="Archivo no encontrado")
     return attachments_to_dict(attachment)
 
+async def _verificar_ticket(db, ticket_id, current_user) -> dict:
+    # El ticket debe existir y el usuario debe poder verlo (creador, su departamento o asignado)
+    ticket = await db["tickets"].find_one(
+        {"_id": ObjectId(ticket_id)},
+        {"created_user_id": 1, "created_user": 1, "assigned_department": 1, "assigned_users": 1},
+    ) if ObjectId.is_valid(str(ticket_id)) else None
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Ticket no encontrado")
+    if not usuario_puede_ver_ticket(ticket, current_user):
+        raise HTTPException(status_code=403, detail="No tienes permiso sobre los archivos de este ticket")
+    return ticket
+
+def _etag_coincide(if_none_match: str, etag: str) -> bool:
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato == "*" or candidato.removeprefix("W/") == etag:
+            return True
+    return False
+
+# Ruta para descargar el contenido de un attachment (Range, ETag y caché)
+@router.get("/{attachment_id}/content")
+async def get_attachment_content(
+    attachment_id: str,
+    request: Request,
+    db=Depends(get_db),
+    current_user: UsuarioToken = Depends(get_current_user)
+):
+    attachment = await obtener_attachment_por_id(db, attachment_id)
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+
+    # Solo quien puede ver el ticket puede descargar sus archivos
+    await _verificar_ticket(db, attachment.get("ticket_id"), current_user)
+
+    ruta = ruta_en_disco(attachment)
+    if not ruta or not os.path.isfile(ruta):
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+
+    headers = {"Cache-Control": CACHE_INMUTABLE if attachment.get("sha256") else CACHE_LEGADO}
+    if attachment.get("sha256"):
+        # ETag fuerte basado en el hash del contenido, igual en todas las réplicas
+        headers["ETag"] = f'"{attachment["sha256"]}"'
+        if _etag_coincide(request.headers.get("if-none-match", ""), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+    if ATTACHMENTS_X_ACCEL_PREFIX:
+        # nginx sirve el archivo con sendfile (y maneja Range) a partir de su ruta interna
+        relativa = os.path.relpath(ruta, os.path.realpath(UPLOAD_DIR)).replace(os.sep, "/")
+        headers["X-Accel-Redirect"] = f"{ATTACHMENTS_X_ACCEL_PREFIX.rstrip('/')}/{relativa}"
+        return Response(headers=headers, media_type=None)
+
+    # FileResponse maneja Range/If-Range (206) y lee el archivo por bloques sin cargarlo en memoria
+    return FileResponse(
+        ruta,
+        filename=attachment.get("file_name"),
+        content_disposition_type="inline",
+        headers=headers,
+    )
+
 
 #Ruta para crear un attachment
 @router.post("/", summary="Subir archivo adjunto para un ticket")
 async def create_attachment(
     file: UploadFile = File(...),
-    ticket_id: int = Form(...),
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    ticket_id: str = Form(...),
+    db=Depends(get_db),
+    current_user: UsuarioToken = Depends(get_current_user)
 ):
-    upload_dir = "uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-
-    unique_filename = f"{uuid4()}_{file.filename}"
-    file_path = os.path.join(upload_dir, unique_filename)
-
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
+    # Antes de recibir el archivo: el ticket existe y el usuario puede verlo
+    await _verificar_ticket(db, ticket_id, current_user)
     file_extension = os.path.splitext(file.filename)[1]
 
-    new_attachment = Attachment(
-        file_name=file.filename,
-        file_path=f"/uploads/{unique_filename}",
-        file_extension=file_extension,
-        ticket_id=ticket_id
-    )
+    # Almacén por contenido: si los bytes ya existen solo se agrega una referencia
+    subido = await recibir_upload(file, BLOBS_DIR)
+    blob = await almacenar_blob(db, subido, file_extension.lstrip(".").lower())
 
-    db.add(new_attachment)
-    await db.commit()
-    await db.refresh(new_attachment)
+    new_attachment = await crear_attachment(db, {
+        "file_name": file.filename,
+        "file_path": blob["file_path"],
+        "file_extension": file_extension,
+        "ticket_id": ticket_id,
+        "size": subido.tamano,
+        "sha256": subido.sha256,
+        "blob_id": blob["_id"],
+        "uploaded_by": str(current_user.id),
+    })
 
-    return attachments_to_dict(new_attachment)
+    return attachment_documento_a_dict(new_attachment)
 
 
 # Ruta para actualizar un attachment
 @router.put("/{attachment_id}")
-async def update_attachment(attachment_id: int, data: AttachmentUpdate, db: AsyncSession = Depends(get_db),current_user: User = Depends(get_current_user)):
+async def update_attachment(attachment_id: int, data: AttachmentUpdate, db: AsyncSession = Depends(get_db),current_user: UsuarioToken = Depends(get_current_user)):
     result = await db.execute(select(Attachment).filter(Attachment.id == attachment_id))
     attachment = result.scalar_one_or_none()
     if not attachment:
@@ -79,14 +145,16 @@ async def update_attachment(attachment_id: int, data: AttachmentUpdate, db: Asyn
 
 # Ruta para eliminar un attachment 
 @router.delete("/{attachment_id}")
-async def delete_attachment(attachment_id: int, db: AsyncSession = Depends(get_db),current_user: User = Depends(get_current_user)):
-    result = await db.execute(select(Attachment).filter(Attachment.id == attachment_id))
-    attachment = result.scalar_one_or_none()
+async def delete_attachment(attachment_id: str, db=Depends(get_db),current_user: UsuarioToken = Depends(get_current_user)):
+    attachment = await obtener_attachment_por_id(db, attachment_id)
     if not attachment:
         raise HTTPException(status_code=404, detail="Archivo no encontrado")
+    await _verificar_ticket(db, attachment.get("ticket_id"), current_user)
 
-    await db.delete(attachment)
-    await db.commit()
+    # Borra el adjunto y descuenta la referencia al blob; el archivo se elimina al llegar a cero
+    eliminado = await eliminar_attachment(db, attachment_id)
+    if not eliminado:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
     return {"message": "Archivo eliminado correctamente"}
 
 
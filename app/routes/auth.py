@@ -1,4 +1,7 @@
 import datetime
+import logging
+import uuid
+from jose import JWTError, jwt
 from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -7,11 +10,18 @@ from fastapi.security import OAuth2PasswordRequestForm
 from app.models.departments_model import Department
 from app.db.dbp import get_db  
 from app.models.user_model import User, usuario_helper
-from app.Schemas.Esquema import UserCreate, UserResponse  
-from app.auth.security import hash_password, verify_password, create_access_token
+from app.Schemas.Esquema import RefreshTokenRequest, UserCreate, UserResponse  
+from app.auth.security import create_access_token, create_refresh_token
+from app.auth.tokens import CLAIM_FAMILIA, CLAIM_TIPO, CLAIM_USUARIO, CLAIM_VERSION, TIPO_REFRESH, claims_de_usuario, versiones_token
+from app.auth.revocacion import revocaciones
+from config import ALGORITHM, REFRESH_TOKEN_EXPIRE_DAYS, SECRET_KEY
+from app.auth.hashing import hash_password_async, verify_password_async
+from app.utils.catalogos import catalogos, DEPARTAMENTOS
 from sqlalchemy import func
 from sqlalchemy.orm import selectinload
+from pymongo.errors import PyMongoError
 
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -41,7 +51,7 @@ async def register(user: UserCreate, db=Depends(get_db)):
         "phone_ext": user.phone_ext,
         "department": user.department,  # ID directo
         "username": user.username,
-        "password": hash_password(user.password),
+        "password": await hash_password_async(user.password),
         "status": user.status,
         "role": 0,
         "createdAt": datetime.datetime.utcnow(),
@@ -61,21 +71,36 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db=Depends(get
     # Primero obtenemos el usuario
     user = await db["users"].find_one({"username": form_data.username})
 
-    if not user or not verify_password(form_data.password, user["password"]):
+    if not user:
         raise HTTPException(status_code=401, detail="Usuario o contraseña incorrecto")
+    valida, nuevo_hash = await verify_password_async(form_data.password, user["password"])
+    if not valida:
+        raise HTTPException(status_code=401, detail="Usuario o contraseña incorrecto")
+
+    # Hash con un costo viejo: se reemplaza aprovechando que tenemos la contraseña en claro
+    if nuevo_hash:
+        try:
+            await db["users"].update_one(
+                {"_id": user["_id"], "password": user["password"]},
+                {"$set": {"password": nuevo_hash}},
+            )
+        except PyMongoError as e:
+            logger.error(f"No se pudo actualizar el hash de la contraseña de {user['username']}: {e}")
     
     if not user["status"]:
         raise HTTPException(status_code=401, detail="Usuario inactivo")
 
-    # Luego, si el usuario tiene department_id, hacemos otra consulta para obtenerlo
-    department = None
-    if user.get("department"):
-        department = await db["departments"].find_one({"_id": ObjectId(user["department"])})
+    # El departamento se resuelve desde la caché de catálogos, sin otra consulta
+    department = await catalogos.obtener(db, DEPARTAMENTOS, user.get("department"))
 
-    token = create_access_token(data={"sub": user["username"]})
+    claims = claims_de_usuario(user)
+    # El access token lleva la familia de su refresh token: si se revoca, deja de valer también
+    familia = uuid.uuid4().hex
+    token = create_access_token(data={**claims, CLAIM_FAMILIA: familia})
 
     return {
         "access_token": token,
+        "refresh_token": create_refresh_token(claims, familia=familia),
         "token_type": "bearer",
         "user": {
             "id": str(user["_id"]),
@@ -85,3 +110,52 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db=Depends(get
             } if department else None,
         }
 }
+
+@router.post("/token/refresh")
+async def refresh_token(data: RefreshTokenRequest, db=Depends(get_db)):
+    """
+    Cambia un refresh token por un access token nuevo y otro refresh token (rotación).
+
+    Solo se valida la firma y el estado de revocación, sin bcrypt ni leer el usuario. Si llega
+    un refresh token ya rotado, alguien más lo tiene: se revoca toda su familia.
+    """
+    credenciales_invalidas = HTTPException(
+        status_code=401,
+        detail="Refresh token inválido o revocado",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(data.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credenciales_invalidas
+    if payload.get(CLAIM_TIPO) != TIPO_REFRESH or not payload.get("jti") or not payload.get(CLAIM_FAMILIA):
+        raise credenciales_invalidas
+
+    jti = payload["jti"]
+    familia = payload[CLAIM_FAMILIA]
+    vence_familia = datetime.datetime.utcnow() + datetime.timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+    revocado = await revocaciones.revocado(db, jti, familia)
+    if revocado == jti:
+        logger.warning(f"Reuso del refresh token {jti} de {payload.get('sub')}: se revoca la familia {familia}")
+        await revocaciones.revocar_familia(db, familia, vence_familia)
+    if revocado:
+        raise credenciales_invalidas
+
+    # Los cambios de usuario que afectan los claims incrementan token_version (ver app.auth.tokens)
+    version = await versiones_token.version(db, payload.get(CLAIM_USUARIO))
+    if version is None or version != payload.get(CLAIM_VERSION, 0):
+        raise credenciales_invalidas
+
+    # Insert atómico: si otra petición rotó este mismo token primero, es un reuso
+    if not await revocaciones.consumir(db, jti, datetime.datetime.utcfromtimestamp(payload["exp"])):
+        logger.warning(f"Reuso del refresh token {jti} de {payload.get('sub')}: se revoca la familia {familia}")
+        await revocaciones.revocar_familia(db, familia, vence_familia)
+        raise credenciales_invalidas
+
+    claims = {clave: valor for clave, valor in payload.items() if clave not in ("exp", "jti", CLAIM_TIPO, CLAIM_FAMILIA)}
+    return {
+        "access_token": create_access_token(data={**claims, CLAIM_FAMILIA: familia}),
+        "refresh_token": create_refresh_token(claims, familia=familia),
+        "token_type": "bearer",
+    }
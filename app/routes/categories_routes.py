@@ -2,11 +2,13 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId # Necesario para manejar ObjectId de MongoDB
+from pymongo.errors import DuplicateKeyError
 
 from app.db.dbp import get_db
 from app.Schemas.Esquema import CategoryCreate, CategoryUpdate, CategoryResponse
 from app.auth.dependencies import get_current_user # Mantén esta importación si necesitas autenticación
 from app.models import categories_model # Importa las funciones de tu nuevo modelo
+from app.utils.catalogos import catalogos, CATEGORIAS
 
 router = APIRouter()
 
@@ -26,7 +28,7 @@ async def get_categories(
     """
     Obtiene todas las categorías de la base de datos.
     """
-    categories_data = await categories_model.obtener_categories(db)
+    categories_data = await catalogos.listar(db, CATEGORIAS)
     
     if not categories_data:
         return []
@@ -43,7 +45,7 @@ async def get_category_by_id(
     """
     Obtiene una categoría por su ID.
     """
-    category_data = await categories_model.obtener_category_por_id(db, category_id)
+    category_data = await catalogos.obtener(db, CATEGORIAS, category_id)
     
     if not category_data:
         raise HTTPException(status_code=404, detail="Categoría no encontrada.")
@@ -60,14 +62,14 @@ async def create_category(
     """
     Crea una nueva categoría.
     """
-    # Verifica si ya existe una categoría con el mismo nombre (insensible a mayúsculas/minúsculas)
-    existing_category = await db["categories"].find_one({"name": {"$regex": category_data.name, "$options": "i"}})
-    if existing_category:
+    # El duplicado (sin distinguir mayúsculas ni acentos) lo detecta el índice único de name_key
+    try:
+        created_category = await categories_model.crear_category(db, category_data.dict())
+    except DuplicateKeyError:
         raise HTTPException(status_code=400, detail="La categoría ya existe.")
-
-    created_category = await categories_model.crear_category(db, category_data.dict())
     if not created_category:
         raise HTTPException(status_code=500, detail="Error al crear la categoría en la base de datos.")
+    await catalogos.invalidar(db, CATEGORIAS)
 
     return format_category_document(created_category)
 
@@ -86,9 +88,13 @@ async def update_category(
     if not update_data:
         raise HTTPException(status_code=400, detail="No se proporcionaron datos para actualizar.")
     
-    updated_category = await categories_model.actualizar_category(db, category_id, update_data)
+    try:
+        updated_category = await categories_model.actualizar_category(db, category_id, update_data)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="La categoría ya existe.")
     if not updated_category:
         raise HTTPException(status_code=404, detail="Categoría no encontrada o error al actualizar.")
+    await catalogos.invalidar(db, CATEGORIAS)
 
     return format_category_document(updated_category)
 
@@ -105,5 +111,6 @@ async def delete_category(
     deleted = await categories_model.eliminar_category(db, category_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Categoría no encontrada.")
+    await catalogos.invalidar(db, CATEGORIAS)
     
     return {"message": "Categoría eliminada correctamente"}
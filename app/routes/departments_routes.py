@@ -8,13 +8,16 @@ from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.auth.dependencies import get_current_user
 from app.models import departments_model
-from app.models.user_model import User
+from app.auth.tokens import UsuarioToken
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.Schemas.Departamento import DepartmentCreate, DepartmentResponse, DepartmentUpdate
 from app.db.dbp import get_db
+from app.utils.catalogos import catalogos, DEPARTAMENTOS
 from app.models.departments_model import DepartmentModel, departments_helper
 from app.models.departments_model import Department
 from sqlalchemy.future import select
+from pymongo.errors import DuplicateKeyError
+from app.utils.nombres import normalizar_nombre
 
 router = APIRouter()
 
@@ -39,7 +42,7 @@ async def get_departments(
     """
     Obtiene todas los departamentos de la base de datos.
     """
-    departments_data = await departments_model.obtener_departments(db)
+    departments_data = await catalogos.listar(db, DEPARTAMENTOS)
     if not departments_data:
         return []
     return [format_category_document(c) for c in departments_data]
@@ -48,9 +51,9 @@ async def get_departments(
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 @router.get("/{department_id}", response_model=DepartmentResponse)
-async def get_department_by_id(department: str, token: str = Depends(oauth2_scheme), db: AsyncIOMotorDatabase = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_department_by_id(department_id: str, token: str = Depends(oauth2_scheme), db: AsyncIOMotorDatabase = Depends(get_db), current_user: UsuarioToken = Depends(get_current_user)):
     # Obtén el departamento desde la base de datos
-    department_data = await db.your_database.your_collection.find_one({"_id": ObjectId(department)})
+    department_data = await catalogos.obtener(db, DEPARTAMENTOS, department_id)
     
     if not department_data:
         raise HTTPException(status_code=404, detail="Departamento no encontrado")
@@ -75,27 +78,28 @@ async def create_department(
   """
   departments_collection = db["departments"]
 
-  # Verifica si ya existe un departamento con el mismo nombre (insensible a mayúsculas/minúsculas)
-  existing_department = await departments_collection.find_one({"name": {"$regex": department_data.name, "$options": "i"}})
-  if existing_department:
-      raise HTTPException(status_code=400, detail="El departamento ya existe.")
-
   department_dict = department_data.dict()
-  department_dict["createdAt"] = datetime.utcnow()
-  department_dict["updated_at"] = datetime.utcnow()
+  department_dict["name_key"] = normalizar_nombre(department_dict["name"])
+  department_dict["createdAt"] = datetime.datetime.utcnow()
+  department_dict["updated_at"] = datetime.datetime.utcnow()
 
-  result = await departments_collection.insert_one(department_dict)
+  # El duplicado (sin distinguir mayúsculas ni acentos) lo detecta el índice único de name_key
+  try:
+      result = await departments_collection.insert_one(department_dict)
+  except DuplicateKeyError:
+      raise HTTPException(status_code=400, detail="El departamento ya existe.")
   
   created_department_data = await departments_collection.find_one({"_id": result.inserted_id})
   if not created_department_data:
       raise HTTPException(status_code=500, detail="Error al crear el departamento en la base de datos.")
+  await catalogos.invalidar(db, DEPARTAMENTOS)
 
-  return DepartmentResponse(**created_department_data)
+  return format_category_document(created_department_data)
 
 # Ruta para actualizar un departamento
 @router.put("/{department_id}", response_model=DepartmentResponse)
 async def update_department(
-  department: str,
+  department_id: str,
   data: DepartmentUpdate,
   db: AsyncIOMotorDatabase = Depends(get_db),
   # current_user: dict = Depends(get_current_user) # Descomenta si necesitas autenticación
@@ -106,7 +110,7 @@ async def update_department(
   departments_collection = db["departments"]
 
   try:
-      object_id = ObjectId(department)
+      object_id = ObjectId(department_id)
   except Exception:
       raise HTTPException(status_code=400, detail="ID de departamento inválido.")
 
@@ -115,27 +119,33 @@ async def update_department(
   if not update_data:
       raise HTTPException(status_code=400, detail="No se proporcionaron datos para actualizar.")
   
-  update_data["updated_at"] = datetime.utcnow() # Actualiza el timestamp de modificación
+  if "name" in update_data:
+      update_data["name_key"] = normalizar_nombre(update_data["name"])
+  update_data["updated_at"] = datetime.datetime.utcnow() # Actualiza el timestamp de modificación
 
-  result = await departments_collection.update_one(
-      {"_id": object_id},
-      {"$set": update_data}
-  )
+  try:
+      result = await departments_collection.update_one(
+          {"_id": object_id},
+          {"$set": update_data}
+      )
+  except DuplicateKeyError:
+      raise HTTPException(status_code=400, detail="El departamento ya existe.")
 
   if result.matched_count == 0:
       raise HTTPException(status_code=404, detail="Departamento no encontrado.")
+  await catalogos.invalidar(db, DEPARTAMENTOS)
   
   # Recupera el documento actualizado para la respuesta
   updated_department_data = await departments_collection.find_one({"_id": object_id})
   if not updated_department_data:
       raise HTTPException(status_code=500, detail="Error al recuperar el departamento actualizado.")
 
-  return DepartmentResponse(**updated_department_data)
+  return format_category_document(updated_department_data)
 
 # Ruta para eliminar un departamento
 @router.delete("/{department_id}")
 async def delete_department(
-  department: str,
+  department_id: str,
   db: AsyncIOMotorDatabase = Depends(get_db),
   # current_user: dict = Depends(get_current_user) # Descomenta si necesitas autenticación
 ):
@@ -145,7 +155,7 @@ async def delete_department(
   departments_collection = db["departments"]
 
   try:
-      object_id = ObjectId(department)
+      object_id = ObjectId(department_id)
   except Exception:
       raise HTTPException(status_code=400, detail="ID de departamento inválido.")
 
@@ -153,6 +163,7 @@ async def delete_department(
 
   if result.deleted_count == 0:
       raise HTTPException(status_code=404, detail="Departamento no encontrado.")
+  await catalogos.invalidar(db, DEPARTAMENTOS)
   
   return {"message": "Departamento eliminado correctamente"} # FastAPI 0.100+ permite retornar un dict con 204
 
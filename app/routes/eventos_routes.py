@@ -0,0 +1,118 @@
+import asyncio
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+
+from app.auth.dependencies import get_current_user
+from app.db.dbp import get_db
+from app.models.eventos_tickets import claves_suscripcion
+from app.utils.eventos import hub_eventos
+from config import EVENTS_HEARTBEAT_SECONDS
+
+router = APIRouter()
+
+# Espera sugerida al navegador antes de reconectar un EventSource cortado
+RECONEXION_SSE_MS = 3000
+
+# Ni WebSocket ni EventSource del navegador permiten enviar el encabezado Authorization:
+# el access token puede ir en ?token=
+def _extraer_token(token: Optional[str], autorizacion: Optional[str]) -> str:
+    if not token and autorizacion and autorizacion.lower().startswith("bearer "):
+        token = autorizacion[7:]
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Falta el token")
+    return token
+
+
+class VerificadorToken:
+    """
+    Repite la validación del token cada EVENTS_HEARTBEAT_SECONDS mientras dura la conexión:
+    el token puede vencer (exp) o revocarse (token_version, familia) después de conectar.
+    """
+
+    def __init__(self, token: str, db):
+        self.token = token
+        self.db = db
+        self._proxima = time.monotonic() + EVENTS_HEARTBEAT_SECONDS
+
+    async def vigente(self) -> bool:
+        if time.monotonic() < self._proxima:
+            return True
+        self._proxima = time.monotonic() + EVENTS_HEARTBEAT_SECONDS
+        try:
+            await get_current_user(token=self.token, db=self.db)
+        except HTTPException:
+            return False
+        return True
+
+# 1. Eventos de tickets por WebSocket
+@router.websocket("/ws")
+async def eventos_websocket(websocket: WebSocket, token: Optional[str] = None, db=Depends(get_db)):
+    """
+    Envía un mensaje JSON por evento y {"tipo": "ping"} cuando no hay eventos en
+    EVENTS_HEARTBEAT_SECONDS. Lo que mande el cliente se ignora (sirve de pong). Si el token
+    vence o se revoca, se cierra con 1008.
+    """
+    try:
+        token = _extraer_token(token, websocket.headers.get("authorization"))
+        usuario = await get_current_user(token=token, db=db)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    verificador = VerificadorToken(token, db)
+
+    await websocket.accept()
+    suscripcion = hub_eventos.suscribir(claves_suscripcion(usuario))
+
+    async def recibir():
+        # Detecta el cierre del cliente aunque no haya eventos que enviarle
+        while True:
+            await websocket.receive_text()
+
+    lector = asyncio.create_task(recibir())
+    try:
+        while not lector.done():
+            mensaje = await suscripcion.siguiente(EVENTS_HEARTBEAT_SECONDS)
+            if not await verificador.vigente():
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                break
+            await websocket.send_text(mensaje if mensaje is not None else '{"tipo":"ping"}')
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        hub_eventos.desuscribir(suscripcion)
+        lector.cancel()
+        await asyncio.gather(lector, return_exceptions=True)
+
+# 2. Eventos de tickets por Server-Sent Events
+@router.get("/sse")
+async def eventos_sse(request: Request, token: Optional[str] = Query(None), db=Depends(get_db)):
+    """
+    Flujo text/event-stream: "event: ticket" con el delta en data, y un comentario
+    ": ping" cuando no hay eventos en EVENTS_HEARTBEAT_SECONDS. Si el token vence o se revoca,
+    el flujo termina; al reconectar, el EventSource recibe 401.
+    """
+    token = _extraer_token(token, request.headers.get("authorization"))
+    usuario = await get_current_user(token=token, db=db)
+    verificador = VerificadorToken(token, db)
+    suscripcion = hub_eventos.suscribir(claves_suscripcion(usuario))
+
+    async def generar():
+        try:
+            yield f"retry: {RECONEXION_SSE_MS}\n\n"
+            while not await request.is_disconnected():
+                mensaje = await suscripcion.siguiente(EVENTS_HEARTBEAT_SECONDS)
+                if not await verificador.vigente():
+                    break
+                yield f"event: ticket\ndata: {mensaje}\n\n" if mensaje is not None else ": ping\n\n"
+        finally:
+            hub_eventos.desuscribir(suscripcion)
+
+    return StreamingResponse(
+        generar(),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx no debe acumular el flujo
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.auth.dependencies import get_current_user
-from app.models.user_model import User
+from app.auth.tokens import UsuarioToken
 from app.Schemas.Message import MessageCreate, MessageUpdate
 from app.db.dbp import get_db
 from app.models.messages_model import Message, messages_helper, obtener_mensajes
@@ -10,11 +10,11 @@ from app.models.messages_model import Message, messages_helper, obtener_mensajes
 router = APIRouter()
 
 @router.get("/")
-async def get_messages(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_messages(db: AsyncSession = Depends(get_db), current_user: UsuarioToken = Depends(get_current_user)):
     return await obtener_mensajes(db)
 
 @router.get("/{message_id}")
-async def get_message_by_id(message_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_message_by_id(message_id: int, db: AsyncSession = Depends(get_db), current_user: UsuarioToken = Depends(get_current_user)):
     result = await db.execute(select(Message).filter(Message.id == message_id))
     message = result.scalar_one_or_none()
     if not message:
@@ -22,7 +22,7 @@ async def get_message_by_id(message_id: int, db: AsyncSession = Depends(get_db),
     return messages_helper(message)
 
 @router.post("/")
-async def create_message(message_data: MessageCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_message(message_data: MessageCreate, db: AsyncSession = Depends(get_db), current_user: UsuarioToken = Depends(get_current_user)):
     # Asignamos created_by_id con el usuario actual
     new_message = Message(
         message=message_data.message,
@@ -35,7 +35,7 @@ async def create_message(message_data: MessageCreate, db: AsyncSession = Depends
     return messages_helper(new_message)
 
 @router.put("/{message_id}")
-async def update_message(message_id: int, update_data: MessageUpdate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def update_message(message_id: int, update_data: MessageUpdate, db: AsyncSession = Depends(get_db), current_user: UsuarioToken = Depends(get_current_user)):
     result = await db.execute(select(Message).filter(Message.id == message_id))
     message = result.scalar_one_or_none()
 
@@ -52,7 +52,7 @@ async def update_message(message_id: int, update_data: MessageUpdate, db: AsyncS
     return messages_helper(message)
 
 @router.delete("/{message_id}")
-async def delete_message(message_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def delete_message(message_id: int, db: AsyncSession = Depends(get_db), current_user: UsuarioToken = Depends(get_current_user)):
     result = await db.execute(select(Message).filter(Message.id == message_id))
     message = result.scalar_one_or_none()
 
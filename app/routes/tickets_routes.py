@@ -1,47 +1,117 @@
 import traceback
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
 from app.auth.dependencies import get_current_user
 from app.db.dbp import get_db
-from app.models.tickets_model import Ticket, ticket_helper
+from app.models.tickets_model import Ticket, ticket_helper, construir_filtro_tickets, obtener_tickets_paginados
+from app.models.tickets import (
+    ESTADOS, PATRON_PROFUNDIDAD, PROFUNDIDAD_COMPLETO, PROFUNDIDAD_NOMBRES,
+    obtener_ticket_enriquecido, obtener_tickets_enriquecidos,
+)
 from app.models.ticket_assigned_user_model import TicketAssignedUser 
-from app.models.user_model import User
-from app.models.messages_model import Message, messages_helper
-from app.Schemas.Ticket import TicketCreate, TicketUpdate
+from app.auth.tokens import UsuarioToken
+from app.models.messages_model import crear_message, mensaje_documento_a_dict
+from app.models.busqueda import buscar_tickets, indexar_mensaje
+from app.Schemas.Ticket import AsignacionMasiva, TicketCreate, TicketUpdate
+from app.models.asignaciones import aplicar_asignaciones, ids_asignados
+from app.models.bandejas import calcular_inbox_keys, faltan_departamentos_creador, filtro_bandeja_departamento, filtro_bandeja_usuario
+from app.models.contadores import contar_cambio_estado, contar_ticket_creado, obtener_estadisticas
+from app.models.analitica import registrar_creacion, registrar_transicion
+from app.models import eventos_tickets
 from app.Schemas.Message import MessageCreate
-from app.models.attachments_model import Attachment
+from app.models.attachments_model import BLOBS_DIR, almacenar_blob, crear_attachment, generar_nombre_incremental
 from fastapi import UploadFile, File
 import os
 
-from app.utils.email_utils import send_email
+from app.utils.email_queue import cola_correos
+from app.utils.streaming import formato_stream, respuesta_stream
+from app.utils.uploads import recibir_upload
+from config import STREAM_BATCH_SIZE
 
 router = APIRouter()
 
-# Generar nombre con base en el nombre original y numeración de 4 dígitos
-def generar_nombre_incremental(nombre_base, extension, carpeta="app/uploads"):
-    archivos = os.listdir(carpeta)
-    numeros = []
-    for f in archivos:
-        if f.startswith(nombre_base + "_") and f.endswith("." + extension):
-            parte = f[len(nombre_base) + 1 : -(len(extension) + 1)]
-            if parte.isdigit():
-                numeros.append(int(parte))
-    siguiente = max(numeros, default=0) + 1
-    numero_formateado = f"{siguiente:04d}"
-    return f"{nombre_base}_{numero_formateado}.{extension}"
-
-# 1. Obtener todos los tickets
+# Filtro que no encuentra nada (usuario sin departamento); vale para lista y streaming
+SIN_RESULTADOS = {"_id": {"$in": []}}
+
+async def listar_tickets(db, filtro: dict, profundidad: str, formato: Optional[str]):
+    # Sin streaming se arma la lista completa; con streaming se escribe ticket a ticket
+    if formato:
+        cursor = obtener_tickets_enriquecidos(db, filtro, profundidad, tamano_lote=STREAM_BATCH_SIZE)
+        return respuesta_stream(cursor, ticket_helper, formato)
+    tickets = await obtener_tickets_enriquecidos(db, filtro, profundidad).to_list(length=None)
+    return [ticket_helper(t) for t in tickets]
+
+async def filtro_creados_departamento(db, department) -> dict:
+    """
+    Tickets creados por usuarios del departamento. Mientras queden tickets sin
+    created_user_department (antes del backfill) se suman con el predicado anterior;
+    si quedan o no se averigua una sola vez, no en cada petición.
+    """
+    if not department:
+        # Un filtro con None traería todos los tickets sin el campo
+        return SIN_RESULTADOS
+    filtro = {"created_user_department": department}
+    if not await faltan_departamentos_creador(db):
+        return filtro
+    usuarios = await db["users"].find({"department": department}, {"_id": 1}).to_list(length=None)
+    anteriores = {"created_user_department": {"$exists": False}, "created_user_id": {"$in": [str(u["_id"]) for u in usuarios]}}
+    return {"$or": [filtro, anteriores]}
+
+# 1. Obtener tickets paginados (cursor) con filtros aplicados en Mongo
 @router.get("/")
-async def get_tickets(db=Depends(get_db), current_user: User = Depends(get_current_user)):
-    tickets = await db["tickets"].find().to_list(length=None)
-    return [ticket_helper(ticket) for ticket in tickets]
+async def get_tickets(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    assigned_department: Optional[str] = None,
+    category: Optional[str] = None,
+    fecha_desde: Optional[datetime] = None,
+    fecha_hasta: Optional[datetime] = None,
+    profundidad: str = Query(PROFUNDIDAD_NOMBRES, pattern=PATRON_PROFUNDIDAD),
+    db=Depends(get_db),
+    current_user: UsuarioToken = Depends(get_current_user),
+):
+    filtro = construir_filtro_tickets(status, assigned_department, category, fecha_desde, fecha_hasta)
+    return await obtener_tickets_paginados(db, filtro, limit, cursor, profundidad)
+
+# 1.1 Resumen para el dashboard: cantidades por estado desde los contadores precalculados
+# (declarada antes de /{ticket_id} para que "stats" no se tome como id)
+@router.get("/stats")
+async def get_tickets_stats(
+    assigned_department: Optional[str] = None,
+    category: Optional[str] = None,
+    db=Depends(get_db),
+    current_user: UsuarioToken = Depends(get_current_user),
+):
+    return await obtener_estadisticas(db, assigned_department, category)
+
+# 1.2 Búsqueda de texto en título, descripción y mensajes, ordenada por relevancia
+# (declarada antes de /{ticket_id} para que "search" no se tome como id)
+@router.get("/search")
+async def search_tickets(
+    q: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    assigned_department: Optional[str] = None,
+    status: Optional[str] = None,
+    profundidad: str = Query(PROFUNDIDAD_NOMBRES, pattern=PATRON_PROFUNDIDAD),
+    db=Depends(get_db),
+    current_user: UsuarioToken = Depends(get_current_user),
+):
+    return await buscar_tickets(db, q, limit, cursor, assigned_department, status, profundidad, ticket_helper)
 
 # 2. Obtener ticket por ID
 @router.get("/{ticket_id}")
-async def get_ticket(ticket_id: str, db=Depends(get_db), current_user: User = Depends(get_current_user)):
-    ticket = await db["tickets"].find_one({"_id": ObjectId(ticket_id)})
+async def get_ticket(
+    ticket_id: str,
+    profundidad: str = Query(PROFUNDIDAD_COMPLETO, pattern=PATRON_PROFUNDIDAD),
+    db=Depends(get_db),
+    current_user: UsuarioToken = Depends(get_current_user),
+):
+    ticket = await obtener_ticket_enriquecido(db, ObjectId(ticket_id), profundidad)
     if ticket is None:
         raise HTTPException(status_code=404, detail="Ticket no encontrado")
     return ticket_helper(ticket)
@@ -51,52 +121,43 @@ async def get_ticket(ticket_id: str, db=Depends(get_db), current_user: User = De
 async def create_ticket(
     data: TicketCreate,
     db=Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: UsuarioToken = Depends(get_current_user),
 ):
     data_dict = data.dict()  # Convertir a diccionario
     data_dict["created_user_id"] = str(current_user.id)
+    # Departamento del creador al momento de crear: "creados por mi departamento" es un solo rango indexado
+    data_dict["created_user_department"] = current_user.department
 
     # Manejar campos opcionales
     if data_dict.get("category") == 0:
         data_dict["category"] = None
     if data_dict.get("assigned_department") in (None, 0, ""):
         data_dict["assigned_department"] = None
+    data_dict["createdAt"] = datetime.utcnow()
+    data_dict["updatedAt"] = data_dict["createdAt"]
+    data_dict["statusChangedAt"] = data_dict["createdAt"]
+    data_dict["inbox_keys"] = calcular_inbox_keys(data_dict)
 
     # Crear el nuevo ticket en MongoDB
     new_ticket = await db["tickets"].insert_one(data_dict)
-    created_ticket = await db["tickets"].find_one({"_id": new_ticket.inserted_id})
+    await contar_ticket_creado(db, data_dict)
+    await registrar_creacion(db, data_dict)
+    eventos_tickets.publicar_evento_ticket(eventos_tickets.TICKET_CREADO, data_dict, title=data_dict.get("title"))
 
-    # Obtener usuarios del departamento asignado
+    # Obtener usuarios activos del departamento asignado
+    dept_users = []
     if data_dict.get("assigned_department"):
-        dept_users = await db["users"].find({"department_id": ObjectId(data_dict["assigned_department"]), "status": True}).to_list(None)
-
-   # Obtener datos relacionados
-    if created_ticket.get("category"):
-        category = await db["categories"].find_one({"_id": ObjectId(created_ticket["category"])})
-        created_ticket["category"] = {
-            "id": str(category["_id"]),
-            "name": category["name"] if category else None
-        }
+        dept_users = await db["users"].find(
+            {"department": data_dict["assigned_department"], "status": True},
+            {"email": 1, "fullname": 1},
+        ).to_list(None)
 
-    if created_ticket.get("assigned_department"):
-        department = await db["departments"].find_one({"_id": ObjectId(created_ticket["assigned_department"])})
-        created_ticket["assigned_department"] = {
-            "id": str(department["_id"]),
-            "name": department["name"] if department else None
-        }
-
-    if created_ticket.get("created_user_id"):
-        user = await db["users"].find_one({"_id": ObjectId(created_ticket["created_user_id"])})
-        created_ticket["created_user"] = {
-            "id": str(user["_id"]),
-            "fullname": user["fullname"] if user else None,
-            "email": user["email"] if user else None,
-            "phone_ext": user["phone_ext"] if user else None
-        }
+    # Categoría, departamento y creador se resuelven en una sola agregación
+    created_ticket = await obtener_ticket_enriquecido(db, new_ticket.inserted_id, PROFUNDIDAD_NOMBRES)
 
-    # Enviar correos a los usuarios del departamento
+    # Encolar los correos; los envían los workers en segundo plano sin bloquear la respuesta
     for user in dept_users:
-            send_email(
+            cola_correos.encolar(
                 to=user["email"],
                 subject="Nuevo ticket asignado a tu departamento",
                 body=f"Hola {user['fullname']},\n\nSe ha creado un nuevo ticket #{str(new_ticket.inserted_id)} asignado a tu departamento.\n\nPor favor revisa el sistema."
@@ -111,18 +172,9 @@ async def actualizar_estado_ticket(
     ticket_id: str,
     estado_id: int,
     db=Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: UsuarioToken = Depends(get_current_user)
 ):
     try:
-        ESTADOS = {
-            0: "Cancelado",
-            1: "Abierto",
-            2: "Proceso",
-            3: "Espera",
-            4: "Revisión",
-            5: "Completado"
-        }
-
         if estado_id not in ESTADOS:
             raise HTTPException(status_code=400, detail="ID de estado inválido")
 
@@ -135,13 +187,30 @@ async def actualizar_estado_ticket(
 
         # Validaciones de permisos
         es_creador = current_user.id == ticket["created_user_id"]
-        es_asignado = current_user.id in [u["user_id"] for u in ticket["assigned_users"]]
+        es_asignado = str(current_user.id) in ids_asignados(ticket)
 
         if estado_id == 0 and not es_creador:
             raise HTTPException(status_code=403, detail="Solo el creador puede cancelar el ticket")
 
-        ticket["status"] = str(estado_id)
-        await db["tickets"].update_one({"_id": ObjectId(ticket_id)}, {"$set": {"status": ticket["status"]}})
+        estado_anterior = ticket["status"]
+        estado_nuevo = str(estado_id)
+        ahora = datetime.utcnow()
+        # Las bandejas se recalculan con el ticket ya leído; corrige tickets escritos antes de inbox_keys.
+        # El filtro por estado anterior evita contar dos veces si dos peticiones cambian el mismo ticket.
+        cambios = {"status": estado_nuevo, "inbox_keys": calcular_inbox_keys(ticket), "updatedAt": ahora}
+        if estado_anterior != estado_nuevo:
+            cambios["statusChangedAt"] = ahora  # Inicio del tiempo en el nuevo estado (analítica)
+        resultado = await db["tickets"].update_one(
+            {"_id": ObjectId(ticket_id), "status": estado_anterior},
+            {"$set": cambios},
+        )
+        if resultado.matched_count == 0:
+            raise HTTPException(status_code=409, detail="El estado del ticket cambió mientras se actualizaba, intenta de nuevo")
+        await contar_cambio_estado(db, ticket, estado_anterior, estado_nuevo)
+        if estado_anterior != estado_nuevo:
+            await registrar_transicion(db, ticket, estado_anterior, estado_nuevo, ahora)
+        eventos_tickets.publicar_evento_ticket(eventos_tickets.ESTADO, {**ticket, **cambios}, estado_anterior=estado_anterior)
+        ticket = await obtener_ticket_enriquecido(db, ticket["_id"], PROFUNDIDAD_NOMBRES)
 
         return {
             "message": f"Estado actualizado correctamente a código {estado_id}",
@@ -159,135 +228,75 @@ async def actualizar_estado_ticket(
 @router.post("/{ticket_id}/asignar-usuarios")
 async def asignar_usuarios_a_ticket(
     ticket_id: str,
-    asignaciones: List[int],
+    asignaciones: List[str],
     db=Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: UsuarioToken = Depends(get_current_user)
 ):
-    ticket = await db["tickets"].find_one({"_id": ObjectId(ticket_id)})
-    if not ticket:
-        raise HTTPException(status_code=404, detail="Ticket no encontrado")
-
-    if ticket["status"] in {"0", "5"}:
-        raise HTTPException(status_code=400, detail="No se pueden asignar usuarios a un ticket cancelado o completado")
-
-    if ticket["assigned_department"] != current_user.department:
-        raise HTTPException(status_code=403, detail="Solo el departamento asignado al ticket puede asignar usuarios")
-
-    usuarios_asignados_actuales = {u["user_id"] for u in ticket["assigned_users"]}
-
-    usuarios_validos = await db["users"].find({
-        "id": {"$in": asignaciones},
-        "department": current_user.department
-    }).to_list(length=None)
-
-    invalidos = set(asignaciones) - {u["id"] for u in usuarios_validos}
-    if invalidos:
-        raise HTTPException(status_code=400, detail=f"Los siguientes usuarios no pertenecen a tu departamento: {invalidos}")
-
-    nuevos_asignados = 0
-
-    for user_id in usuarios_validos:
-        if user_id not in usuarios_asignados_actuales:
-            asignado = TicketAssignedUser (ticket_id=ticket_id, user_id=user_id)
-            await db["ticket_assigned_users"].insert_one(asignado.dict())
-            nuevos_asignados += 1
+    resultado = (await aplicar_asignaciones(db, [{"ticket_id": ticket_id, "agregar": asignaciones}], current_user))[0]
+    if not resultado["ok"]:
+        raise HTTPException(status_code=resultado["codigo"], detail=resultado["error"])
 
+    nuevos_asignados = len(resultado["agregados"])
     if nuevos_asignados == 0:
         raise HTTPException(status_code=400, detail="El usuario ya estaba asignado al ticket")
 
     return {"message": f"{nuevos_asignados} usuario(s) asignado(s) correctamente"}
 
+# 7.1 Asignar y quitar usuarios en varios tickets a la vez
+@router.post("/asignaciones")
+async def asignar_usuarios_masivo(
+    data: AsignacionMasiva,
+    db=Depends(get_db),
+    current_user: UsuarioToken = Depends(get_current_user)
+):
+    """
+    Aplica todas las operaciones válidas en una sola escritura y devuelve un resultado por operación.
+    """
+    resultados = await aplicar_asignaciones(db, [op.dict() for op in data.operaciones], current_user)
+    return {
+        "aplicadas": sum(1 for r in resultados if r["ok"]),
+        "rechazadas": sum(1 for r in resultados if not r["ok"]),
+        "resultados": resultados,
+    }
+
 # 8. Obtener tickets asignados al usuario actual
 @router.get("/asignados-a-mi/")
-async def get_tickets_asignados_a_mi(db=Depends(get_db), current_user: User = Depends(get_current_user)):
-    tickets = await db["tickets"].find({"assigned_users": str(current_user.id)}).to_list(length=None)
-    
-    # Formatear la respuesta
-    formatted_tickets = []
-    for ticket in tickets:
-        formatted_ticket = {
-            "id": ticket.get("_id"),
-            "title": ticket.get("title"),
-            "description": ticket.get("description"),
-            "category": {
-                "id": ticket.get("category", {}).get("_id"),
-                "name": ticket.get("category", {}).get("name")
-            },
-            "assigned_department": {
-                "id": ticket.get("assigned_department", {}).get("_id"),
-                "name": ticket.get("assigned_department", {}).get("name")
-            },
-            "created_user": {
-                "id": ticket.get("created_user_id"),
-                "fullname": ticket.get("created_user_fullname"),
-                "email": ticket.get("created_user_email")
-            },
-            "assigned_users": [
-                {
-                    "id": user.get("_id"),
-                    "fullname": user.get("fullname"),
-                    "email": user.get("email")
-                } for user in ticket.get("assigned_users", [])
-            ],
-            "messages": ticket.get("messages", []),
-            "status": ticket.get("status"),
-            "createdAt": ticket.get("createdAt"),
-            "updatedAt": ticket.get("updatedAt")
-        }
-        formatted_tickets.append(formatted_ticket)
-
-    return formatted_tickets
+async def get_tickets_asignados_a_mi(
+    request: Request,
+    stream: bool = False,
+    profundidad: str = Query(PROFUNDIDAD_NOMBRES, pattern=PATRON_PROFUNDIDAD),
+    db=Depends(get_db),
+    current_user: UsuarioToken = Depends(get_current_user),
+):
+    filtro = filtro_bandeja_usuario(current_user.id)
+    return await listar_tickets(db, filtro, profundidad, formato_stream(request, stream))
 
 
 # 9. Obtener tickets asignados al departamento del usuario
 @router.get("/asignados-departamento/")
-async def get_tickets_departamento(db=Depends(get_db), current_user: User = Depends(get_current_user)):
-    tickets = await db["tickets"].find({"assigned_department": current_user.department}).to_list(length=None)
-    return [ticket_helper(t) for t in tickets]
+async def get_tickets_departamento(
+    request: Request,
+    stream: bool = False,
+    profundidad: str = Query(PROFUNDIDAD_NOMBRES, pattern=PATRON_PROFUNDIDAD),
+    db=Depends(get_db),
+    current_user: UsuarioToken = Depends(get_current_user),
+):
+    # Sin departamento no hay bandeja: un filtro con None traería los tickets sin asignar
+    filtro = filtro_bandeja_departamento(current_user.department) if current_user.department else SIN_RESULTADOS
+    return await listar_tickets(db, filtro, profundidad, formato_stream(request, stream))
 
 # 10. Obtener tickets creados por el usuario y su departamento
 @router.get("/creados/")
-async def get_tickets_creados(db=Depends(get_db), current_user: User = Depends(get_current_user)):
-    # Obtener todos los tickets creados por usuarios en el mismo departamento
-    departamento_tickets = await db["tickets"].find({
-        "created_user_id": {"$in": [str(user["_id"]) for user in await db["users"].find({"department": current_user.department}).to_list(length=None)]}
-    }).to_list(length=None)
-
-    # Formatear la respuesta
-    formatted_tickets = []
-    for ticket in departamento_tickets:
-        formatted_ticket = {
-            "id": ticket.get("_id"),
-            "title": ticket.get("title"),
-            "description": ticket.get("description"),
-            "category": {
-                "id": ticket.get("category", {}).get("_id"),
-                "name": ticket.get("category", {}).get("name")
-            },
-            "assigned_department": {
-                "id": ticket.get("assigned_department", {}).get("_id"),
-                "name": ticket.get("assigned_department", {}).get("name")
-            },
-            "created_user": {
-                "id": ticket.get("created_user_id"),
-                "fullname": ticket.get("created_user_fullname"),
-                "email": ticket.get("created_user_email")
-            },
-            "assigned_users": [
-                {
-                    "id": user.get("_id"),
-                    "fullname": user.get("fullname"),
-                    "email": user.get("email")
-                } for user in ticket.get("assigned_users", [])
-            ],
-            "messages": ticket.get("messages", []),
-            "status": ticket.get("status"),
-            "createdAt": ticket.get("createdAt"),
-            "updatedAt": ticket.get("updatedAt")
-        }
-        formatted_tickets.append(formatted_ticket)
-
-    return formatted_tickets
+async def get_tickets_creados(
+    request: Request,
+    stream: bool = False,
+    profundidad: str = Query(PROFUNDIDAD_NOMBRES, pattern=PATRON_PROFUNDIDAD),
+    db=Depends(get_db),
+    current_user: UsuarioToken = Depends(get_current_user),
+):
+    # Tickets creados por usuarios del mismo departamento: una lectura del índice (created_user_department, createdAt)
+    filtro = await filtro_creados_departamento(db, current_user.department)
+    return await listar_tickets(db, filtro, profundidad, formato_stream(request, stream))
 
 
 
@@ -297,27 +306,30 @@ async def crear_mensaje_ticket(
     ticket_id: str,
     data: MessageCreate,
     db=Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: UsuarioToken = Depends(get_current_user)
 ):
     ticket = await db["tickets"].find_one({"_id": ObjectId(ticket_id)})
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket no encontrado")
 
-    if current_user.id != ticket["created_user_id"] and not any(
-        assignment["user_id"] == current_user.id for assignment in ticket["assigned_users"]
-    ):
+    if str(current_user.id) != str(ticket.get("created_user_id")) and str(current_user.id) not in ids_asignados(ticket):
         raise HTTPException(status_code=403, detail="No tienes permiso para escribir en este ticket")
 
-    nuevo_mensaje = Message(
-        ticket_id=ticket_id,
-        created_by_id=current_user.id,
-        message=data.message
+    nuevo_mensaje = await crear_message(db, {
+        "ticket_id": ticket_id,
+        "created_by_id": str(current_user.id),
+        "message": data.message,
+    })
+    # Copia del texto en el ticket para la búsqueda (/tickets/search)
+    await indexar_mensaje(db, ticket["_id"], data.message)
+    eventos_tickets.publicar_evento_ticket(
+        eventos_tickets.MENSAJE, ticket,
+        message_id=str(nuevo_mensaje["_id"]), created_by_id=str(current_user.id),
     )
-    await db["messages"].insert_one(nuevo_mensaje.dict())
 
     return {
         "message": "Mensaje enviado correctamente",
-        "mensaje": messages_helper(nuevo_mensaje)
+        "mensaje": mensaje_documento_a_dict(nuevo_mensaje)
     }
 
 # 12. Ruta para agregar un archivo a un ticket
@@ -327,60 +339,63 @@ async def subir_attachment(
     request: Request,
     file: UploadFile = File(...),
     db=Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: UsuarioToken = Depends(get_current_user)
 ):
     ticket = await db["tickets"].find_one({"_id": ObjectId(ticket_id)})
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket no encontrado")
 
-    upload_folder = "app/uploads"
-    os.makedirs(upload_folder, exist_ok=True)
-
     nombre_archivo = file.filename.rsplit(".", 1)[0].replace(" ", "_")
     extension = file.filename.rsplit(".", 1)[-1].lower()
-    nombre_final = generar_nombre_incremental(nombre_archivo, extension, upload_folder)
-
-    relative_path = f"/uploads/{nombre_final}"
-    save_path = os.path.join(upload_folder, nombre_final)
+    # Nombre visible con numeración de 4 dígitos (contador atómico)
+    nombre_final = await generar_nombre_incremental(db, nombre_archivo, extension)
 
+    # El contenido se guarda una sola vez por SHA-256; los duplicados solo suman una referencia
     try:
-        content = await file.read()
-        with open(save_path, "wb") as buffer:
-            buffer.write(content)
+        subido = await recibir_upload(file, BLOBS_DIR)
+        blob = await almacenar_blob(db, subido, extension)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al guardar archivo: {str(e)}")
 
-    new_attachment = Attachment(
-        file_name=nombre_final,
-        file_path=relative_path,
-        file_extension=extension,
-        ticket_id=ticket_id
-    )
-    await db["attachments"].insert_one(new_attachment.dict())
-
+    relative_path = blob["file_path"]
+    new_attachment = await crear_attachment(db, {
+        "file_name": nombre_final,
+        "file_path": relative_path,
+        "file_extension": extension,
+        "ticket_id": ticket_id,
+        "size": subido.tamano,
+        "sha256": subido.sha256,
+        "blob_id": blob["_id"],
+        "uploaded_by": str(current_user.id),
+    })
+
+    # La única URL de descarga es la autenticada; file_url se conserva por compatibilidad con el frontend
     base_url = str(request.base_url).rstrip("/")
-    file_url = f"{base_url}{relative_path}"
+    content_url = f"{base_url}/attachments/{new_attachment['_id']}/content"
 
     return JSONResponse(
         status_code=201,
         content={
             "message": "Archivo subido exitosamente",
-            "attachment_id": new_attachment.id,
-            "file_path": new_attachment.file_path,
-            "file_url": file_url
+            "attachment_id": str(new_attachment["_id"]),
+            "file_path": new_attachment["file_path"],
+            "file_url": content_url,
+            "content_url": content_url
         }
     )
 
 # 13. Obtener todos los tickets creados por usuarios del mismo departamento
 @router.get("/todos-creados-por-mi-departamento/")
 async def get_all_tickets_by_department_users(
+    request: Request,
+    stream: bool = False,
+    profundidad: str = Query(PROFUNDIDAD_NOMBRES, pattern=PATRON_PROFUNDIDAD),
     db=Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: UsuarioToken = Depends(get_current_user)
 ):
-    result_users = await db["users"].find({"department": str(current_user.department)}).to_list(length=None)
-    user_ids = [str(user["_id"]) for user in result_users]  # Asegúrate de usar el ID correcto
-
-    result_tickets = await db["tickets"].find({"created_user_id": {"$in": user_ids}}).to_list(length=None)
-    return [ticket_helper(ticket) for ticket in result_tickets]
+    filtro = await filtro_creados_departamento(db, current_user.department)
+    return await listar_tickets(db, filtro, profundidad, formato_stream(request, stream))
 
  
\ No newline at end of file
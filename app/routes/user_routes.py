@@ -1,16 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId # Necesario para manejar ObjectId de MongoDB
 from datetime import datetime
+import logging
 from app.db.dbp import get_db
 from app.Schemas.Esquema import UserCreate, UserUpdate, UserResponse, UserInDB, DepartmentResponse
-from app.auth.dependencies import get_current_user # Mantén esta importación si necesitas autenticación
-from app.auth.security import hash_password
+from app.auth.dependencies import get_current_user, get_current_user_completo # Mantén esta importación si necesitas autenticación
+from app.auth.hashing import hash_password_async
+from app.auth.cache import cache_usuarios
+from app.auth.tokens import UsuarioToken, versiones_token
+from app.utils.catalogos import catalogos, DEPARTAMENTOS
 from app.models.departments_model import Department
 from app.models.user_model import User # Para el registro o actualización de contraseña
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Campos que viajan en el token (o lo respaldan): cambiarlos revoca los tokens emitidos
+CAMPOS_DEL_TOKEN = {"username", "department", "role", "status", "password"}
 # --- Funciones auxiliares (copiadas de auth.py para evitar dependencias circulares si es necesario) ---
 async def get_user_by_username(username: str, db: AsyncIOMotorDatabase):
     users_collection = db["users"]
@@ -47,31 +55,20 @@ async def get_user_by_phone_ext(phone_ext: str, db: AsyncIOMotorDatabase):
     return None
 
 async def get_department_by_id(department_id: str, db: AsyncIOMotorDatabase):
-    departments_collection = db["departments"]
-    try:
-        object_id = ObjectId(department_id)
-    except Exception:
-        return None # ID inválido
-    department_data = await departments_collection.find_one({"_id": object_id})
+    department_data = await catalogos.obtener(db, DEPARTAMENTOS, department_id)
     if department_data:
         # Pydantic se encargará de _id a id en DepartmentResponse
         return DepartmentResponse(**department_data)
     return None
 
-# Función auxiliar para construir la respuesta de usuario con el departamento anidado
-async def build_user_response(user_doc: dict, db: AsyncIOMotorDatabase) -> UserResponse:
+# Proyección para leer usuarios sin traer el hash de la contraseña desde la base de datos
+PROYECCION_USUARIO = {"password": 0}
+
+def _armar_user_response(user_doc: dict, department_info: Optional[DepartmentResponse]) -> UserResponse:
     # Asegúrate de que phone_ext y department_id sean strings si son ints en la DB
     # Esto es una conversión de tipo si la DB los guarda como int, para que Pydantic los acepte como str
     if 'phone_ext' in user_doc and isinstance(user_doc['phone_ext'], int):
         user_doc['phone_ext'] = str(user_doc['phone_ext'])
-    if 'department' in user_doc and isinstance(user_doc['department'], int):
-        user_doc['department'] = str(user_doc['department'])
-
-    department_info = None
-    if user_doc.get("department"):
-        department = await get_department_by_id(user_doc["department"], db)
-        if department:
-            department_info = department # Esto ya es una instancia de DepartmentResponse
 
     # Construye el diccionario para UserResponse explícitamente
     # Asegúrate de que todos los campos requeridos por UserResponse estén presentes
@@ -81,51 +78,74 @@ async def build_user_response(user_doc: dict, db: AsyncIOMotorDatabase) -> UserR
         "email": user_doc.get("email"),
         "fullname": user_doc.get("fullname"),
         "phone_ext": user_doc.get("phone_ext"),
-        "department": user_doc.get("department"),
         "status": user_doc.get("status"),
         "role": user_doc.get("role"),
         "createdAt": user_doc.get("createdAt"),
         "updatedAt": user_doc.get("updatedAt"),
         "department": department_info,
     }
-    
-    # Filtra None para campos opcionales si es necesario, aunque Pydantic los maneja bien
-    # user_response_data = {k: v for k, v in user_response_data.items() if v is not None}
-
     return UserResponse(**user_response_data)
 
+# Serialización en bloque: los departamentos salen de la caché de catálogos, sin consultas por usuario
+async def build_user_responses(user_docs: List[dict], db: AsyncIOMotorDatabase) -> List[UserResponse]:
+    departamentos = {}
+    for department_id in {str(d.get("department")) for d in user_docs if d.get("department")}:
+        department_data = await catalogos.obtener(db, DEPARTAMENTOS, department_id)
+        if department_data:
+            departamentos[department_id] = DepartmentResponse(**department_data)
+
+    return [
+        _armar_user_response(user_doc, departamentos.get(str(user_doc.get("department"))))
+        for user_doc in user_docs
+    ]
+
+# Función auxiliar para construir la respuesta de usuario con el departamento anidado
+async def build_user_response(user_doc: dict, db: AsyncIOMotorDatabase) -> UserResponse:
+    return (await build_user_responses([user_doc], db))[0]
+
 # Ruta para obtener el usuario actual
 @router.get("/me")
-async def read_current_user(current_user: User = Depends(get_current_user)):
+async def read_current_user(current_user: UserInDB = Depends(get_current_user_completo)):
     return current_user
 
 # Ruta para obtener todos los usuarios
 @router.get("/", response_model=List[UserResponse])
 async def get_users(
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    despues_de: Optional[str] = None,
     db: AsyncIOMotorDatabase = Depends(get_db),
-    current_user: UserInDB = Depends(get_current_user) # Requiere autenticación
+    current_user: UsuarioToken = Depends(get_current_user) # Requiere autenticación
 ):
     """
-    Obtiene todos los usuarios de la base de datos.
+    Obtiene los usuarios de la base de datos.
+
+    Con `limit` se pagina por _id: la siguiente página se pide con `despues_de` igual al
+    id del último usuario recibido. Sin `limit` se devuelven todos.
     """
     users_collection = db["users"]
-    users_data = await users_collection.find({}).to_list(None)
+    filtro = {}
+    if despues_de:
+        try:
+            filtro["_id"] = {"$gt": ObjectId(despues_de)}
+        except Exception:
+            raise HTTPException(status_code=400, detail="ID de usuario inválido.")
+
+    cursor = users_collection.find(filtro, PROYECCION_USUARIO).sort("_id", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+    users_data = await cursor.to_list(limit)
     
     if not users_data:
         return []
 
-    response_users = []
-    for user_doc in users_data:
-        response_users.append(await build_user_response(user_doc, db))
-    
-    return response_users
+    return await build_user_responses(users_data, db)
 
 # Ruta para obtener un usuario por ID
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user_by_id(
     user_id: str,
     db: AsyncIOMotorDatabase = Depends(get_db),
-    current_user: UserInDB = Depends(get_current_user) # Requiere autenticación
+    current_user: UsuarioToken = Depends(get_current_user) # Requiere autenticación
 ):
     """
     Obtiene un usuario por su ID.
@@ -136,7 +156,7 @@ async def get_user_by_id(
     except Exception:
         raise HTTPException(status_code=400, detail="ID de usuario inválido.")
 
-    user_data = await users_collection.find_one({"_id": object_id})
+    user_data = await users_collection.find_one({"_id": object_id}, PROYECCION_USUARIO)
     
     if not user_data:
         raise HTTPException(status_code=404, detail="Usuario no encontrado.")
@@ -148,7 +168,7 @@ async def get_user_by_id(
 async def create_user(
     user: UserCreate,
     db: AsyncIOMotorDatabase = Depends(get_db),
-    current_user: UserInDB = Depends(get_current_user) # Requiere autenticación
+    current_user: UsuarioToken = Depends(get_current_user) # Requiere autenticación
 ):
     """
     Crea un nuevo usuario.
@@ -167,7 +187,7 @@ async def create_user(
     if existing_user_by_phone_ext:
         raise HTTPException(status_code=400, detail="Extension Ya Existe !")
 
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password_async(user.password)
     
     user_dict = user.dict(exclude_unset=True)
     user_dict["password"] = hashed_password
@@ -189,7 +209,7 @@ async def update_user(
     user_id: str,
     data: UserUpdate,
     db: AsyncIOMotorDatabase = Depends(get_db),
-    current_user: UserInDB = Depends(get_current_user) # Requiere autenticación
+    current_user: UsuarioToken = Depends(get_current_user) # Requiere autenticación
 ):
     """
     Actualiza un usuario existente.
@@ -207,17 +227,23 @@ async def update_user(
 
     # Si se intenta actualizar la contraseña, hashearla
     if "password" in update_data:
-        update_data["password"] = hash_password(update_data["password"])
+        update_data["password"] = await hash_password_async(update_data["password"])
     
     update_data["updatedAt"] = datetime.utcnow()
 
+    actualizacion = {"$set": update_data}
+    if CAMPOS_DEL_TOKEN & update_data.keys():
+        actualizacion["$inc"] = {"token_version": 1}
+
     result = await users_collection.update_one(
         {"_id": object_id},
-        {"$set": update_data}
+        actualizacion
     )
 
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Usuario no encontrado.")
+    cache_usuarios.invalidar_usuario(user_id)
+    versiones_token.invalidar(user_id)
     
     updated_user_data = await users_collection.find_one({"_id": object_id})
     if not updated_user_data:
@@ -230,7 +256,7 @@ async def update_user(
 async def delete_user(
     user_id: str,
     db: AsyncIOMotorDatabase = Depends(get_db),
-    current_user: UserInDB = Depends(get_current_user) # Requiere autenticación
+    current_user: UsuarioToken = Depends(get_current_user) # Requiere autenticación
 ):
     """
     Elimina un usuario por su ID.
@@ -246,22 +272,29 @@ async def delete_user(
 
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Usuario no encontrado.")
+    cache_usuarios.invalidar_usuario(user_id)
+    versiones_token.invalidar(user_id)
     
     return {"message": "Usuario eliminado correctamente"}
 
 # Ruta para obtener colaboradores de un departamento específico
 @router.get("/departamento/{department_id}/colaboradores")
 async def get_colaboradores_del_departamento(department_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
-    print(f"Ruta llamada: /departamento/{department_id}/colaboradores")
+    logger.debug(f"Ruta llamada: /departamento/{department_id}/colaboradores")
     users_collection = db["users"]
-    colaboradores_data = await users_collection.find({"department_id": department_id}).to_list(None)
+    # Los usuarios guardan el departamento en `department` (string u ObjectId en documentos
+    # antiguos); el prefijo del índice department_status cubre la consulta
+    departamentos = [department_id] + ([ObjectId(department_id)] if ObjectId.is_valid(department_id) else [])
+    colaboradores_data = await users_collection.find(
+        {"department": {"$in": departamentos}}, PROYECCION_USUARIO
+    ).to_list(None)
     
     if not colaboradores_data:
-        print("No se encontraron colaboradores.")
+        logger.debug("No se encontraron colaboradores.")
         raise HTTPException(status_code=404, detail="No se encontraron colaboradores para este departamento.")
     
-    print(f"Colaboradores encontrados: {colaboradores_data}")
-    return colaboradores_data
+    logger.debug(f"Colaboradores encontrados: {len(colaboradores_data)}")
+    return await build_user_responses(colaboradores_data, db)
 
 
 
@@ -0,0 +1,40 @@
+"""
+Filtro de Bloom en memoria
+
+Responde "seguro que no está" o "puede estar": sirve para evitar lecturas a Mongo cuando la
+respuesta casi siempre es negativa. No permite borrar; para sacar elementos se reconstruye.
+"""
+import hashlib
+import math
+from typing import Iterable
+
+
+class FiltroBloom:
+    def __init__(self, capacidad: int, error: float):
+        capacidad = max(1, capacidad)
+        # Tamaño y número de hashes óptimos para `capacidad` elementos con la tasa de error pedida
+        self.bits = max(8, math.ceil(-capacidad * math.log(error) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacidad * math.log(2)))
+        self.capacidad = capacidad
+        self._arreglo = bytearray((self.bits + 7) // 8)
+        self.elementos = 0
+
+    def _posiciones(self, valor: str):
+        # Doble hashing (Kirsch-Mitzenmacher): k posiciones a partir de dos hashes de 64 bits
+        digest = hashlib.blake2b(valor.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def agregar(self, valor: str):
+        for posicion in self._posiciones(valor):
+            self._arreglo[posicion >> 3] |= 1 << (posicion & 7)
+        self.elementos += 1
+
+    def agregar_todos(self, valores: Iterable[str]):
+        for valor in valores:
+            self.agregar(valor)
+
+    def __contains__(self, valor: str) -> bool:
+        return all(self._arreglo[posicion >> 3] & (1 << (posicion & 7)) for posicion in self._posiciones(valor))
@@ -0,0 +1,136 @@
+"""
+Caché en memoria de los catálogos (departamentos y categorías)
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+
+from config import CATALOG_POLL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DEPARTAMENTOS = "departments"
+CATEGORIAS = "categories"
+COLECCIONES = (DEPARTAMENTOS, CATEGORIAS)
+
+
+def _clave_version(coleccion: str) -> str:
+    # Contador de versión por catálogo en la colección counters
+    return f"catalogo:{coleccion}"
+
+
+class CacheCatalogos:
+    """
+    Copia en memoria de colecciones pequeñas que casi no cambian.
+
+    Se carga completa al arrancar y se mantiene al día con un change stream. Si el servidor
+    no los soporta (Mongo sin replica set) se consulta cada poll_segundos un contador de
+    versión en `counters`, que las rutas de escritura incrementan en invalidar().
+    """
+
+    def __init__(self, poll_segundos: float):
+        self.poll_segundos = poll_segundos
+        self._documentos: Dict[str, Dict[str, dict]] = {}   # colección -> id -> documento
+        self._versiones: Dict[str, int] = {}
+        self._tarea: Optional[asyncio.Task] = None
+        self.modo = "inactivo"
+        self.recargas = 0
+
+    async def iniciar(self, db: AsyncIOMotorDatabase):
+        if self._tarea:
+            return
+        for coleccion in COLECCIONES:
+            await self.recargar(db, coleccion)
+        self._tarea = asyncio.create_task(self._vigilar(db))
+
+    async def detener(self):
+        if self._tarea:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+        self.modo = "inactivo"
+
+    async def recargar(self, db: AsyncIOMotorDatabase, coleccion: str):
+        """
+        Vuelve a leer una colección completa y reemplaza su copia en memoria.
+        """
+        version = await self._leer_version(db, coleccion)
+        documentos = await db[coleccion].find({}).to_list(None)
+        self._documentos[coleccion] = {str(d["_id"]): d for d in documentos}
+        self._versiones[coleccion] = version
+        self.recargas += 1
+
+    async def invalidar(self, db: AsyncIOMotorDatabase, coleccion: str):
+        """
+        Llamar después de escribir en un catálogo: avisa a los demás procesos y recarga este.
+        """
+        await db["counters"].update_one({"_id": _clave_version(coleccion)}, {"$inc": {"seq": 1}}, upsert=True)
+        await self.recargar(db, coleccion)
+
+    async def listar(self, db: AsyncIOMotorDatabase, coleccion: str) -> List[dict]:
+        """
+        Devuelve copias de todos los documentos del catálogo.
+        """
+        if coleccion not in self._documentos:
+            await self.recargar(db, coleccion)
+        return [dict(d) for d in self._documentos[coleccion].values()]
+
+    async def obtener(self, db: AsyncIOMotorDatabase, coleccion: str, documento_id) -> Optional[dict]:
+        """
+        Devuelve una copia del documento con ese id, o None si no existe.
+        """
+        if documento_id is None:
+            return None
+        if coleccion not in self._documentos:
+            await self.recargar(db, coleccion)
+        documento = self._documentos[coleccion].get(str(documento_id))
+        return dict(documento) if documento else None
+
+    def estadisticas(self) -> dict:
+        return {
+            "modo": self.modo,
+            "recargas": self.recargas,
+            "documentos": {c: len(d) for c, d in self._documentos.items()},
+        }
+
+    async def _leer_version(self, db: AsyncIOMotorDatabase, coleccion: str) -> int:
+        contador = await db["counters"].find_one({"_id": _clave_version(coleccion)})
+        return contador["seq"] if contador else 0
+
+    async def _vigilar(self, db: AsyncIOMotorDatabase):
+        try:
+            await self._escuchar_cambios(db)
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            logger.info(f"Change streams no disponibles ({e.code}), catálogos por sondeo cada {self.poll_segundos}s")
+        except PyMongoError as e:
+            logger.warning(f"Change stream de catálogos interrumpido: {e}; se pasa a sondeo")
+        await self._sondear(db)
+
+    async def _escuchar_cambios(self, db: AsyncIOMotorDatabase):
+        pipeline = [{"$match": {"ns.coll": {"$in": list(COLECCIONES)}}}]
+        async with db.watch(pipeline) as stream:
+            self.modo = "change_stream"
+            # Lo que haya cambiado entre la carga inicial y la apertura del stream
+            for coleccion in COLECCIONES:
+                await self.recargar(db, coleccion)
+            async for cambio in stream:
+                await self.recargar(db, cambio["ns"]["coll"])
+
+    async def _sondear(self, db: AsyncIOMotorDatabase):
+        self.modo = "sondeo"
+        while True:
+            await asyncio.sleep(self.poll_segundos)
+            for coleccion in COLECCIONES:
+                try:
+                    if await self._leer_version(db, coleccion) != self._versiones.get(coleccion):
+                        await self.recargar(db, coleccion)
+                except PyMongoError as e:
+                    logger.warning(f"No se pudo verificar la versión del catálogo {coleccion}: {e}")
+
+
+catalogos = CacheCatalogos(poll_segundos=CATALOG_POLL_SECONDS)
@@ -0,0 +1,198 @@
+"""
+Cola asíncrona de envío de correos con conexiones SMTP reutilizadas
+"""
+import asyncio
+import logging
+import smtplib
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from app.utils.email_utils import abrir_conexion_smtp, construir_mensaje, enviar_mensaje
+from config import (
+    EMAIL_BATCH_SIZE, EMAIL_IDLE_CHECK_SECONDS, EMAIL_MAX_RETRIES, EMAIL_QUEUE_MAXSIZE,
+    EMAIL_RETRY_BACKOFF_SECONDS, EMAIL_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Correo:
+    to: str
+    subject: str
+    body: str
+    encolado_en: float = field(default_factory=time.monotonic)
+    intentos: int = 0
+
+
+class _ConexionSMTP:
+    # Cada worker es dueño de una conexión, así que nunca se usa desde dos hilos a la vez
+    def __init__(self):
+        self.smtp: Optional[smtplib.SMTP] = None
+        self.ultimo_uso = 0.0
+
+    def obtener(self) -> smtplib.SMTP:
+        if self.smtp is not None and time.monotonic() - self.ultimo_uso > EMAIL_IDLE_CHECK_SECONDS:
+            try:
+                self.smtp.noop()
+            except OSError:  # SMTPException hereda de OSError
+                self.cerrar()
+        if self.smtp is None:
+            self.smtp = abrir_conexion_smtp()
+        self.ultimo_uso = time.monotonic()
+        return self.smtp
+
+    def cerrar(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except Exception:
+                pass
+            self.smtp = None
+
+
+class ColaCorreos:
+    """
+    Cola de notificaciones por correo atendida por workers en segundo plano.
+
+    Cada worker toma hasta tamano_lote correos de la cola y los envía por su propia conexión
+    SMTP autenticada (en un hilo, para no bloquear el event loop). Los fallos se reintentan
+    con backoff exponencial hasta max_reintentos.
+    """
+
+    def __init__(self, workers: int, tamano_lote: int, max_reintentos: int, backoff_base: float, max_cola: int):
+        self.workers = workers
+        self.tamano_lote = tamano_lote
+        self.max_reintentos = max_reintentos
+        self.backoff_base = backoff_base
+        self.max_cola = max_cola
+        self._cola: Optional[asyncio.Queue] = None
+        self._tareas: List[asyncio.Task] = []
+        self._reintentos_pendientes = set()
+        self.enviados = 0
+        self.fallidos = 0
+        self.reintentos = 0
+        self.descartados = 0
+        self._latencia_total = 0.0
+        self.latencia_max = 0.0
+
+    async def iniciar(self):
+        if self._tareas:
+            return
+        self._cola = asyncio.Queue(maxsize=self.max_cola)
+        self._tareas = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Cola de correos iniciada con {self.workers} worker(s)")
+
+    async def detener(self, espera: float = 10):
+        """
+        Espera a que se vacíe la cola (hasta `espera` segundos) y cierra los workers.
+        """
+        if not self._tareas:
+            return
+        try:
+            await asyncio.wait_for(self._cola.join(), timeout=espera)
+        except asyncio.TimeoutError:
+            logger.warning(f"Se cierran los workers con {self._cola.qsize()} correo(s) pendiente(s)")
+        for tarea in list(self._reintentos_pendientes) + self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self._tareas = []
+
+    def encolar(self, to: str, subject: str, body: str) -> bool:
+        """
+        Agrega un correo a la cola sin bloquear; devuelve False si no se pudo encolar.
+        """
+        if self._cola is None:
+            logger.warning(f"Cola de correos no iniciada, se descarta el correo a {to}")
+            self.descartados += 1
+            return False
+        try:
+            self._cola.put_nowait(Correo(to=to, subject=subject, body=body))
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"Cola de correos llena, se descarta el correo a {to}")
+            self.descartados += 1
+            return False
+
+    def estadisticas(self) -> dict:
+        return {
+            "en_cola": self._cola.qsize() if self._cola else 0,
+            "reintentos_programados": len(self._reintentos_pendientes),
+            "enviados": self.enviados,
+            "fallidos": self.fallidos,
+            "reintentos": self.reintentos,
+            "descartados": self.descartados,
+            "latencia_promedio_ms": round(self._latencia_total / self.enviados * 1000, 2) if self.enviados else 0.0,
+            "latencia_max_ms": round(self.latencia_max * 1000, 2),
+        }
+
+    async def _worker(self, numero: int):
+        conexion = _ConexionSMTP()
+        try:
+            while True:
+                lote = [await self._cola.get()]
+                while len(lote) < self.tamano_lote and not self._cola.empty():
+                    lote.append(self._cola.get_nowait())
+                try:
+                    fallidos = await asyncio.to_thread(self._enviar_lote, conexion, lote)
+                    self._registrar(lote, fallidos)
+                except Exception as e:
+                    logger.error(f"Worker de correo {numero}: error inesperado: {e}")
+                    self._registrar(lote, lote)
+                finally:
+                    for _ in lote:
+                        self._cola.task_done()
+        finally:
+            await asyncio.to_thread(conexion.cerrar)
+
+    def _enviar_lote(self, conexion: _ConexionSMTP, lote: List[Correo]) -> List[Correo]:
+        # Corre en un hilo: todo el lote reutiliza la misma conexión autenticada
+        fallidos = []
+        for correo in lote:
+            try:
+                enviar_mensaje(conexion.obtener(), construir_mensaje(correo.to, correo.subject, correo.body))
+            except OSError as e:
+                # La conexión puede haber quedado inutilizable: se reabre en el siguiente envío
+                logger.warning(f"Error al enviar correo a {correo.to}: {e}")
+                conexion.cerrar()
+                fallidos.append(correo)
+        return fallidos
+
+    def _registrar(self, lote: List[Correo], fallidos: List[Correo]):
+        ahora = time.monotonic()
+        ids_fallidos = {id(correo) for correo in fallidos}
+        for correo in lote:
+            if id(correo) in ids_fallidos:
+                continue
+            latencia = ahora - correo.encolado_en
+            self.enviados += 1
+            self._latencia_total += latencia
+            self.latencia_max = max(self.latencia_max, latencia)
+        for correo in fallidos:
+            correo.intentos += 1
+            if correo.intentos > self.max_reintentos:
+                self.fallidos += 1
+                logger.error(f"Correo a {correo.to} descartado tras {correo.intentos} intento(s)")
+                continue
+            self.reintentos += 1
+            tarea = asyncio.create_task(self._reencolar(correo, self.backoff_base * 2 ** (correo.intentos - 1)))
+            self._reintentos_pendientes.add(tarea)
+            tarea.add_done_callback(self._reintentos_pendientes.discard)
+
+    async def _reencolar(self, correo: Correo, espera: float):
+        await asyncio.sleep(espera)
+        try:
+            self._cola.put_nowait(correo)
+        except asyncio.QueueFull:
+            self.descartados += 1
+            logger.warning(f"Cola de correos llena, se descarta el reintento a {correo.to}")
+
+
+cola_correos = ColaCorreos(
+    workers=EMAIL_WORKERS,
+    tamano_lote=EMAIL_BATCH_SIZE,
+    max_reintentos=EMAIL_MAX_RETRIES,
+    backoff_base=EMAIL_RETRY_BACKOFF_SECONDS,
+    max_cola=EMAIL_QUEUE_MAXSIZE,
+)
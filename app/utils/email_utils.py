@@ -1,35 +1,72 @@
+import logging
 import smtplib
 from email.message import EmailMessage
 from dotenv import load_dotenv
 import os
 
+from app.utils.metricas import smtp_duracion, smtp_fallos
+from config import EMAIL_TIMEOUT
+
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 EMAIL_HOST = os.getenv("EMAIL_HOST")
 EMAIL_PORT = int(os.getenv("EMAIL_PORT", 465))
 EMAIL_USER = os.getenv("EMAIL_USER")
 EMAIL_PASS = os.getenv("EMAIL_PASS")
 
-def send_email(to: str, subject: str, body: str):
+def construir_mensaje(to: str, subject: str, body: str) -> EmailMessage:
     msg = EmailMessage()
     msg["Subject"] = subject
     msg["From"] = EMAIL_USER
     msg["To"] = to
     msg.set_content(body)
+    return msg
+
+def _conectar() -> smtplib.SMTP:
+    if EMAIL_PORT == 465:
+        smtp = smtplib.SMTP_SSL(EMAIL_HOST, EMAIL_PORT, timeout=EMAIL_TIMEOUT)
+    else:
+        smtp = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT, timeout=EMAIL_TIMEOUT)
+        smtp.ehlo()
+        smtp.starttls()
+        smtp.ehlo()
+    try:
+        smtp.login(EMAIL_USER, EMAIL_PASS)
+    except Exception:
+        smtp.close()
+        raise
+    return smtp
+
+def abrir_conexion_smtp() -> smtplib.SMTP:
+    """
+    Abre una conexión SMTP ya autenticada (SSL en el puerto 465, STARTTLS en los demás).
+    """
+    try:
+        with smtp_duracion.medir(operation="connect"):
+            return _conectar()
+    except Exception:
+        smtp_fallos.inc(operation="connect")
+        raise
 
+def enviar_mensaje(smtp: smtplib.SMTP, msg: EmailMessage):
+    """
+    Envía un mensaje por una conexión abierta, midiendo el tiempo del envío.
+    """
     try:
-        if EMAIL_PORT == 465:
-            with smtplib.SMTP_SSL(EMAIL_HOST, EMAIL_PORT) as smtp:
-                smtp.login(EMAIL_USER, EMAIL_PASS)
-                smtp.send_message(msg)
-        else:
-            with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT) as smtp:
-                smtp.ehlo()
-                smtp.starttls()
-                smtp.ehlo()
-                smtp.login(EMAIL_USER, EMAIL_PASS)
-                smtp.send_message(msg)
-
-        print(f"Correo enviado a {to}")
+        with smtp_duracion.medir(operation="send"):
+            smtp.send_message(msg)
+    except Exception:
+        smtp_fallos.inc(operation="send")
+        raise
+
+def send_email(to: str, subject: str, body: str):
+    msg = construir_mensaje(to, subject, body)
+
+    try:
+        with abrir_conexion_smtp() as smtp:
+            enviar_mensaje(smtp, msg)
+
+        logger.info(f"Correo enviado a {to}")
     except Exception as e:
-        print(f"Error al enviar correo a {to}: {e}")
+        logger.error(f"Error al enviar correo a {to}: {e}")
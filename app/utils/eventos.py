@@ -0,0 +1,104 @@
+"""
+Hub de eventos en memoria (pub/sub) para empujar cambios de tickets a los clientes
+
+Cada conexión (WebSocket o SSE) se suscribe con sus claves de visibilidad (u:<usuario>,
+d:<departamento>, las mismas de app.models.bandejas) y recibe los eventos publicados con
+alguna de ellas. El evento se serializa una sola vez y se reparte a las colas.
+
+Contrapresión: cada conexión tiene una cola acotada. Si un cliente lento la llena, se
+descartan sus eventos pendientes y se le deja uno solo de tipo "resync" para que vuelva a
+pedir los listados; así un cliente lento no hace crecer la memoria ni frena a los demás.
+
+El hub es local al proceso: con varios workers cada conexión recibe los eventos publicados
+en su mismo worker.
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set
+
+from app.utils.metricas import eventos_publicados, eventos_resync
+from config import EVENTS_QUEUE_SIZE
+
+EVENTO_RESYNC = json.dumps({"tipo": "resync"})
+
+
+class Suscripcion:
+    def __init__(self, claves: Iterable[str], capacidad: int):
+        self.claves = set(claves)
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=capacidad)
+        self.desbordes = 0
+
+    def entregar(self, mensaje: str):
+        try:
+            self.cola.put_nowait(mensaje)
+        except asyncio.QueueFull:
+            # Cliente lento: lo pendiente ya no sirve, se le pide resincronizar
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait(EVENTO_RESYNC)
+            self.desbordes += 1
+            eventos_resync.inc()
+
+    async def siguiente(self, timeout: float) -> Optional[str]:
+        """
+        Siguiente mensaje, o None si no llegó ninguno en `timeout` segundos (toca heartbeat).
+        """
+        try:
+            return await asyncio.wait_for(self.cola.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class HubEventos:
+    def __init__(self, capacidad_cola: int):
+        self.capacidad_cola = capacidad_cola
+        self._por_clave: Dict[str, Set[Suscripcion]] = {}
+        self._suscripciones: Set[Suscripcion] = set()
+
+    def suscribir(self, claves: Iterable[str]) -> Suscripcion:
+        suscripcion = Suscripcion(claves, self.capacidad_cola)
+        self._suscripciones.add(suscripcion)
+        for clave in suscripcion.claves:
+            self._por_clave.setdefault(clave, set()).add(suscripcion)
+        return suscripcion
+
+    def desuscribir(self, suscripcion: Suscripcion):
+        self._suscripciones.discard(suscripcion)
+        for clave in suscripcion.claves:
+            suscritas = self._por_clave.get(clave)
+            if suscritas is not None:
+                suscritas.discard(suscripcion)
+                if not suscritas:
+                    del self._por_clave[clave]
+
+    def publicar(self, claves: Iterable[str], evento: dict) -> int:
+        """
+        Entrega el evento a las conexiones suscritas a alguna de las claves. No bloquea.
+        """
+        destinos = set()
+        for clave in claves:
+            destinos.update(self._por_clave.get(clave, ()))
+        eventos_publicados.inc(tipo=evento.get("tipo", ""))
+        if not destinos:
+            return 0
+        mensaje = json.dumps(evento, default=_serializar, ensure_ascii=False, separators=(",", ":"))
+        for suscripcion in destinos:
+            suscripcion.entregar(mensaje)
+        return len(destinos)
+
+    def estadisticas(self) -> dict:
+        return {
+            "conexiones": len(self._suscripciones),
+            "claves": len(self._por_clave),
+            "pendientes": sum(s.cola.qsize() for s in self._suscripciones),
+        }
+
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return str(valor)
+
+
+hub_eventos = HubEventos(EVENTS_QUEUE_SIZE)
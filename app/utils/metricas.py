@@ -0,0 +1,228 @@
+"""
+Registro de métricas en memoria con salida en formato de texto de Prometheus
+"""
+import math
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Segundos; cubren desde consultas de Mongo sub-milisegundo hasta envíos SMTP lentos
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_DB = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+BUCKETS_SMTP = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_BCRYPT = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatear_etiquetas(nombres: Tuple[str, ...], valores: Tuple, extra: str = "") -> str:
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _formatear_numero(valor: float) -> str:
+    if math.isinf(valor):
+        return "+Inf" if valor > 0 else "-Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    # Las métricas se actualizan desde el event loop y desde los hilos de Motor/SMTP
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = Lock()
+        self._valores: Dict[Tuple, object] = {}
+
+    def _clave(self, etiquetas: dict) -> Tuple:
+        return tuple(str(etiquetas.get(n, "")) for n in self.etiquetas)
+
+    def exponer(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        with self._lock:
+            for clave, valor in sorted(self._valores.items()):
+                lineas.append(f"{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_formatear_numero(valor)}")
+        return lineas
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, valor: float = 1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+
+class Medidor(_Metrica):
+    tipo = "gauge"
+
+    def inc(self, valor: float = 1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def dec(self, valor: float = 1, **etiquetas):
+        self.inc(-valor, **etiquetas)
+
+    def set(self, valor: float, **etiquetas):
+        with self._lock:
+            self._valores[self._clave(etiquetas)] = valor
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = (), buckets: Tuple[float, ...] = BUCKETS_HTTP):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor: float, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            serie = self._valores.get(clave)
+            if serie is None:
+                # [conteo por bucket (no acumulado)..., conteo en +Inf, suma]
+                serie = self._valores[clave] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[i] += 1
+                    break
+            else:
+                serie[len(self.buckets)] += 1
+            serie[-1] += valor
+
+    @contextmanager
+    def medir(self, **etiquetas):
+        """
+        Observa la duración del bloque, aunque termine con excepción.
+        """
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **etiquetas)
+
+    def exponer(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        with self._lock:
+            series = sorted((clave, list(serie)) for clave, serie in self._valores.items())
+        for clave, serie in series:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (math.inf,), serie[:-1]):
+                acumulado += conteo
+                le = 'le="' + _formatear_numero(float(limite)) + '"'
+                lineas.append(f"{self.nombre}_bucket{_formatear_etiquetas(self.etiquetas, clave, le)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_formatear_etiquetas(self.etiquetas, clave)} {_formatear_numero(serie[-1])}")
+            lineas.append(f"{self.nombre}_count{_formatear_etiquetas(self.etiquetas, clave)} {acumulado}")
+        return lineas
+
+
+class RegistroMetricas:
+    """
+    Conjunto de métricas del proceso. Los recolectores se ejecutan justo antes de exponer,
+    para copiar en medidores el estado de componentes que llevan sus propios contadores.
+    """
+
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        self._recolectores: List[Callable[[], None]] = []
+        self._lock = Lock()
+
+    def _registrar(self, metrica: _Metrica) -> _Metrica:
+        with self._lock:
+            existente = self._metricas.get(metrica.nombre)
+            if existente is not None:
+                return existente
+            self._metricas[metrica.nombre] = metrica
+            return metrica
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = ()) -> Contador:
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def medidor(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = ()) -> Medidor:
+        return self._registrar(Medidor(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = (), buckets: Tuple[float, ...] = BUCKETS_HTTP) -> Histograma:
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def recolector(self, funcion: Callable[[], None]) -> Callable[[], None]:
+        self._recolectores.append(funcion)
+        return funcion
+
+    def exponer(self) -> str:
+        for funcion in self._recolectores:
+            funcion()
+        lineas = []
+        for metrica in list(self._metricas.values()):
+            lineas += metrica.exponer()
+        return "\n".join(lineas) + "\n"
+
+
+registro = RegistroMetricas()
+
+# --- HTTP ---
+http_peticiones = registro.contador("http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status"))
+http_duracion = registro.histograma("http_request_duration_seconds", "Latencia de las peticiones HTTP", ("method", "route"))
+http_en_curso = registro.medidor("http_requests_in_progress", "Peticiones HTTP en curso", ("method",))
+
+# --- MongoDB (alimentadas por app.db.monitoreo) ---
+db_duracion = registro.histograma("mongodb_command_duration_seconds", "Duración de los comandos de MongoDB", ("collection", "command"), BUCKETS_DB)
+db_fallos = registro.contador("mongodb_command_failures_total", "Comandos de MongoDB fallidos", ("collection", "command"))
+
+# --- SMTP ---
+smtp_duracion = registro.histograma("smtp_operation_duration_seconds", "Duración de las operaciones SMTP", ("operation",), BUCKETS_SMTP)
+smtp_fallos = registro.contador("smtp_failures_total", "Operaciones SMTP fallidas", ("operation",))
+
+# --- Contraseñas (alimentadas por app.auth.hashing) ---
+bcrypt_duracion = registro.histograma("password_hash_duration_seconds", "Duración de hash/verificación bcrypt en el pool", ("operation",), BUCKETS_BCRYPT)
+bcrypt_espera = registro.histograma("password_hash_queue_wait_seconds", "Espera en cola antes de entrar al pool bcrypt", ("operation",), BUCKETS_BCRYPT)
+bcrypt_rechazos = registro.contador("password_hash_rejected_total", "Operaciones bcrypt rechazadas por cola llena", ("operation",))
+
+# --- Eventos en tiempo real (alimentadas por app.utils.eventos) ---
+eventos_publicados = registro.contador("events_published_total", "Eventos publicados en el hub", ("tipo",))
+eventos_resync = registro.contador("events_resync_total", "Colas de conexión desbordadas (se envió resync)")
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI que mide cada petición HTTP.
+
+    La ruta se etiqueta con la plantilla (/tickets/{ticket_id}) y no con la URL real, para
+    no crear una serie por cada id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metodo = scope["method"]
+        estado = {"codigo": 500}
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["codigo"] = mensaje["status"]
+            await send(mensaje)
+
+        http_en_curso.inc(method=metodo)
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            http_en_curso.dec(method=metodo)
+            ruta = getattr(scope.get("route"), "path", None) or "sin_ruta"
+            http_duracion.observar(duracion, method=metodo, route=ruta)
+            http_peticiones.inc(method=metodo, route=ruta, status=estado["codigo"])
@@ -0,0 +1,16 @@
+"""
+Normalización de nombres para detectar duplicados en catálogos
+"""
+import unicodedata
+
+
+def normalizar_nombre(nombre: str) -> str:
+    """
+    Clave de comparación de un nombre: sin acentos, casefold y con espacios colapsados.
+
+    "  Recursos  Humanos" y "recursos humános" producen la misma clave.
+    """
+    descompuesto = unicodedata.normalize("NFKD", nombre or "")
+    sin_acentos = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_acentos.casefold().split())
+
@@ -0,0 +1,89 @@
+"""
+Utilidades de paginación por cursor (keyset) para colecciones de MongoDB
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId, errors
+from fastapi import HTTPException
+
+# Orden estable usado por todos los listados paginados: más recientes primero
+ORDEN_KEYSET = [("createdAt", -1), ("_id", -1)]
+
+
+def codificar_cursor(documento: dict) -> str:
+    """
+    Genera un cursor opaco a partir del último documento de la página.
+    """
+    creado = documento.get("createdAt")
+    payload = {
+        "c": creado.isoformat() if isinstance(creado, datetime) else None,
+        "i": str(documento["_id"]),
+    }
+    crudo = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> tuple:
+    """
+    Devuelve (createdAt, _id) a partir de un cursor generado por codificar_cursor.
+    """
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        creado = datetime.fromisoformat(payload["c"]) if payload.get("c") else None
+        return creado, ObjectId(payload["i"])
+    except (ValueError, KeyError, TypeError, errors.InvalidId):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+
+def filtro_despues_de(cursor: Optional[str]) -> dict:
+    """
+    Construye la condición para reanudar justo después del cursor, respetando ORDEN_KEYSET.
+
+    Los documentos sin createdAt se ordenan al final (null es el menor valor en Mongo),
+    por eso se incluyen explícitamente cuando el cursor todavía está en documentos fechados.
+    """
+    if not cursor:
+        return {}
+    creado, ultimo_id = decodificar_cursor(cursor)
+    if creado is None:
+        return {"createdAt": None, "_id": {"$lt": ultimo_id}}
+    return {
+        "$or": [
+            {"createdAt": {"$lt": creado}},
+            {"createdAt": creado, "_id": {"$lt": ultimo_id}},
+            {"createdAt": None},
+        ]
+    }
+
+
+def combinar_filtros(*filtros: dict) -> dict:
+    """
+    Une varios filtros con $and omitiendo los vacíos.
+    """
+    no_vacios = [f for f in filtros if f]
+    if not no_vacios:
+        return {}
+    if len(no_vacios) == 1:
+        return no_vacios[0]
+    return {"$and": no_vacios}
+
+
+async def paginar(cursor_mongo, limit: int, transformar) -> dict:
+    """
+    Consume como máximo limit + 1 documentos del cursor y arma el sobre de respuesta.
+
+    El documento extra solo se usa para saber si existe una página siguiente, de modo
+    que la memoria por petición queda acotada por limit sin importar el tamaño de la colección.
+    """
+    documentos = await cursor_mongo.to_list(length=limit + 1)
+    hay_mas = len(documentos) > limit
+    pagina = documentos[:limit]
+    return {
+        "items": [transformar(d) for d in pagina],
+        "next_cursor": codificar_cursor(pagina[-1]) if hay_mas and pagina else None,
+        "limit": limit,
+    }
@@ -0,0 +1,156 @@
+"""
+Perfilador de consultas por petición (modo debug) con detección de patrones N+1
+"""
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from threading import Lock
+from typing import Optional
+
+from config import PROFILER_ENABLED, PROFILER_HEADER, PROFILER_MAX_PROFILES, PROFILER_N1_THRESHOLD
+
+# Perfil de la petición en curso; Motor copia el contexto a sus hilos, así lo ve el listener de comandos
+perfil_actual: ContextVar[Optional["PerfilPeticion"]] = ContextVar("perfil_actual", default=None)
+
+
+def forma_de(valor):
+    """
+    Reemplaza los valores por "?" y conserva la estructura (campos y operadores).
+
+    {"_id": ObjectId(...)} y {"_id": ObjectId(...otro)} tienen la misma forma.
+    """
+    if isinstance(valor, dict):
+        return {k: forma_de(v) for k, v in sorted(valor.items())}
+    if isinstance(valor, (list, tuple)):
+        # Una lista de $in con 3 o con 300 ids es la misma consulta
+        formas = []
+        for elemento in valor:
+            forma = forma_de(elemento)
+            if forma not in formas:
+                formas.append(forma)
+        return formas
+    return "?"
+
+
+def forma_del_comando(nombre: str, coleccion: str, comando: dict) -> str:
+    if nombre == "aggregate":
+        detalle = [next(iter(etapa), "?") for etapa in comando.get("pipeline", [])]
+    elif nombre in ("find", "count", "distinct"):
+        detalle = forma_de(comando.get("filter", comando.get("query", {})))
+    elif nombre in ("update", "delete"):
+        clave = "updates" if nombre == "update" else "deletes"
+        detalle = [forma_de(op.get("q", {})) for op in comando.get(clave, [])[:1]]
+    elif nombre == "findAndModify":
+        detalle = forma_de(comando.get("query", {}))
+    else:
+        detalle = ""
+    return f"{coleccion}.{nombre} {detalle}".rstrip()
+
+
+class PerfilPeticion:
+    def __init__(self, metodo: str, ruta: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.metodo = metodo
+        self.ruta = ruta
+        self.inicio = time.time()
+        self.duracion_total = None
+        self.estado = None
+        self._formas = OrderedDict()   # forma -> {"conteo", "segundos", "fallidos"}
+        self._lock = Lock()
+
+    def registrar(self, forma: str, segundos: float, fallido: bool):
+        with self._lock:
+            datos = self._formas.setdefault(forma, {"conteo": 0, "segundos": 0.0, "fallidos": 0})
+            datos["conteo"] += 1
+            datos["segundos"] += segundos
+            datos["fallidos"] += int(fallido)
+
+    def resumen(self) -> dict:
+        with self._lock:
+            formas = [{"forma": f, **d} for f, d in self._formas.items()]
+        formas.sort(key=lambda d: d["segundos"], reverse=True)
+        return {
+            "id": self.id,
+            "metodo": self.metodo,
+            "ruta": self.ruta,
+            "estado": self.estado,
+            "duracion_ms": round(self.duracion_total * 1000, 2) if self.duracion_total is not None else None,
+            "comandos": sum(d["conteo"] for d in formas),
+            "db_ms": round(sum(d["segundos"] for d in formas) * 1000, 2),
+            "sospechas_n_mas_1": [d["forma"] for d in formas if d["conteo"] >= PROFILER_N1_THRESHOLD],
+            "formas": [{**d, "segundos": round(d["segundos"], 6)} for d in formas],
+        }
+
+    def encabezado(self) -> str:
+        # Versión corta para X-Profile-Summary; el detalle queda en /debug/profile/{id}
+        datos = self.resumen()
+        partes = [f"comandos={datos['comandos']}", f"db_ms={datos['db_ms']}"]
+        if datos["sospechas_n_mas_1"]:
+            partes.append(f"n+1={len(datos['sospechas_n_mas_1'])}")
+        return ";".join(partes)
+
+
+class AlmacenPerfiles:
+    # Últimos perfiles terminados, para consultarlos por id
+    def __init__(self, maximo: int):
+        self.maximo = maximo
+        self._perfiles = OrderedDict()
+        self._lock = Lock()
+
+    def guardar(self, perfil: PerfilPeticion):
+        with self._lock:
+            self._perfiles[perfil.id] = perfil
+            while len(self._perfiles) > self.maximo:
+                self._perfiles.popitem(last=False)
+
+    def obtener(self, perfil_id: str) -> Optional[PerfilPeticion]:
+        with self._lock:
+            return self._perfiles.get(perfil_id)
+
+
+perfiles = AlmacenPerfiles(PROFILER_MAX_PROFILES)
+
+
+class MiddlewarePerfilador:
+    """
+    Middleware ASGI: si PROFILER_ENABLED está activo y la petición trae el encabezado
+    PROFILER_HEADER, registra cada comando de Mongo que emite y responde con
+    X-Profile-Id y X-Profile-Summary.
+
+    El resumen del encabezado cubre lo ejecutado hasta que empieza la respuesta; en
+    respuestas en streaming el perfil completo se consulta después en /debug/profile/{id}.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._encabezado = PROFILER_HEADER.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        if not PROFILER_ENABLED or scope["type"] != "http" or not any(
+            nombre == self._encabezado for nombre, _ in scope.get("headers", [])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        perfil = PerfilPeticion(scope["method"], scope["path"])
+        token = perfil_actual.set(perfil)
+        inicio = time.perf_counter()
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                perfil.estado = mensaje["status"]
+                perfil.duracion_total = time.perf_counter() - inicio
+                encabezados = list(mensaje.get("headers", []))
+                encabezados.append((b"x-profile-id", perfil.id.encode()))
+                encabezados.append((b"x-profile-summary", perfil.encabezado().encode()))
+                mensaje = {**mensaje, "headers": encabezados}
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            perfil.duracion_total = time.perf_counter() - inicio
+            perfil.ruta = getattr(scope.get("route"), "path", None) or perfil.ruta
+            perfil_actual.reset(token)
+            perfiles.guardar(perfil)
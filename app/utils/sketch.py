@@ -0,0 +1,82 @@
+"""
+Sketch de cuantiles con buckets logarítmicos, combinable con $inc en MongoDB
+
+Cada valor positivo x cae en el bucket i = ceil(log(x) / log(gamma)), con
+gamma = (1 + e) / (1 - e). El representante 2 * gamma^i / (gamma + 1) está a un error
+relativo de a lo más e de cualquier valor del bucket (misma idea que DDSketch).
+
+El sketch se guarda como {"n", "suma", "min", "max", "b": {"<i>": conteo}} y dos sketches
+se combinan sumando conteos, así que se puede actualizar con $inc/$min/$max sin leerlo.
+"""
+import math
+from typing import Dict, Iterable, List, Optional
+
+ERROR_RELATIVO = 0.02
+GAMMA = (1 + ERROR_RELATIVO) / (1 - ERROR_RELATIVO)
+_LOG_GAMMA = math.log(GAMMA)
+BUCKET_CERO = "z"   # valores <= 0 (p. ej. dos cambios de estado en el mismo segundo)
+
+
+def indice_bucket(valor: float) -> str:
+    if valor <= 0:
+        return BUCKET_CERO
+    return str(math.ceil(math.log(valor) / _LOG_GAMMA))
+
+
+def valor_bucket(indice: str) -> float:
+    if indice == BUCKET_CERO:
+        return 0.0
+    return 2 * GAMMA ** int(indice) / (GAMMA + 1)
+
+
+def actualizacion_mongo(campo: str, valor: float) -> dict:
+    """
+    Operadores de actualización que agregan `valor` al sketch guardado en `campo`.
+    """
+    return {
+        "$inc": {f"{campo}.n": 1, f"{campo}.suma": valor, f"{campo}.b.{indice_bucket(valor)}": 1},
+        "$min": {f"{campo}.min": valor},
+        "$max": {f"{campo}.max": valor},
+    }
+
+
+def combinar(sketches: Iterable[Optional[dict]]) -> dict:
+    resultado = {"n": 0, "suma": 0.0, "min": None, "max": None, "b": {}}
+    for sketch in sketches:
+        if not sketch:
+            continue
+        resultado["n"] += sketch.get("n", 0)
+        resultado["suma"] += sketch.get("suma", 0.0)
+        for limite, funcion in (("min", min), ("max", max)):
+            if sketch.get(limite) is not None:
+                actual = resultado[limite]
+                resultado[limite] = sketch[limite] if actual is None else funcion(actual, sketch[limite])
+        for indice, conteo in (sketch.get("b") or {}).items():
+            resultado["b"][indice] = resultado["b"].get(indice, 0) + conteo
+    return resultado
+
+
+def cuantiles(sketch: dict, qs: List[float]) -> Dict[str, Optional[float]]:
+    """
+    Devuelve {"p50": ..., "p90": ...} para los cuantiles pedidos (0 < q <= 1).
+    """
+    n = sketch.get("n", 0)
+    if not n:
+        return {f"p{round(q * 100)}": None for q in qs}
+
+    orden = sorted(sketch["b"].items(), key=lambda par: -math.inf if par[0] == BUCKET_CERO else int(par[0]))
+    resultado = {}
+    for q in qs:
+        rango = max(1, math.ceil(q * n))
+        acumulado = 0
+        valor = None
+        for indice, conteo in orden:
+            acumulado += conteo
+            if acumulado >= rango:
+                valor = valor_bucket(indice)
+                break
+        # El representante del bucket puede salirse del rango observado
+        if valor is not None and sketch.get("min") is not None:
+            valor = min(max(valor, sketch["min"]), sketch["max"])
+        resultado[f"p{round(q * 100)}"] = valor
+    return resultado
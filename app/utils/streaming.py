@@ -0,0 +1,63 @@
+"""
+Respuestas en streaming (NDJSON o arreglo JSON) para listados grandes
+"""
+import json
+from datetime import datetime
+from typing import Callable, Optional
+
+from bson import ObjectId
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+MEDIA_NDJSON = "application/x-ndjson"
+FORMATO_NDJSON = "ndjson"
+FORMATO_JSON = "json"
+
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def _a_json(documento: dict) -> bytes:
+    return json.dumps(documento, default=_serializar, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def formato_stream(request: Request, stream: bool) -> Optional[str]:
+    """
+    Decide si la petición pidió streaming: Accept: application/x-ndjson o ?stream=1.
+    """
+    if MEDIA_NDJSON in request.headers.get("accept", ""):
+        return FORMATO_NDJSON
+    if stream:
+        return FORMATO_JSON
+    return None
+
+
+async def _generar_ndjson(cursor, transformar: Callable):
+    async for documento in cursor:
+        yield _a_json(transformar(documento)) + b"\n"
+
+
+async def _generar_arreglo_json(cursor, transformar: Callable):
+    yield b"["
+    primero = True
+    async for documento in cursor:
+        yield (b"" if primero else b",") + _a_json(transformar(documento))
+        primero = False
+    yield b"]"
+
+
+def respuesta_stream(cursor, transformar: Callable, formato: str) -> StreamingResponse:
+    """
+    Escribe cada documento serializado a medida que llega del cursor de Motor.
+
+    Solo se mantiene en memoria el lote actual del cursor, así que el primer byte sale
+    en cuanto llega el primer lote y la memoria no crece con el tamaño del resultado.
+    """
+    if formato == FORMATO_NDJSON:
+        return StreamingResponse(_generar_ndjson(cursor, transformar), media_type=MEDIA_NDJSON)
+    return StreamingResponse(_generar_arreglo_json(cursor, transformar), media_type="application/json")
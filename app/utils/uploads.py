@@ -0,0 +1,114 @@
+"""
+Recepción de archivos subidos en bloques, con hash y tamaño máximo
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+
+from fastapi import HTTPException, UploadFile
+
+from config import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE, UPLOAD_SHARD_LEVELS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ResultadoUpload:
+    ruta: str
+    tamano: int
+    sha256: str
+    segundos: float
+
+    @property
+    def bytes_por_segundo(self) -> float:
+        return self.tamano / self.segundos if self.segundos > 0 else float(self.tamano)
+
+
+def subcarpeta_por_hash(digest: str, niveles: int = UPLOAD_SHARD_LEVELS) -> str:
+    """
+    Subcarpeta anidada tomada de los primeros caracteres de un hash, p. ej. "3f/a9" con dos niveles.
+
+    Con 256 entradas por nivel los archivos se reparten de forma uniforme y ninguna
+    carpeta crece sin límite.
+    """
+    return "/".join(digest[2 * i: 2 * i + 2] for i in range(niveles))
+
+
+def _escribir_bloque(archivo, hasher, bloque: bytes):
+    # hashlib libera el GIL con bloques grandes, así que hash y escritura van juntos en el hilo
+    hasher.update(bloque)
+    archivo.write(bloque)
+
+
+def _borrar(ruta: str):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
+
+
+async def recibir_upload(archivo: UploadFile, carpeta: str, max_bytes: int = MAX_UPLOAD_BYTES) -> ResultadoUpload:
+    """
+    Copia el archivo subido a un temporal dentro de `carpeta`, bloque a bloque.
+
+    Solo hay un bloque de UPLOAD_CHUNK_SIZE en memoria a la vez y la escritura corre fuera
+    del event loop. Si se supera max_bytes se borra el temporal y se responde 413.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    fd, ruta_tmp = tempfile.mkstemp(dir=carpeta, prefix=".upload-", suffix=".part")
+    hasher = hashlib.sha256()
+    tamano = 0
+    inicio = time.perf_counter()
+    try:
+        with os.fdopen(fd, "wb") as destino:
+            while True:
+                bloque = await archivo.read(UPLOAD_CHUNK_SIZE)
+                if not bloque:
+                    break
+                tamano += len(bloque)
+                if tamano > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"El archivo supera el tamaño máximo permitido ({max_bytes} bytes)",
+                    )
+                await asyncio.to_thread(_escribir_bloque, destino, hasher, bloque)
+    except BaseException:
+        await asyncio.to_thread(_borrar, ruta_tmp)
+        raise
+
+    resultado = ResultadoUpload(ruta_tmp, tamano, hasher.hexdigest(), time.perf_counter() - inicio)
+    logger.info(
+        f"Upload recibido: {resultado.tamano} bytes en {resultado.segundos:.3f}s "
+        f"({resultado.bytes_por_segundo / 1024 / 1024:.2f} MiB/s)"
+    )
+    return resultado
+
+
+def _mover(origen: str, destino: str):
+    os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+    os.replace(origen, destino)
+
+
+async def mover_a_destino(resultado: ResultadoUpload, destino: str) -> ResultadoUpload:
+    """
+    Renombra atómicamente el temporal a su ruta final (misma carpeta/sistema de archivos).
+    """
+    await asyncio.to_thread(_mover, resultado.ruta, destino)
+    resultado.ruta = destino
+    return resultado
+
+
+async def descartar_upload(resultado: ResultadoUpload):
+    await asyncio.to_thread(_borrar, resultado.ruta)
+
+
+async def guardar_upload(archivo: UploadFile, destino: str, max_bytes: int = MAX_UPLOAD_BYTES) -> ResultadoUpload:
+    """
+    Recibe el archivo en bloques y lo deja en `destino` sin que nunca exista a medio escribir.
+    """
+    resultado = await recibir_upload(archivo, os.path.dirname(destino) or ".", max_bytes)
+    return await mover_a_destino(resultado, destino)
@@ -35,3 +35,63 @@ if not MONGODB_HOST or not MONGODB_PORT or not MONGODB_DATABASE:
 # MONGODB_DATABASE=your_database_name
 
 
+# Cola de correos: workers con conexión SMTP propia, lotes, reintentos y tamaño máximo
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", 2))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 20))
+EMAIL_MAX_RETRIES = int(os.getenv("EMAIL_MAX_RETRIES", 3))
+EMAIL_RETRY_BACKOFF_SECONDS = float(os.getenv("EMAIL_RETRY_BACKOFF_SECONDS", 2))
+EMAIL_QUEUE_MAXSIZE = int(os.getenv("EMAIL_QUEUE_MAXSIZE", 10000))
+EMAIL_IDLE_CHECK_SECONDS = float(os.getenv("EMAIL_IDLE_CHECK_SECONDS", 60))   # Inactiva más que esto: NOOP antes de reutilizar
+EMAIL_TIMEOUT = int(os.getenv("EMAIL_TIMEOUT", 30))                           # Timeout del socket SMTP
+
+# Tamaño de lote del cursor de Mongo al transmitir listados en streaming
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 200))
+
+# Caché en memoria de usuarios autenticados (get_current_user)
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", 1000))
+
+# Subida de archivos adjuntos
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "app/uploads")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))          # 1 MiB por bloque
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 100 * 1024 * 1024))     # 100 MiB por archivo
+UPLOAD_SHARD_LEVELS = int(os.getenv("UPLOAD_SHARD_LEVELS", 2))                # Niveles de subcarpetas
+# Si el API corre detrás de nginx, prefijo "internal" para servir adjuntos con X-Accel-Redirect (sendfile)
+ATTACHMENTS_X_ACCEL_PREFIX = os.getenv("ATTACHMENTS_X_ACCEL_PREFIX", "")
+
+# Caché de catálogos (departamentos y categorías): intervalo de sondeo cuando no hay change streams
+CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", 30))
+
+# Perfilador de consultas por petición (solo para depuración): se activa con el encabezado PROFILER_HEADER
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILER_HEADER = os.getenv("PROFILER_HEADER", "X-Profile")
+PROFILER_N1_THRESHOLD = int(os.getenv("PROFILER_N1_THRESHOLD", 5))   # Repeticiones de una misma forma
+PROFILER_MAX_PROFILES = int(os.getenv("PROFILER_MAX_PROFILES", 200))
+
+# Reconciliación periódica de ticket_counters contra tickets (0 la desactiva)
+TICKET_COUNTERS_RECONCILE_SECONDS = float(os.getenv("TICKET_COUNTERS_RECONCILE_SECONDS", 3600))
+
+# Búsqueda de tickets: cuántos mensajes por ticket se copian al índice de texto
+SEARCH_MAX_MESSAGES_PER_TICKET = int(os.getenv("SEARCH_MAX_MESSAGES_PER_TICKET", 200))
+
+# Contraseñas: costo de bcrypt y pool de hilos dedicado (hash/verificación fuera del event loop)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 64))   # En espera; más allá se responde 503
+
+# Tabla en memoria de token_version (revocación de JWT): cada cuánto se recarga desde users
+TOKEN_VERSION_REFRESH_SECONDS = float(os.getenv("TOKEN_VERSION_REFRESH_SECONDS", 30))
+
+# Refresh tokens rotativos y su revocación (colección revoked_tokens + filtro de Bloom en memoria
+# con las familias revocadas; crece solo si hay más familias que la capacidad)
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 7))
+REVOKED_TOKENS_REFRESH_SECONDS = float(os.getenv("REVOKED_TOKENS_REFRESH_SECONDS", 30))
+REVOKED_TOKENS_BLOOM_CAPACITY = int(os.getenv("REVOKED_TOKENS_BLOOM_CAPACITY", 100000))
+REVOKED_TOKENS_BLOOM_ERROR = float(os.getenv("REVOKED_TOKENS_BLOOM_ERROR", 0.001))
+
+# Eventos en tiempo real (WebSocket/SSE): tamaño de la cola por conexión y heartbeat
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", 100))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", 25))
+
+# Backfills (python -m app.db.backfill y el de arranque): documentos por bulk_write
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", 1000))
@@ -0,0 +1,36 @@
+"""
+Configuración común de las pruebas: variables de entorno mínimas y MongoDB en memoria
+"""
+import os
+
+os.environ.setdefault("SECRET_KEY", "clave-de-pruebas")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import mongomock
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+
+
+def _bulk_write_secuencial(self, operaciones, ordered=True, **kwargs):
+    # mongomock no acepta el argumento `sort` que pymongo 4.12 agrega a UpdateOne/ReplaceOne
+    for op in operaciones:
+        if isinstance(op, InsertOne):
+            self.insert_one(op._doc)
+        elif isinstance(op, UpdateOne):
+            self.update_one(op._filter, op._doc, upsert=bool(op._upsert))
+        elif isinstance(op, UpdateMany):
+            self.update_many(op._filter, op._doc, upsert=bool(op._upsert))
+        elif isinstance(op, ReplaceOne):
+            self.replace_one(op._filter, op._doc, upsert=bool(op._upsert))
+        elif isinstance(op, DeleteOne):
+            self.delete_one(op._filter)
+        elif isinstance(op, DeleteMany):
+            self.delete_many(op._filter)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(mongomock.collection.Collection, "bulk_write", _bulk_write_secuencial)
+    return AsyncMongoMockClient()["pruebas"]
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from app.models.analitica import DIA, HORA, _tramos
+
+
+def test_horas_en_los_bordes_y_dias_al_medio():
+    assert _tramos(datetime(2025, 1, 1, 22, 30), datetime(2025, 1, 4, 2, 10)) == [
+        (HORA, datetime(2025, 1, 1, 22), datetime(2025, 1, 2)),
+        (DIA, datetime(2025, 1, 2), datetime(2025, 1, 4)),
+        (HORA, datetime(2025, 1, 4), datetime(2025, 1, 4, 3)),
+    ]
+
+
+def test_dias_completos():
+    assert _tramos(datetime(2025, 1, 1), datetime(2025, 1, 3)) == [(DIA, datetime(2025, 1, 1), datetime(2025, 1, 3))]
+
+
+def test_mismo_dia_solo_horas():
+    assert _tramos(datetime(2025, 1, 1, 8, 15), datetime(2025, 1, 1, 10)) == [
+        (HORA, datetime(2025, 1, 1, 8), datetime(2025, 1, 1, 10)),
+    ]
+
+
+def test_rango_vacio():
+    assert _tramos(datetime(2025, 1, 1, 10), datetime(2025, 1, 1, 10)) == []
@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+import pytest
+from bson import ObjectId
+
+from app.auth.tokens import UsuarioToken
+from app.models import asignaciones
+from app.utils.eventos import hub_eventos
+
+
+@pytest.fixture
+def escenario(db, monkeypatch):
+    # mongomock no tiene sesiones: se usa el camino sin transacción
+    monkeypatch.setattr(asignaciones, "_transacciones_disponibles", False)
+    antiguo, actual, nuevo, ajeno = (ObjectId() for _ in range(4))
+    asyncio.run(db["users"].insert_many([
+        {"_id": antiguo, "department": "d1"},
+        {"_id": actual, "department": "d1"},
+        {"_id": nuevo, "department": "d1"},
+        {"_id": ajeno, "department": "d2"},
+    ]))
+    ticket_id = ObjectId()
+    asyncio.run(db["tickets"].insert_one({
+        "_id": ticket_id,
+        "status": "1",
+        "assigned_department": "d1",
+        # Forma antigua ({"user_id": ObjectId}) y forma actual (string) mezcladas
+        "assigned_users": [{"user_id": antiguo}, str(actual)],
+        "inbox_keys": [f"u:{antiguo}", f"u:{actual}", "d:d1"],
+    }))
+    usuario = UsuarioToken(str(ObjectId()), "jefe", "d1", 1, True)
+    ids = {nombre: str(valor) for nombre, valor in
+           (("antiguo", antiguo), ("actual", actual), ("nuevo", nuevo), ("ajeno", ajeno), ("ticket", ticket_id))}
+    return db, usuario, ids
+
+
+def test_agrega_y_quita_ambas_formas(escenario):
+    db, usuario, ids = escenario
+    sin_asignar = str(ObjectId())
+    suscripcion = hub_eventos.suscribir([f"u:{ids['antiguo']}", f"u:{sin_asignar}"])
+    try:
+        operacion = {"ticket_id": ids["ticket"], "agregar": [ids["nuevo"], ids["actual"]], "quitar": [ids["antiguo"], sin_asignar]}
+        resultado, = asyncio.run(asignaciones.aplicar_asignaciones(db, [operacion], usuario))
+        evento = json.loads(suscripcion.cola.get_nowait())
+    finally:
+        hub_eventos.desuscribir(suscripcion)
+
+    # Solo se informan los cambios que realmente ocurrieron
+    assert resultado["ok"]
+    assert resultado["agregados"] == [ids["nuevo"]]
+    assert resultado["quitados"] == [ids["antiguo"]]
+    assert evento["quitados"] == [ids["antiguo"]]
+    assert suscripcion.cola.empty()
+
+    ticket = asyncio.run(db["tickets"].find_one({"_id": ObjectId(ids["ticket"])}))
+    assert ticket["assigned_users"] == [ids["actual"], ids["nuevo"]]
+    assert sorted(ticket["inbox_keys"]) == sorted([f"u:{ids['actual']}", "d:d1", f"u:{ids['nuevo']}"])
+    filas = asyncio.run(db["ticket_assigned_users"].find({"ticket_id": ids["ticket"]}).to_list(None))
+    assert sorted(f["user_id"] for f in filas) == sorted([ids["nuevo"], ids["actual"]])
+
+
+def test_rechaza_operaciones_invalidas_sin_escribir(escenario):
+    db, usuario, ids = escenario
+    antes = asyncio.run(db["tickets"].find_one({"_id": ObjectId(ids["ticket"])}))
+    operaciones = [
+        {"ticket_id": "no-es-id", "agregar": [ids["nuevo"]]},
+        {"ticket_id": str(ObjectId()), "agregar": [ids["nuevo"]]},
+        {"ticket_id": ids["ticket"], "agregar": [ids["ajeno"]]},
+        {"ticket_id": ids["ticket"], "agregar": [ids["nuevo"]], "quitar": [ids["nuevo"]]},
+    ]
+    resultados = asyncio.run(asignaciones.aplicar_asignaciones(db, operaciones, usuario))
+    assert [r["codigo"] for r in resultados] == [400, 404, 400, 400]
+    assert not any(r["ok"] for r in resultados)
+    assert asyncio.run(db["tickets"].find_one({"_id": ObjectId(ids["ticket"])})) == antes
+
+    otro_departamento = UsuarioToken(str(ObjectId()), "otro", "d2", 1, True)
+    resultado, = asyncio.run(asignaciones.aplicar_asignaciones(db, [{"ticket_id": ids["ticket"], "quitar": [ids["actual"]]}], otro_departamento))
+    assert resultado["codigo"] == 403
+
+
+def test_acepta_usuarios_con_departamento_antiguo(db, monkeypatch):
+    monkeypatch.setattr(asignaciones, "_transacciones_disponibles", False)
+    departamento, legado, ticket_id = ObjectId(), ObjectId(), ObjectId()
+    # Documento antiguo: el departamento guardado como ObjectId en lugar de string
+    asyncio.run(db["users"].insert_one({"_id": legado, "department": departamento}))
+    asyncio.run(db["tickets"].insert_one({"_id": ticket_id, "status": "1", "assigned_department": str(departamento), "assigned_users": []}))
+    usuario = UsuarioToken(str(ObjectId()), "jefe", str(departamento), 1, True)
+
+    resultado, = asyncio.run(asignaciones.aplicar_asignaciones(db, [{"ticket_id": str(ticket_id), "agregar": [str(legado)]}], usuario))
+    assert resultado["ok"] and resultado["agregados"] == [str(legado)]
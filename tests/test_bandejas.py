@@ -0,0 +1,37 @@
+import asyncio
+
+from bson import ObjectId
+
+from app.db.backfill import backfill_created_user_department
+from app.models import bandejas
+from app.models.bandejas import calcular_inbox_keys, filtro_bandeja_departamento, filtro_bandeja_usuario
+
+
+def test_claves_de_usuarios_y_departamento():
+    ticket = {"assigned_users": ["u1", {"user_id": "u2"}, "u1", {"user_id": None}], "assigned_department": "d1"}
+    assert calcular_inbox_keys(ticket) == ["u:u1", "u:u2", "d:d1"]
+
+
+def test_ticket_sin_asignar():
+    assert calcular_inbox_keys({}) == []
+    assert calcular_inbox_keys({"assigned_users": None, "assigned_department": ""}) == []
+
+
+def test_filtros_incluyen_tickets_sin_inbox_keys():
+    assert filtro_bandeja_usuario("u1")["$or"] == [
+        {"inbox_keys": "u:u1"},
+        {"inbox_keys": {"$exists": False}, "assigned_users": "u1"},
+    ]
+    assert filtro_bandeja_departamento("d1")["$or"][1] == {"inbox_keys": {"$exists": False}, "assigned_department": "d1"}
+
+
+def test_tickets_sin_departamento_creador_se_averigua_una_vez(db, monkeypatch):
+    monkeypatch.setattr(bandejas, "_faltan_departamentos_creador", None)
+    asyncio.run(db["tickets"].insert_one({"_id": ObjectId(), "created_user_id": "u1"}))
+    assert asyncio.run(bandejas.faltan_departamentos_creador(db)) is True
+
+    asyncio.run(backfill_created_user_department(db, solo_faltantes=True))
+    assert asyncio.run(bandejas.faltan_departamentos_creador(db)) is False
+    # El resultado queda memorizado: no se vuelve a consultar la colección
+    asyncio.run(db["tickets"].insert_one({"_id": ObjectId(), "created_user_id": "u2"}))
+    assert asyncio.run(bandejas.faltan_departamentos_creador(db)) is False
@@ -0,0 +1,65 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+from bson import ObjectId
+
+from app.models import attachments_model
+from app.models.attachments_model import BLOB_BORRANDO, almacenar_blob, liberar_blob
+from app.utils.uploads import ResultadoUpload
+
+
+@pytest.fixture
+def carpeta(tmp_path, monkeypatch):
+    monkeypatch.setattr(attachments_model, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _subida(carpeta, contenido: bytes) -> ResultadoUpload:
+    ruta = os.path.join(carpeta, f"tmp-{ObjectId()}")
+    with open(ruta, "wb") as archivo:
+        archivo.write(contenido)
+    return ResultadoUpload(ruta=ruta, tamano=len(contenido), sha256=hashlib.sha256(contenido).hexdigest(), segundos=0.0)
+
+
+def test_contenido_repetido_comparte_archivo(db, carpeta):
+    primera = _subida(carpeta, b"hola")
+    segunda = _subida(carpeta, b"hola")
+    blob = asyncio.run(almacenar_blob(db, primera, "txt"))
+    repetido = asyncio.run(almacenar_blob(db, segunda, "txt"))
+
+    assert repetido["_id"] == blob["_id"] and repetido["refs"] == 2
+    assert os.path.isfile(blob["disk_path"])
+    assert not os.path.exists(segunda.ruta)
+
+    assert asyncio.run(liberar_blob(db, blob["_id"])) is False
+    assert os.path.isfile(blob["disk_path"])
+    assert asyncio.run(liberar_blob(db, blob["_id"])) is True
+    assert not os.path.exists(blob["disk_path"])
+    assert asyncio.run(db["attachment_blobs"].find_one({"_id": blob["_id"]})) is None
+
+
+def test_subida_durante_un_borrado_usa_ruta_nueva(db, carpeta):
+    blob = asyncio.run(almacenar_blob(db, _subida(carpeta, b"datos"), "bin"))
+    # Otro proceso llegó a cero y marcó la lápida, pero aún no borra el archivo
+    asyncio.run(db["attachment_blobs"].update_one({"_id": blob["_id"]}, {"$set": {"refs": 0, "estado": BLOB_BORRANDO}}))
+
+    revivido = asyncio.run(almacenar_blob(db, _subida(carpeta, b"datos"), "bin"))
+    assert revivido["refs"] == 1 and "estado" not in revivido
+    assert revivido["disk_path"] != blob["disk_path"]
+    assert os.path.isfile(revivido["disk_path"])
+
+    # El borrado en curso termina: quita su archivo pero no el documento revivido
+    os.remove(blob["disk_path"])
+    asyncio.run(db["attachment_blobs"].delete_one({"_id": blob["_id"], "estado": BLOB_BORRANDO, "creacion": blob["creacion"]}))
+    actual = asyncio.run(db["attachment_blobs"].find_one({"_id": blob["_id"]}))
+    assert actual["disk_path"] == revivido["disk_path"]
+    assert os.path.isfile(actual["disk_path"])
+
+
+def test_archivo_faltante_se_repone(db, carpeta):
+    blob = asyncio.run(almacenar_blob(db, _subida(carpeta, b"x"), "txt"))
+    os.remove(blob["disk_path"])
+    asyncio.run(almacenar_blob(db, _subida(carpeta, b"x"), "txt"))
+    assert os.path.isfile(blob["disk_path"])
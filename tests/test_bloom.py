@@ -0,0 +1,24 @@
+import uuid
+
+from app.utils.bloom import FiltroBloom
+
+
+def test_sin_falsos_negativos():
+    filtro = FiltroBloom(1000, 0.01)
+    valores = [uuid.uuid4().hex for _ in range(1000)]
+    filtro.agregar_todos(valores)
+    assert all(valor in filtro for valor in valores)
+    assert filtro.elementos == 1000
+
+
+def test_tasa_de_falsos_positivos_cercana_a_la_pedida():
+    filtro = FiltroBloom(1000, 0.01)
+    filtro.agregar_todos(uuid.uuid4().hex for _ in range(1000))
+    falsos = sum(uuid.uuid4().hex in filtro for _ in range(10000))
+    assert falsos < 300
+
+
+def test_filtro_vacio():
+    filtro = FiltroBloom(0, 0.001)
+    assert "fam:x" not in filtro
+    assert filtro.bits >= 8 and filtro.hashes >= 1
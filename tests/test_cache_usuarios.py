@@ -0,0 +1,64 @@
+import time
+
+from bson import ObjectId
+
+from app.auth import cache
+from app.auth.cache import CacheUsuarios
+from app.Schemas.Esquema import UserInDB
+
+
+def _usuario(status=True, user_id=None):
+    return UserInDB(_id=user_id or ObjectId(), username="ana", email="ana@x.com", fullname="Ana",
+                    phone_ext="100", password="hash", status=status, role=0)
+
+
+def test_guarda_y_obtiene():
+    cache_usuarios = CacheUsuarios(10, 60)
+    usuario = _usuario()
+    cache_usuarios.guardar("ana", None, usuario)
+    assert cache_usuarios.obtener("ana", None) is usuario
+    assert cache_usuarios.obtener("ana", 123) is None
+    assert cache_usuarios.estadisticas()["hits"] == 1
+
+
+def test_desaloja_el_menos_usado():
+    cache_usuarios = CacheUsuarios(2, 60)
+    for sub in ("a", "b"):
+        cache_usuarios.guardar(sub, None, _usuario())
+    cache_usuarios.obtener("a", None)
+    cache_usuarios.guardar("c", None, _usuario())
+    assert cache_usuarios.obtener("b", None) is None
+    assert cache_usuarios.obtener("a", None) is not None
+    assert cache_usuarios.obtener("c", None) is not None
+
+
+def test_vence_por_ttl(monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: ahora[0])
+    cache_usuarios = CacheUsuarios(10, 60)
+    cache_usuarios.guardar("ana", None, _usuario())
+    ahora[0] += 59
+    assert cache_usuarios.obtener("ana", None) is not None
+    ahora[0] += 1
+    assert cache_usuarios.obtener("ana", None) is None
+    assert cache_usuarios.estadisticas()["entradas"] == 0
+
+
+def test_no_guarda_inactivos_ni_tokens_vencidos():
+    cache_usuarios = CacheUsuarios(10, 60)
+    cache_usuarios.guardar("inactivo", None, _usuario(status=False))
+    cache_usuarios.guardar("vencido", int(time.time()) - 1, _usuario())
+    assert cache_usuarios.estadisticas()["entradas"] == 0
+
+
+def test_invalidar_usuario_quita_todas_sus_sesiones():
+    cache_usuarios = CacheUsuarios(10, 60)
+    user_id = ObjectId()
+    exp = int(time.time()) + 600
+    cache_usuarios.guardar("ana", None, _usuario(user_id=user_id))
+    cache_usuarios.guardar("ana", exp, _usuario(user_id=user_id))
+    cache_usuarios.guardar("otro", None, _usuario())
+    cache_usuarios.invalidar_usuario(str(user_id))
+    assert cache_usuarios.obtener("ana", None) is None
+    assert cache_usuarios.obtener("ana", exp) is None
+    assert cache_usuarios.obtener("otro", None) is not None
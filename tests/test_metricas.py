@@ -0,0 +1,37 @@
+from app.utils.metricas import RegistroMetricas
+
+
+def test_contador_con_etiquetas_escapadas():
+    registro = RegistroMetricas()
+    contador = registro.contador("peticiones_total", "Peticiones", ("ruta",))
+    contador.inc(ruta='/a"b')
+    contador.inc(2, ruta='/a"b')
+    assert registro.exponer() == (
+        "# HELP peticiones_total Peticiones\n"
+        "# TYPE peticiones_total counter\n"
+        'peticiones_total{ruta="/a\\"b"} 3\n'
+    )
+
+
+def test_histograma_acumula_buckets():
+    registro = RegistroMetricas()
+    histograma = registro.histograma("duracion_segundos", "Duración", buckets=(0.1, 1))
+    for valor in (0.05, 0.5, 5):
+        histograma.observar(valor)
+    lineas = registro.exponer().splitlines()
+    assert lineas[2:] == [
+        'duracion_segundos_bucket{le="0.1"} 1',
+        'duracion_segundos_bucket{le="1.0"} 2',
+        'duracion_segundos_bucket{le="+Inf"} 3',
+        "duracion_segundos_sum 5.55",
+        "duracion_segundos_count 3",
+    ]
+
+
+def test_medidor_y_recolector():
+    registro = RegistroMetricas()
+    medidor = registro.medidor("conexiones", "Conexiones abiertas")
+    registro.recolector(lambda: medidor.set(7))
+    assert registro.exponer().splitlines()[-1] == "conexiones 7"
+    # Registrar dos veces el mismo nombre devuelve la misma métrica
+    assert registro.medidor("conexiones", "otra ayuda") is medidor
@@ -0,0 +1,14 @@
+import pytest
+
+from app.utils.nombres import normalizar_nombre
+
+
+@pytest.mark.parametrize("nombre", ["Recursos Humanos", "  recursos   humanos ", "RECURSOS HUMÁNOS", "Récursos\tHumanos"])
+def test_misma_clave_sin_acentos_mayusculas_ni_espacios(nombre):
+    assert normalizar_nombre(nombre) == "recursos humanos"
+
+
+def test_nombres_distintos_y_vacios():
+    assert normalizar_nombre("Soporte") != normalizar_nombre("Soportes")
+    assert normalizar_nombre(None) == ""
+    assert normalizar_nombre("Straße") == "strasse"
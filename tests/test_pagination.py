@@ -0,0 +1,35 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.utils.pagination import codificar_cursor, decodificar_cursor, filtro_despues_de
+
+
+def test_cursor_ida_y_vuelta():
+    documento = {"_id": ObjectId(), "createdAt": datetime(2025, 3, 4, 5, 6, 7, 890000)}
+    cursor = codificar_cursor(documento)
+    assert "=" not in cursor
+    assert decodificar_cursor(cursor) == (documento["createdAt"], documento["_id"])
+
+
+def test_cursor_sin_fecha():
+    documento = {"_id": ObjectId()}
+    assert decodificar_cursor(codificar_cursor(documento)) == (None, documento["_id"])
+    assert filtro_despues_de(codificar_cursor(documento)) == {"createdAt": None, "_id": {"$lt": documento["_id"]}}
+
+
+def test_filtro_despues_de_incluye_documentos_sin_fecha():
+    documento = {"_id": ObjectId(), "createdAt": datetime(2025, 1, 1)}
+    filtro = filtro_despues_de(codificar_cursor(documento))
+    assert {"createdAt": None} in filtro["$or"]
+    assert {"createdAt": documento["createdAt"], "_id": {"$lt": documento["_id"]}} in filtro["$or"]
+    assert filtro_despues_de(None) == {}
+
+
+@pytest.mark.parametrize("cursor", ["no-es-base64!", "e30", codificar_cursor({"_id": "no-es-objectid"})])
+def test_cursor_invalido(cursor):
+    with pytest.raises(HTTPException) as error:
+        decodificar_cursor(cursor)
+    assert error.value.status_code == 400
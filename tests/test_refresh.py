@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from jose import jwt
+
+from app.auth import dependencies
+from app.auth.revocacion import AlmacenRevocaciones
+from app.auth.security import create_access_token, create_refresh_token
+from app.auth.tokens import CLAIM_FAMILIA, TablaVersionesToken, claims_de_usuario
+from app.routes import auth
+from app.Schemas.Esquema import RefreshTokenRequest
+from config import ALGORITHM, SECRET_KEY
+
+
+@pytest.fixture
+def entorno(db, monkeypatch):
+    # Estado por prueba: los singletons del módulo guardarían datos de otras bases
+    revocaciones = AlmacenRevocaciones(100, 0.01, 3600)
+    versiones = TablaVersionesToken(3600)
+    for modulo in (auth, dependencies):
+        monkeypatch.setattr(modulo, "revocaciones", revocaciones)
+        monkeypatch.setattr(modulo, "versiones_token", versiones)
+    user_id = ObjectId()
+    asyncio.run(db["users"].insert_one({"_id": user_id, "username": "ana", "status": True, "role": 0}))
+    claims = claims_de_usuario({"_id": user_id, "username": "ana", "status": True, "role": 0})
+    return db, claims
+
+
+def _refrescar(db, token):
+    return asyncio.run(auth.refresh_token(RefreshTokenRequest(refresh_token=token), db))
+
+
+def _rechazado(funcion, *args):
+    with pytest.raises(HTTPException) as error:
+        funcion(*args)
+    return error.value.status_code
+
+
+def _decodificar(token):
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
+def test_rotacion_conserva_la_familia(entorno):
+    db, claims = entorno
+    anterior = create_refresh_token(claims, familia="f1")
+    respuesta = _refrescar(db, anterior)
+    nuevo = _decodificar(respuesta["refresh_token"])
+    assert nuevo[CLAIM_FAMILIA] == "f1"
+    assert nuevo["jti"] != _decodificar(anterior)["jti"]
+    assert _decodificar(respuesta["access_token"])[CLAIM_FAMILIA] == "f1"
+    rotado = asyncio.run(db["revoked_tokens"].find_one({"_id": _decodificar(anterior)["jti"]}))
+    assert rotado["motivo"] == "rotado"
+
+
+def test_reuso_revoca_toda_la_familia(entorno):
+    db, claims = entorno
+    anterior = create_refresh_token(claims, familia="f1")
+    siguiente = _refrescar(db, anterior)
+    assert _rechazado(_refrescar, db, anterior) == 401
+    assert asyncio.run(db["revoked_tokens"].find_one({"_id": "fam:f1"})) is not None
+    # El par emitido en la rotación legítima también queda inválido
+    assert _rechazado(_refrescar, db, siguiente["refresh_token"]) == 401
+    assert _rechazado(asyncio.run, dependencies.get_current_user(token=siguiente["access_token"], db=db)) == 401
+
+
+def test_familia_revocada_en_otro_worker(entorno, monkeypatch):
+    db, claims = entorno
+    token = create_refresh_token(claims, familia="f2")
+    # Este worker ya cargó su filtro de Bloom (vacío) antes de la revocación
+    otro_worker = AlmacenRevocaciones(100, 0.01, 3600)
+    asyncio.run(otro_worker.revocado(db, "x", "y"))
+    asyncio.run(otro_worker._vigente(db))
+    asyncio.run(db["revoked_tokens"].insert_one({"_id": "fam:f2", "expiraEn": None, "motivo": "reuso"}))
+    monkeypatch.setattr(auth, "revocaciones", otro_worker)
+    assert _rechazado(_refrescar, db, token) == 401
+
+
+def test_access_token_no_sirve_como_refresh_ni_al_reves(entorno):
+    db, claims = entorno
+    access = create_access_token({**claims, CLAIM_FAMILIA: "f3"})
+    refresh = create_refresh_token(claims, familia="f3")
+    assert _rechazado(_refrescar, db, access) == 401
+    assert _rechazado(asyncio.run, dependencies.get_current_user(token=refresh, db=db)) == 401
+    assert asyncio.run(dependencies.get_current_user(token=access, db=db)).username == "ana"
+
+
+def test_version_de_token_incrementada(entorno):
+    db, claims = entorno
+    token = create_refresh_token(claims)
+    asyncio.run(db["users"].update_one({"_id": ObjectId(claims["uid"])}, {"$inc": {"token_version": 1}}))
+    assert _rechazado(_refrescar, db, token) == 401
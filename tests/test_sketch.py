@@ -0,0 +1,32 @@
+from app.utils import sketch
+
+
+def _sketch_de(valores):
+    resultado = {"n": 0, "suma": 0.0, "min": None, "max": None, "b": {}}
+    for valor in valores:
+        resultado["n"] += 1
+        resultado["suma"] += valor
+        resultado["min"] = valor if resultado["min"] is None else min(resultado["min"], valor)
+        resultado["max"] = valor if resultado["max"] is None else max(resultado["max"], valor)
+        indice = sketch.indice_bucket(valor)
+        resultado["b"][indice] = resultado["b"].get(indice, 0) + 1
+    return resultado
+
+
+def test_cuantiles_dentro_del_error_relativo():
+    resultado = sketch.cuantiles(_sketch_de(range(1, 1001)), [0.5, 0.9, 0.99])
+    for clave, esperado in (("p50", 500), ("p90", 900), ("p99", 990)):
+        assert abs(resultado[clave] - esperado) <= esperado * sketch.ERROR_RELATIVO
+
+
+def test_cuantiles_de_sketches_combinados():
+    combinado = sketch.combinar([_sketch_de(range(1, 501)), None, _sketch_de(range(501, 1001))])
+    assert combinado["n"] == 1000 and combinado["min"] == 1 and combinado["max"] == 1000
+    assert sketch.cuantiles(combinado, [0.5]) == sketch.cuantiles(_sketch_de(range(1, 1001)), [0.5])
+
+
+def test_ceros_vacio_y_limites_observados():
+    assert sketch.cuantiles({"n": 0}, [0.5, 0.99]) == {"p50": None, "p99": None}
+    assert sketch.cuantiles(_sketch_de([0, 0, 0]), [0.5]) == {"p50": 0.0}
+    # El representante del bucket no puede salir del rango [min, max]
+    assert sketch.cuantiles(_sketch_de([10.0]), [0.5]) == {"p50": 10.0}